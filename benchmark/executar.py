@@ -0,0 +1,234 @@
+"""
+Benchmark de ponta a ponta das variantes do pipeline, sem rede e sem Chrome.
+
+Sobe o Wayback falso (capturas gravadas + CDX), obtém a lista de URLs pelo CDX
+falso e roda cada variante em um diretório temporário com o 'archivebox' e o
+'single-file' falsos no PATH e o MongoDB trocado por mongomock. Ao final
+imprime, por modo: URLs/s, latência p50/p99 (início da captura até a inserção)
+e pico de memória.
+
+    python benchmark/executar.py --urls 40 --latencia-ms 300
+    python benchmark/executar.py --modos sequencial threads asyncio --json resultado.json
+"""
+import argparse
+import json
+import os
+import stat
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from pathlib import Path
+
+from fake_wayback import URL_ALVO, WaybackFalso
+
+DIR_BENCHMARK = Path(__file__).resolve().parent
+RAIZ_REPO = DIR_BENCHMARK.parent
+
+# modo -> (script ou "-m pacote", recebe a lista de URLs em arquivo?, argumentos extras)
+MODOS = {
+    "sequencial": ("getAllFragmentadoVerificacoesSemHash.py", True, []),
+    "threads": ("getAllFragmentadoVerificacoesSemHashMultiThread.py", True, []),
+    "chunked": ("getAllFragmentadoVerificacoesSemHashMultiThreadIgnoraErroConcorrenciaSQLite.py", True, []),
+    "lote": ("getAllFragmentadoVerificacoesSemHashMultiThreadIgnoraErroConcorrenciaSQLite_process_lote_iterando_um_por_um_deepseek.py", True, []),
+    "archivebox_api": ("getAllFragmentadoVerificacoesSemHashMultiThreadArchiveboxAPI.py", True, []),
+    "asyncio": ("getAllFragmentadoVerificacoesRobustaEHashAsyncComGPT4.py", True, ["--metricas-porta", "0"]),
+    "cdx_generico": ("getAllVersaoGenericaOutroPromptEscalandov1.py", False, []),
+}
+# As engines do pacote maquina_do_tempo, sobre as mesmas etapas. Sem o limitador do Wayback (os scripts
+# antigos não têm um, e o Wayback falso não limita): senão todas medem a taxa do token bucket
+for _engine in ("sequential", "threads", "processes", "asyncio"):
+    MODOS[f"pkg_{_engine}"] = ("-m maquina_do_tempo", True,
+                               ["--engine", _engine, "--metricas-porta", "0", "--taxa-wayback", "0"])
+# Captura por HTTP (HTML 'if_' sem navegador), com fallback para o archivebox
+for _engine in ("threads", "asyncio"):
+    MODOS[f"pkg_http_{_engine}"] = ("-m maquina_do_tempo", True,
+                                    ["--engine", _engine, "--captura", "http", "--metricas-porta", "0",
+                                     "--taxa-wayback", "0"])
+# Captura por HTTP com os assets embutidos, passando pelo cache em disco (cache_http.py). Os assets
+# das páginas levam o timestamp da página e o Wayback falso os redireciona (como o de verdade): a
+# coluna "origem" mostra quantas requisições chegaram a ele. Os assets de outros hosts (CDNs) que a
+# página gravada referencia saem para a rede, fora do cache
+MODOS["pkg_http_cache_threads"] = ("-m maquina_do_tempo", True,
+                                   ["--engine", "threads", "--captura", "http", "--inlinar-assets",
+                                    "--cache-http", "cache_http", "--metricas-porta", "0", "--taxa-wayback", "0"])
+
+def percentil(valores, p):
+    """Percentil pelo método do posto mais próximo (0 se vazio)."""
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    indice = max(0, min(len(ordenados) - 1, int(round(p / 100 * len(ordenados) + 0.5)) - 1))
+    return ordenados[indice]
+
+def obter_urls(base, quantidade):
+    """Consulta o CDX falso e monta as URLs do Wayback no formato usado pelos scripts."""
+    consulta = f"{base}/cdx/search/cdx?url={URL_ALVO}&output=json&fl=timestamp,original&limit={quantidade}"
+    with urllib.request.urlopen(consulta, timeout=30) as resposta:
+        linhas = json.load(resposta)
+    return [f"https://web.archive.org/web/{ts}/{original}" for ts, original in linhas[1:]]
+
+def criar_bin_falso(destino):
+    """Cria wrappers executáveis 'archivebox' e 'single-file' que chamam o fake_captura.py."""
+    destino.mkdir(parents=True, exist_ok=True)
+    for nome in ("archivebox", "single-file"):
+        caminho = destino / nome
+        subcomando = " single-file" if nome == "single-file" else ""
+        caminho.write_text(
+            f'#!/bin/sh\nexec "{sys.executable}" "{DIR_BENCHMARK / "fake_captura.py"}"{subcomando} "$@"\n',
+            encoding="utf-8",
+        )
+        caminho.chmod(caminho.stat().st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+    return destino
+
+def ler_eventos(caminho):
+    eventos = []
+    if caminho.exists():
+        with open(caminho, "r", encoding="utf-8") as f:
+            for linha in f:
+                try:
+                    eventos.append(json.loads(linha))
+                except json.JSONDecodeError:
+                    continue
+    return eventos
+
+def latencias(eventos):
+    """
+    Latência por URL: primeiro início de captura até a inserção no MongoDB. Para
+    variantes que não inserem (ex.: cdx_generico), vale o fim da captura.
+    """
+    inicio, fim_captura, insercao = {}, {}, {}
+    for evento in eventos:
+        ts = evento.get("ts")
+        if not ts:
+            continue
+        if evento["tipo"] == "inicio_captura":
+            inicio.setdefault(ts, evento["t"])
+        elif evento["tipo"] == "fim_captura":
+            fim_captura[ts] = evento["t"]
+        elif evento["tipo"] == "insercao":
+            insercao[ts] = evento["t"]
+
+    concluidas = insercao if insercao else fim_captura
+    return [concluidas[ts] - inicio[ts] for ts in concluidas if ts in inicio]
+
+def rodar_modo(modo, urls, base, args):
+    script, usa_arquivo, extras = MODOS[modo]
+    if args.limite_wayback:
+        # Com o Wayback falso limitando, o token bucket das engines parte do limite dele
+        extras = [str(args.limite_wayback) if anterior == "--taxa-wayback" else valor
+                  for anterior, valor in zip([None] + extras, extras)]
+    with tempfile.TemporaryDirectory(prefix=f"bench_{modo}_") as tmp:
+        tmp = Path(tmp)
+        archivebox_dir = tmp / "archivebox"
+        archivebox_dir.mkdir()
+        bin_dir = criar_bin_falso(tmp / "bin")
+        eventos_path = tmp / "eventos.jsonl"
+        resultado_path = tmp / "resultado.json"
+
+        if usa_arquivo:
+            lista = tmp / "urls.txt"
+            lista.write_text("\n".join(urls) + "\n", encoding="utf-8")
+            argumentos = [str(lista)]
+        else:
+            argumentos = [URL_ALVO]
+
+        env = dict(os.environ)
+        env.update({
+            "PATH": f"{bin_dir}{os.pathsep}{env.get('PATH', '')}",
+            "ARCHIVEBOX_DIR": str(archivebox_dir),
+            "BENCH_CDX_API": f"{base}/cdx/search/cdx",
+            "WAYBACK_CDX_API": f"{base}/cdx/search/cdx",
+            "WAYBACK_HTTP_BASE": base,
+            "BENCH_WAYBACK": base,
+            "BENCH_EVENTOS": str(eventos_path),
+            "BENCH_RESULTADO": str(resultado_path),
+            "BENCH_LATENCIA_MS": str(args.latencia_ms),
+            "BENCH_FALHA_PCT": str(args.falha_pct),
+        })
+
+        cmd = [sys.executable, str(DIR_BENCHMARK / "rodar_variante.py")]
+        cmd += script.split() if script.startswith("-m ") else [str(RAIZ_REPO / script)]
+        cmd += argumentos + extras
+        inicio = time.perf_counter()
+        try:
+            proc = subprocess.run(cmd, cwd=tmp, env=env, capture_output=True, text=True, timeout=args.timeout)
+            codigo_saida = proc.returncode
+            erro = proc.stderr.strip().splitlines()[-1] if proc.returncode and proc.stderr.strip() else ""
+        except subprocess.TimeoutExpired:
+            codigo_saida, erro = None, f"timeout de {args.timeout} s"
+        parede = time.perf_counter() - inicio
+
+        eventos = ler_eventos(eventos_path)
+        memoria = json.loads(resultado_path.read_text()) if resultado_path.exists() else {}
+
+    lat = latencias(eventos)
+    pico = max(memoria.get("pico_memoria_bytes", 0), memoria.get("pico_memoria_filhos_bytes", 0))
+    return {
+        "modo": modo,
+        "script": script,
+        "codigo_saida": codigo_saida,
+        "erro": erro,
+        "urls": len(urls),
+        "concluidas": len(lat),
+        "tempo_parede_s": round(parede, 3),
+        "urls_por_s": round(len(lat) / parede, 3) if parede else 0.0,
+        "p50_s": round(percentil(lat, 50), 3),
+        "p99_s": round(percentil(lat, 99), 3),
+        "pico_memoria_mib": round(pico / 1024 ** 2, 1),
+        "pico_memoria_pipeline_mib": round(memoria.get("pico_memoria_bytes", 0) / 1024 ** 2, 1),
+    }
+
+def tabela(resultados):
+    linhas = [
+        f"{'modo':<23}{'concl.':>8}{'URLs/s':>9}{'p50 s':>9}{'p99 s':>9}{'pico MiB':>10}{'parede s':>10}"
+        f"{'origem':>8}{'302':>6}  status",
+    ]
+    for r in resultados:
+        status = "ok" if r["codigo_saida"] == 0 else (r["erro"] or f"saída {r['codigo_saida']}")[:60]
+        linhas.append(
+            f"{r['modo']:<23}{r['concluidas']:>4}/{r['urls']:<3}{r['urls_por_s']:>9.2f}{r['p50_s']:>9.3f}"
+            f"{r['p99_s']:>9.3f}{r['pico_memoria_pipeline_mib']:>10.1f}{r['tempo_parede_s']:>10.1f}"
+            f"{r.get('requisicoes_wayback', 0):>8}{r.get('redirecionadas', 0):>6}  {status}"
+        )
+    return "\n".join(linhas)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark das variantes do pipeline com Wayback e captura falsos.")
+    parser.add_argument("--modos", nargs="*", choices=sorted(MODOS), default=list(MODOS))
+    parser.add_argument("--urls", type=int, default=30, help="Quantas URLs do CDX falso processar")
+    parser.add_argument("--latencia-ms", type=int, default=200, help="Latência média da captura falsa")
+    parser.add_argument("--falha-pct", type=float, default=0, help="%% de capturas que falham")
+    parser.add_argument("--limite-wayback", type=int, default=0,
+                        help="O Wayback falso responde 429 acima de N requisições/s (0 = sem limite)")
+    parser.add_argument("--timeout", type=int, default=600, help="Tempo máximo por modo (s)")
+    parser.add_argument("--json", help="Grava os resultados também neste arquivo JSON")
+    args = parser.parse_args()
+
+    # O CDX falso lista exatamente N capturas: as variantes que consultam o CDX veem a mesma carga
+    wayback = WaybackFalso(total_capturas=args.urls, limite_req_s=args.limite_wayback, redirecionar_assets=True)
+    base = wayback.iniciar()
+    try:
+        urls = obter_urls(base, args.urls)
+        print(f"Wayback falso em {base}; {len(urls)} URLs; captura com ~{args.latencia_ms} ms.")
+        resultados = []
+        for modo in args.modos:
+            print(f"Rodando {modo}...", flush=True)
+            antes = wayback.requisicoes, wayback.redirecionadas
+            resultado = rodar_modo(modo, urls, base, args)
+            resultado["requisicoes_wayback"] = wayback.requisicoes - antes[0]
+            resultado["redirecionadas"] = wayback.redirecionadas - antes[1]
+            resultados.append(resultado)
+    finally:
+        wayback.parar()
+
+    print()
+    print(tabela(resultados))
+    if args.limite_wayback:
+        print(f"\nRequisições bloqueadas (429) pelo Wayback falso: {wayback.bloqueadas}")
+    if args.json:
+        Path(args.json).write_text(json.dumps(resultados, indent=2, ensure_ascii=False), encoding="utf-8")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+Ferramenta de captura falsa para benchmarks, compatível com a linha de comando
+usada pelos scripts:
+
+    archivebox add <url> [<url> ...]      (executado com cwd=ARCHIVEBOX_DIR)
+    single-file [--opções] <url> <saida>
+
+Em vez de abrir o Chrome, espera uma latência configurável e baixa a captura do
+Wayback falso (fake_wayback.py). Variáveis de ambiente:
+
+    BENCH_WAYBACK       URL base do Wayback falso (ex.: http://127.0.0.1:8765)
+    BENCH_LATENCIA_MS   latência média por captura (padrão 200)
+    BENCH_JITTER_PCT    variação aleatória da latência, em % (padrão 20)
+    BENCH_FALHA_PCT     % de capturas que falham com erro (padrão 0)
+    BENCH_EVENTOS       arquivo JSONL onde cada captura registra início e fim
+    BENCH_TRAVAR_PCT    % de capturas do 'archivebox add' que gravam o DOM e travam (como uma
+                        página que nunca chega a 'networkidle'), com um filho no lugar do Chrome
+    WAYBACK_PROXY       proxy da captura (definido pelo pool de proxies, como no extractor real)
+"""
+import json
+import os
+import random
+import sys
+import time
+import urllib.request
+from pathlib import Path
+from urllib.parse import urlsplit
+
+def _config(nome, padrao):
+    return float(os.environ.get(nome, padrao))
+
+def _registrar_evento(evento):
+    caminho = os.environ.get("BENCH_EVENTOS")
+    if not caminho:
+        return
+    linha = json.dumps(evento) + "\n"
+    # O append de uma linha curta com O_APPEND é atômico entre processos
+    fd = os.open(caminho, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(fd, linha.encode("utf-8"))
+    finally:
+        os.close(fd)
+
+def _timestamp(url):
+    marker = "/web/"
+    inicio = url.find(marker)
+    if inicio < 0:
+        return None
+    ts = url[inicio + len(marker): inicio + len(marker) + 14]
+    return ts if len(ts) == 14 and ts.isdigit() else None
+
+def url_local(url):
+    """Troca o host do Wayback (web.archive.org) pelo Wayback falso."""
+    base = os.environ.get("BENCH_WAYBACK")
+    if not base:
+        return url
+    partes = urlsplit(url)
+    return base.rstrip("/") + partes.path + (f"?{partes.query}" if partes.query else "")
+
+def capturar(url, destino):
+    """Simula uma captura de 'url' gravando o HTML em 'destino'. Lança RuntimeError em falha simulada."""
+    ts = _timestamp(url)
+    inicio = time.time()
+    _registrar_evento({"tipo": "inicio_captura", "ts": ts, "t": inicio, "pid": os.getpid()})
+
+    latencia = _config("BENCH_LATENCIA_MS", 200) / 1000
+    jitter = _config("BENCH_JITTER_PCT", 20) / 100
+    time.sleep(max(0.0, latencia * random.uniform(1 - jitter, 1 + jitter)))
+
+    if random.random() * 100 < _config("BENCH_FALHA_PCT", 0):
+        _registrar_evento({"tipo": "falha_captura", "ts": ts, "t": time.time()})
+        raise RuntimeError(f"Falha simulada na captura de {url}")
+
+    requisicao = urllib.request.Request(url_local(url))
+    proxy = os.environ.get("WAYBACK_PROXY")
+    if proxy:
+        # set_proxy direto: ignora no_proxy, que costuma incluir 127.0.0.1
+        requisicao.set_proxy(urlsplit(proxy).netloc, "http")
+    with urllib.request.urlopen(requisicao, timeout=60) as resposta:
+        conteudo = resposta.read()
+    destino = Path(destino)
+    destino.parent.mkdir(parents=True, exist_ok=True)
+    destino.write_bytes(conteudo)
+
+    _registrar_evento({"tipo": "fim_captura", "ts": ts, "t": time.time()})
+    return destino
+
+def archivebox_add(urls, out_dir="."):
+    """Equivalente a 'archivebox add': um diretório archive/<ts>.<n> por URL."""
+    resultados = []
+    for url in urls:
+        ts = _timestamp(url) or str(int(time.time()))
+        nome = f"{ts}.{os.getpid()}{random.randint(0, 9999):04d}"
+        snapshot_dir = Path(out_dir) / "archive" / nome
+        capturar(url, snapshot_dir / "singlefile.html")
+        resultados.append(snapshot_dir)
+    return resultados
+
+def travar(url, out_dir="."):
+    """Grava o DOM, deixa um processo filho (o "Chrome") e nunca termina, para testar o watchdog."""
+    import subprocess
+
+    ts = _timestamp(url) or str(int(time.time()))
+    snapshot_dir = Path(out_dir) / "archive" / f"{ts}.{os.getpid()}"
+    print(f"    > ./archive/{snapshot_dir.name}", flush=True)
+    print("      > singlefile", flush=True)
+    capturar(url, snapshot_dir / "singlefile.html")
+    subprocess.Popen([sys.executable, "-c", "import time; time.sleep(3600)"])
+    while True:
+        time.sleep(3600)
+
+def main(argv):
+    programa = Path(argv[0]).name
+    args = [a for a in argv[1:] if not a.startswith("--")]
+
+    if programa.startswith("single-file") or (args and args[0] == "single-file"):
+        if args and args[0] == "single-file":
+            args = args[1:]
+        if len(args) < 2:
+            print("Uso: single-file <url> <saida>", file=sys.stderr)
+            return 2
+        try:
+            capturar(args[0], args[1])
+        except Exception as e:
+            print(str(e), file=sys.stderr)
+            return 1
+        return 0
+
+    if not args or args[0] != "add":
+        print("Uso: archivebox add <url> [<url> ...]", file=sys.stderr)
+        return 2
+
+    codigo = 0
+    for url in args[1:]:
+        if random.random() * 100 < _config("BENCH_TRAVAR_PCT", 0):
+            travar(url)
+        try:
+            snapshot_dir = archivebox_add([url])[0]
+            print(f"    > ./archive/{snapshot_dir.name}")
+        except Exception as e:
+            print(f"[X] {e}", file=sys.stderr)
+            codigo = 1
+    return codigo
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
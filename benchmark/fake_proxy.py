@@ -0,0 +1,156 @@
+"""
+Proxy HTTP local para testar o pool de proxies sem depender de um serviço real.
+
+Repassa GETs com URL absoluta (como faz um cliente configurado com proxy) e
+abre túneis CONNECT para HTTPS. Pode simular um proxy lento, instável ou
+bloqueado pelo destino:
+
+    python benchmark/fake_proxy.py --porta 8899 --latencia-ms 300 --falha-pct 10
+    python benchmark/fake_proxy.py --porta 8898 --bloquear-apos 5   # 429 a partir da 6ª requisição
+"""
+import argparse
+import random
+import select
+import socket
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+# Sem proxy de ambiente: o próprio proxy sai direto para o destino
+_SAIDA = urllib.request.build_opener(urllib.request.ProxyHandler({}))
+
+class ProxyFalso:
+    """Estado do proxy: latência extra, % de falhas (502) e bloqueio (429) após N requisições."""
+    def __init__(self, latencia_ms=0, falha_pct=0, bloquear_apos=None, status_bloqueio=429):
+        self.latencia_ms = latencia_ms
+        self.falha_pct = falha_pct
+        self.bloquear_apos = bloquear_apos
+        self.status_bloqueio = status_bloqueio
+        self.requisicoes = 0
+        self.falhas = 0
+        self.bloqueadas = 0
+        self._lock = threading.Lock()
+        self._servidor = None
+
+    def _sortear(self):
+        """Conta a requisição e decide se ela falha ('falha'), é bloqueada ('bloqueio') ou passa (None)."""
+        with self._lock:
+            self.requisicoes += 1
+            if self.bloquear_apos is not None and self.requisicoes > self.bloquear_apos:
+                self.bloqueadas += 1
+                return "bloqueio"
+            if random.random() * 100 < self.falha_pct:
+                self.falhas += 1
+                return "falha"
+        return None
+
+    def iniciar(self, porta=0, host="127.0.0.1"):
+        """Sobe o proxy em uma thread daemon e devolve a URL (http://host:porta)."""
+        estado = self
+
+        class _Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _responder(self, status, corpo, extras=None):
+                self.send_response(status)
+                self.send_header("Content-Type", "text/plain")
+                self.send_header("Content-Length", str(len(corpo)))
+                for nome, valor in (extras or {}).items():
+                    self.send_header(nome, valor)
+                self.end_headers()
+                self.wfile.write(corpo)
+
+            def _antes(self):
+                if estado.latencia_ms:
+                    time.sleep(estado.latencia_ms / 1000)
+                resultado = estado._sortear()
+                if resultado == "bloqueio":
+                    self._responder(estado.status_bloqueio, b"bloqueado", {"Retry-After": "1"})
+                    return False
+                if resultado == "falha":
+                    self._responder(502, b"falha simulada do proxy")
+                    return False
+                return True
+
+            def do_GET(self):
+                if not urlsplit(self.path).scheme:
+                    self._responder(400, b"o proxy espera uma URL absoluta")
+                    return
+                if not self._antes():
+                    return
+                try:
+                    with _SAIDA.open(self.path, timeout=60) as resposta:
+                        status, corpo, tipo = resposta.status, resposta.read(), resposta.headers.get("Content-Type")
+                except urllib.error.HTTPError as e:
+                    status, corpo, tipo = e.code, e.read(), e.headers.get("Content-Type")
+                except OSError as e:
+                    self._responder(502, str(e).encode())
+                    return
+                self.send_response(status)
+                self.send_header("Content-Type", tipo or "application/octet-stream")
+                self.send_header("Content-Length", str(len(corpo)))
+                self.end_headers()
+                self.wfile.write(corpo)
+
+            def do_CONNECT(self):
+                if not self._antes():
+                    return
+                host, _, porta = self.path.rpartition(":")
+                try:
+                    destino = socket.create_connection((host, int(porta)), timeout=30)
+                except (OSError, ValueError) as e:
+                    self._responder(502, str(e).encode())
+                    return
+                self.send_response(200, "Connection Established")
+                self.end_headers()
+                conexoes = [self.connection, destino]
+                try:
+                    while True:
+                        prontas, _, erro = select.select(conexoes, [], conexoes, 60)
+                        if erro or not prontas:
+                            break
+                        for origem in prontas:
+                            dados = origem.recv(65536)
+                            if not dados:
+                                return
+                            (destino if origem is self.connection else self.connection).sendall(dados)
+                finally:
+                    destino.close()
+                    self.close_connection = True
+
+            def log_message(self, *args):
+                pass
+
+        self._servidor = ThreadingHTTPServer((host, porta), _Handler)
+        self._servidor.daemon_threads = True
+        threading.Thread(target=self._servidor.serve_forever, name="proxy-falso", daemon=True).start()
+        host, porta = self._servidor.server_address[:2]
+        return f"http://{host}:{porta}"
+
+    def parar(self):
+        if self._servidor is not None:
+            self._servidor.shutdown()
+            self._servidor.server_close()
+            self._servidor = None
+
+def main():
+    parser = argparse.ArgumentParser(description="Proxy HTTP falso para testar o pool de proxies.")
+    parser.add_argument("--porta", type=int, default=8899)
+    parser.add_argument("--latencia-ms", type=int, default=0)
+    parser.add_argument("--falha-pct", type=float, default=0, help="% de requisições respondidas com 502")
+    parser.add_argument("--bloquear-apos", type=int, default=None,
+                        help="Responde 429 a partir desta quantidade de requisições")
+    args = parser.parse_args()
+
+    proxy = ProxyFalso(args.latencia_ms, args.falha_pct, args.bloquear_apos)
+    print(f"Proxy falso em {proxy.iniciar(args.porta)}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        proxy.parar()
+
+if __name__ == "__main__":
+    main()
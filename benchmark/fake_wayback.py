@@ -0,0 +1,196 @@
+"""
+Servidor HTTP local que imita o Wayback Machine para benchmarks.
+
+Rotas:
+    /web/<timestamp>[if_|id_|im_|cs_|js_]/<url original>  -> captura gravada
+    /cdx/search/cdx?url=...&output=json&from=...&to=...&limit=...  -> linhas do CDX
+
+Os assets (im_, cs_, js_) são um corpo pequeno fixo por URL. Com
+redirecionar_assets, como o Wayback de verdade: um asset pedido com o
+timestamp da página recebe 302 para a captura do próprio asset, com o
+Location absoluto em https://web.archive.org/.
+
+As capturas servidas são arquivos HTML gravados (ex.: test.remounter.html); a
+escolha do arquivo é determinística pelo timestamp, para que a mesma URL sempre
+devolva o mesmo conteúdo.
+"""
+import argparse
+import collections
+import json
+import threading
+import time
+import zlib
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+RAIZ_REPO = Path(__file__).resolve().parent.parent
+CAPTURAS_PADRAO = [RAIZ_REPO / "test.remounter.html", RAIZ_REPO / "index.html"]
+URL_ALVO = "https://poder360.com.br/"
+MODOS_ASSET = ("im_", "cs_", "js_")
+
+def gerar_timestamps(n, inicio="20150101000000", fim="20221231235959"):
+    """Gera n timestamps do Wayback igualmente espaçados (ordem crescente, como o CDX)."""
+    t0 = datetime.strptime(inicio, "%Y%m%d%H%M%S")
+    t1 = datetime.strptime(fim, "%Y%m%d%H%M%S")
+    passo = (t1 - t0) / max(n, 1)
+    return [(t0 + passo * i).strftime("%Y%m%d%H%M%S") for i in range(n)]
+
+class WaybackFalso:
+    """Estado do servidor: capturas gravadas, total de capturas do CDX e latência simulada."""
+    def __init__(self, capturas=None, total_capturas=1000, latencia_ms=0, status_forcado=None,
+                 limite_req_s=0, redirecionar_assets=False):
+        caminhos = [Path(c) for c in (capturas or CAPTURAS_PADRAO) if Path(c).exists()]
+        if not caminhos:
+            raise FileNotFoundError("Nenhuma captura gravada encontrada para servir.")
+        self.capturas = [c.read_bytes() for c in caminhos]
+        self.timestamps = gerar_timestamps(total_capturas)
+        self.latencia_ms = latencia_ms
+        # Permite simular bloqueio (ex.: 429) para testar limitadores
+        self.status_forcado = status_forcado
+        # Imita o bloqueio do Wayback: acima de N requisições/s responde 429 com Retry-After
+        self.limite_req_s = limite_req_s
+        self.redirecionar_assets = redirecionar_assets
+        self._recentes = collections.deque()
+        self.bloqueadas = 0
+        self.requisicoes = 0
+        self.redirecionadas = 0
+        self.assets_servidos = 0
+        self._lock = threading.Lock()
+        self._servidor = None
+
+    def excedeu_limite(self):
+        """Janela deslizante de 1 s; chamado com o lock."""
+        if not self.limite_req_s:
+            return False
+        agora = time.monotonic()
+        while self._recentes and agora - self._recentes[0] > 1.0:
+            self._recentes.popleft()
+        if len(self._recentes) >= self.limite_req_s:
+            self.bloqueadas += 1
+            return True
+        self._recentes.append(agora)
+        return False
+
+    def captura_para(self, timestamp):
+        return self.capturas[zlib.crc32(timestamp.encode()) % len(self.capturas)]
+
+    def timestamp_asset(self, original):
+        """Timestamp da captura do próprio asset (fixo por URL original)."""
+        return self.timestamps[zlib.crc32(original.encode()) % len(self.timestamps)]
+
+    def linhas_cdx(self, params):
+        de = params.get("from", [""])[0].ljust(14, "0")
+        ate = params.get("to", [""])[0].ljust(14, "9") if params.get("to") else "99999999999999"
+        limite = int(params.get("limit", ["0"])[0] or 0)
+        campos = params.get("fl", ["timestamp,original"])[0].split(",")
+        original = params.get("url", [URL_ALVO])[0]
+        if "://" not in original:
+            original = "https://" + original
+        linhas = [campos]
+        for ts in self.timestamps:
+            if de <= ts <= ate:
+                valores = {"timestamp": ts, "original": original, "statuscode": "200",
+                           "mimetype": "text/html", "digest": f"{zlib.crc32(ts.encode()):08X}"}
+                linhas.append([valores.get(c, "") for c in campos])
+                if limite and len(linhas) > limite:
+                    break
+        return linhas
+
+    def iniciar(self, porta=0, host="127.0.0.1"):
+        """Sobe o servidor em uma thread daemon e devolve a URL base (http://host:porta)."""
+        estado = self
+
+        class _Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _responder(self, status, corpo, tipo="text/html; charset=utf-8", extras=None):
+                self.send_response(status)
+                self.send_header("Content-Type", tipo)
+                self.send_header("Content-Length", str(len(corpo)))
+                for nome, valor in (extras or {}).items():
+                    self.send_header(nome, valor)
+                self.end_headers()
+                if self.command != "HEAD":
+                    self.wfile.write(corpo)
+
+            def do_HEAD(self):
+                self.do_GET()
+
+            def do_GET(self):
+                with estado._lock:
+                    estado.requisicoes += 1
+                    bloqueada = estado.excedeu_limite()
+                if estado.latencia_ms:
+                    time.sleep(estado.latencia_ms / 1000)
+                if estado.status_forcado or bloqueada:
+                    self._responder(estado.status_forcado or 429, b"bloqueado", "text/plain",
+                                    {"Retry-After": "1"})
+                    return
+
+                partes = urlsplit(self.path)
+                if partes.path.startswith("/cdx/search/cdx"):
+                    linhas = estado.linhas_cdx(parse_qs(partes.query))
+                    self._responder(200, json.dumps(linhas).encode(), "application/json")
+                    return
+
+                if partes.path.startswith("/web/"):
+                    resto = self.path[len("/web/"):]
+                    timestamp, modo, original = resto[:14], resto[14:17], resto[18:]
+                    if len(timestamp) == 14 and timestamp.isdigit():
+                        if modo in MODOS_ASSET and estado.redirecionar_assets:
+                            destino = estado.timestamp_asset(original)
+                            if destino != timestamp:
+                                with estado._lock:
+                                    estado.redirecionadas += 1
+                                self._responder(302, b"", "text/plain", {
+                                    "Location": f"https://web.archive.org/web/{destino}{modo}/{original}"})
+                                return
+                        if modo in MODOS_ASSET:
+                            with estado._lock:
+                                estado.assets_servidos += 1
+                            self._responder(200, f"/* {original} */\n".encode().ljust(2048, b" "),
+                                            "application/octet-stream")
+                            return
+                        self._responder(200, estado.captura_para(timestamp))
+                        return
+
+                self._responder(404, b"not found", "text/plain")
+
+            def log_message(self, *args):
+                pass
+
+        self._servidor = ThreadingHTTPServer((host, porta), _Handler)
+        self._servidor.daemon_threads = True
+        threading.Thread(target=self._servidor.serve_forever, name="wayback-falso", daemon=True).start()
+        host, porta = self._servidor.server_address[:2]
+        return f"http://{host}:{porta}"
+
+    def parar(self):
+        if self._servidor is not None:
+            self._servidor.shutdown()
+            self._servidor.server_close()
+            self._servidor = None
+
+def main():
+    parser = argparse.ArgumentParser(description="Wayback Machine falso para benchmarks.")
+    parser.add_argument("--porta", type=int, default=8765)
+    parser.add_argument("--capturas", nargs="*", help="Arquivos HTML gravados a servir")
+    parser.add_argument("--total", type=int, default=1000, help="Capturas listadas pelo CDX")
+    parser.add_argument("--latencia-ms", type=int, default=0)
+    parser.add_argument("--limite-req-s", type=int, default=0, help="Responde 429 acima desta taxa (0 = sem limite)")
+    parser.add_argument("--redirecionar-assets", action="store_true",
+                        help="Redireciona os assets (im_, cs_, js_) para a captura do próprio asset")
+    args = parser.parse_args()
+
+    servidor = WaybackFalso(args.capturas, args.total, args.latencia_ms, limite_req_s=args.limite_req_s,
+                            redirecionar_assets=args.redirecionar_assets)
+    print(f"Wayback falso em {servidor.iniciar(args.porta)}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        servidor.parar()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+"""
+Executa um dos scripts de pipeline sem tocar no Wayback, no ArchiveBox ou no
+MongoDB reais. Chamado pelo executar.py em um processo separado por variante:
+
+    python benchmark/rodar_variante.py <script.py> [args do script...]
+    python benchmark/rodar_variante.py -m maquina_do_tempo [args...]
+
+O que é trocado antes de rodar o script como __main__:
+    - pymongo.MongoClient / AsyncMongoClient  -> mongomock (em memória)
+    - archivebox.cli.archivebox_add.add       -> fake_captura.archivebox_add
+    - ARCHIVEBOX_DIR e WAYBACK_CDX_API         -> lidos do ambiente
+    - captura por HTTP do pacote              -> registra o início em BENCH_EVENTOS
+O 'archivebox' chamado via subprocess é o wrapper que o executar.py põe no PATH.
+
+Ao sair grava em BENCH_RESULTADO o pico de memória (ru_maxrss) do processo e
+dos filhos. Cada insert_one registra um evento em BENCH_EVENTOS.
+"""
+import asyncio
+import json
+import os
+import re
+import resource
+import runpy
+import sys
+import time
+import types
+from datetime import timezone
+from pathlib import Path
+
+RAIZ_REPO = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RAIZ_REPO))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import fake_captura
+
+# Constantes que apontam para o ambiente real e passam a vir do ambiente
+CONSTANTES_AMBIENTE = {
+    "ARCHIVEBOX_DIR": "ARCHIVEBOX_DIR",
+    "WAYBACK_CDX_API": "BENCH_CDX_API",
+}
+
+def _registrar_insercao(documento):
+    timestamp = documento.get("timestamp") if isinstance(documento, dict) else None
+    ts = None
+    if timestamp is not None:
+        ts = timestamp.astimezone(timezone.utc).strftime("%Y%m%d%H%M%S") if timestamp.tzinfo else \
+            timestamp.strftime("%Y%m%d%H%M%S")
+    fake_captura._registrar_evento({"tipo": "insercao", "ts": ts, "t": time.time()})
+
+def instalar_mongomock():
+    try:
+        import mongomock
+        import pymongo
+    except ImportError as e:
+        raise SystemExit(f"O benchmark precisa de pymongo e mongomock instalados "
+                         f"(pip install -r requirements.txt -r requirements-extras.txt): {e}")
+
+    insert_original = mongomock.collection.Collection.insert_one
+
+    def insert_one(self, document, *args, **kwargs):
+        resultado = insert_original(self, document, *args, **kwargs)
+        _registrar_insercao(document)
+        return resultado
+
+    mongomock.collection.Collection.insert_one = insert_one
+
+    # Um único banco em memória por processo, como um servidor local
+    cliente = mongomock.MongoClient()
+    pymongo.MongoClient = lambda *args, **kwargs: cliente
+
+    class _ColecaoAsync:
+        def __init__(self, colecao):
+            self._colecao = colecao
+
+        async def insert_one(self, document, *args, **kwargs):
+            return await asyncio.to_thread(self._colecao.insert_one, document, *args, **kwargs)
+
+        async def insert_many(self, documents, *args, **kwargs):
+            return await asyncio.to_thread(self._colecao.insert_many, documents, *args, **kwargs)
+
+        async def find_one(self, *args, **kwargs):
+            return await asyncio.to_thread(self._colecao.find_one, *args, **kwargs)
+
+        async def find(self, *args, **kwargs):
+            # Assíncrono iterável como o AsyncCursor (consulta inteira de uma vez)
+            for documento in await asyncio.to_thread(lambda: list(self._colecao.find(*args, **kwargs))):
+                yield documento
+
+    class _BancoAsync:
+        def __init__(self, banco):
+            self._banco = banco
+
+        def __getitem__(self, nome):
+            return _ColecaoAsync(self._banco[nome])
+
+    class AsyncMongoClientFalso:
+        def __init__(self, *args, **kwargs):
+            pass
+
+        def __getitem__(self, nome):
+            return _BancoAsync(cliente[nome])
+
+        async def close(self):
+            pass
+
+    pymongo.AsyncMongoClient = AsyncMongoClientFalso
+
+def instalar_archivebox_api():
+    """Módulo archivebox.cli.archivebox_add com um add() que devolve objetos com archive_dir."""
+    def add(urls, out_dir=".", **kwargs):
+        if isinstance(urls, str):
+            urls = [urls]
+        return [types.SimpleNamespace(archive_dir=str(d), url=u)
+                for u, d in zip(urls, fake_captura.archivebox_add(urls, out_dir))]
+
+    for nome in ("archivebox", "archivebox.cli"):
+        sys.modules.setdefault(nome, types.ModuleType(nome))
+    modulo = types.ModuleType("archivebox.cli.archivebox_add")
+    modulo.add = add
+    sys.modules["archivebox.cli.archivebox_add"] = modulo
+
+def instalar_eventos_http():
+    """A captura por HTTP não passa pelo fake_captura: registra aqui o início de cada tentativa."""
+    try:
+        from maquina_do_tempo.captura_http import CapturadorHTTP
+    except ImportError:
+        return
+    buscar_original = CapturadorHTTP.buscar
+    buscar_async_original = CapturadorHTTP.buscar_async
+
+    def _inicio(url):
+        fake_captura._registrar_evento({"tipo": "inicio_captura", "ts": fake_captura._timestamp(url),
+                                        "t": time.time(), "pid": os.getpid()})
+
+    def buscar(self, url, *args, **kwargs):
+        _inicio(url)
+        return buscar_original(self, url, *args, **kwargs)
+
+    async def buscar_async(self, url, *args, **kwargs):
+        _inicio(url)
+        return await buscar_async_original(self, url, *args, **kwargs)
+
+    CapturadorHTTP.buscar = buscar
+    CapturadorHTTP.buscar_async = buscar_async
+
+def adaptar_fonte(fonte):
+    """Troca os literais de ARCHIVEBOX_DIR/WAYBACK_CDX_API por leituras do ambiente."""
+    for constante, variavel in CONSTANTES_AMBIENTE.items():
+        if variavel not in os.environ:
+            continue
+        leitura = f'__import__("os").environ["{variavel}"]'
+        fonte = re.sub(
+            rf'^({constante}\s*=\s*(?:Path\()?)\s*"[^"]*"',
+            lambda m: m.group(1) + leitura,
+            fonte,
+            count=1,
+            flags=re.MULTILINE,
+        )
+    return fonte
+
+def gravar_resultado(codigo_saida):
+    caminho = os.environ.get("BENCH_RESULTADO")
+    if not caminho:
+        return
+    # ru_maxrss é KiB no Linux e bytes no macOS
+    fator = 1 if sys.platform == "darwin" else 1024
+    resultado = {
+        "codigo_saida": codigo_saida,
+        "pico_memoria_bytes": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * fator,
+        "pico_memoria_filhos_bytes": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * fator,
+    }
+    Path(caminho).write_text(json.dumps(resultado), encoding="utf-8")
+
+def main():
+    if len(sys.argv) < 2 or (sys.argv[1] == "-m" and len(sys.argv) < 3):
+        print("Uso: python rodar_variante.py <script.py> [args...] | -m <módulo> [args...]", file=sys.stderr)
+        sys.exit(2)
+
+    instalar_mongomock()
+    instalar_archivebox_api()
+
+    codigo_saida = 0
+    try:
+        if sys.argv[1] == "-m":
+            # O pacote já lê ARCHIVEBOX_DIR e WAYBACK_CDX_API do ambiente
+            modulo = sys.argv[2]
+            instalar_eventos_http()
+            sys.argv = [modulo] + sys.argv[3:]
+            runpy.run_module(modulo, run_name="__main__", alter_sys=True)
+        else:
+            script = Path(sys.argv[1]).resolve()
+            codigo = compile(adaptar_fonte(script.read_text(encoding="utf-8")), str(script), "exec")
+            sys.argv = [str(script)] + sys.argv[2:]
+            exec(codigo, {"__name__": "__main__", "__file__": str(script)})
+    except SystemExit as e:
+        codigo_saida = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+    finally:
+        gravar_resultado(codigo_saida)
+    sys.exit(codigo_saida)
+
+if __name__ == "__main__":
+    main()
@@ -8,6 +8,7 @@ import logging
 import asyncio
 from playwright.async_api import async_playwright
 import re
+from maquina_do_tempo.indice_consolidado import gerar_indice
 
 # Configurações
 ARCHIVEBOX_DIR = "/Users/wellisonbertelli/Documents/Poder360_estagio/waybackmachine_maquina_do_tempo/archivebox/get"  # Substitua pelo caminho correto
@@ -26,12 +27,14 @@ logging.basicConfig(
 )
 
 class ArquivosDaHomeNovosObtidosComSeleniumModel:
-    def __init__(self, device, content, timestamp, isAdvertisingModified, advertising_id_when_isModified):
+    def __init__(self, device, content, timestamp, isAdvertisingModified, advertising_id_when_isModified, url=None):
         self.device = device
         self.content = content
         self.timestamp = timestamp
         self.isAdvertisingModified = isAdvertisingModified
         self.advertising_id_when_isModified = advertising_id_when_isModified
+        # Link do snapshot no ArchiveBox (usado apenas no índice, não vai para o MongoDB)
+        self.url = url
 
     def to_dict(self):
         return {
@@ -134,7 +137,8 @@ def fetch_archived_entries(recent_hours=24):
             content=archive_link,  # Inicialmente, armazenamos o link; será substituído pelo conteúdo HTML
             timestamp=iso_timestamp,
             isAdvertisingModified=False,
-            advertising_id_when_isModified=None
+            advertising_id_when_isModified=None,
+            url=archive_link
         )
         
         archived_entries.append(entry)
@@ -156,35 +160,12 @@ async def fetch_full_html(url):
         logging.error(f"Erro ao obter conteúdo de {url}: {e}")
         return None
 
-def create_consolidated_index(archived_data, output_path):
-    """Cria um arquivo index.html consolidado contendo todas as páginas arquivadas."""
-    with open(output_path, "w", encoding="utf-8") as f:
-        f.write("<!DOCTYPE html>\n<html lang='pt-BR'>\n<head>\n<meta charset='UTF-8'>\n")
-        f.write("<meta name='viewport' content='width=device-width, initial-scale=1.0'>\n")
-        f.write("<title>Índice Consolidado ArchiveBox</title>\n")
-        # Adicionar estilos básicos
-        f.write("""
-        <style>
-            body { font-family: Arial, sans-serif; margin: 20px; }
-            h1 { text-align: center; }
-            .archive-entry { margin-bottom: 20px; }
-            .archive-entry h2 { margin-bottom: 5px; }
-            .archive-entry a { text-decoration: none; color: #1a0dab; }
-            .archive-entry a:hover { text-decoration: underline; }
-            .archived-on { color: #555; font-size: 0.9em; }
-        </style>
-        """)
-        f.write("</head>\n<body>\n")
-        f.write("<h1>Índice Consolidado ArchiveBox</h1>\n")
-    
-        for entry in archived_data:
-            f.write("<div class='archive-entry'>\n")
-            f.write(f"  <h2><a href='{entry['url']}' target='_blank'>Snapshot ID: {entry['url'].split('/')[-2]}</a></h2>\n")
-            f.write(f"  <p class='archived-on'>Arquivado em: {entry['timestamp']}</p>\n")
-            f.write("</div>\n")
-    
-        f.write("</body>\n</html>")
-    logging.info(f"Arquivo index.html consolidado criado em {output_path}")
+def create_consolidated_index(archived_data, output_dir):
+    """
+    Cria o índice consolidado paginado (index.html, pagina-NNNN.html e busca.json)
+    em output_dir. As entradas são lidas como objetos de modelo via indice_consolidado.
+    """
+    gerar_indice(archived_data, output_dir)
 
 async def process_archived_entries(archived_entries):
     """Processa cada entrada arquivada para obter o HTML completo e atualizar o conteúdo."""
@@ -249,8 +230,8 @@ def main():
     asyncio.run(process_archived_entries(archived_entries))
     
     # Criar o arquivo index.html consolidado
-    consolidated_index_path = os.path.join(ARCHIVEBOX_DIR, "consolidated_index.html")
-    create_consolidated_index(archived_entries, consolidated_index_path)
+    consolidated_index_dir = os.path.join(ARCHIVEBOX_DIR, "consolidated_index")
+    create_consolidated_index(archived_entries, consolidated_index_dir)
     
     # Enviar os dados para o MongoDB
     upload_to_mongodb(archived_entries)
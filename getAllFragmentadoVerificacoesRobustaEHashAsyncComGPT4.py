@@ -1,106 +1,38 @@
+import argparse
 import asyncio
-import hashlib
 import logging
 import os
 import re
-import shutil
 import sys
+import time
 from datetime import datetime, timezone
 from pathlib import Path
-from pymongo import MongoClient
-from pymongo.errors import ServerSelectionTimeoutError
-from subprocess import CalledProcessError, run
-from bson.binary import Binary
+from maquina_do_tempo.estagios import ErroCaptura, executar_processo
+from maquina_do_tempo.ingestao import ArquivosDaHomeWaybackMachineModel, carregar_conteudo
+from maquina_do_tempo.limpeza import ReaperSnapshots
+from maquina_do_tempo.metricas import METRICAS, PORTA_METRICAS
+
+try:
+    # pymongo >= 4.10 traz o driver assíncrono nativo
+    from pymongo import AsyncMongoClient
+except ImportError:
+    try:
+        from motor.motor_asyncio import AsyncIOMotorClient as AsyncMongoClient
+    except ImportError:
+        AsyncMongoClient = None
 
 # Configurações gerais
 ARCHIVEBOX_DIR = "/Users/wellisonbertelli/Documents/Poder360_estagio/waybackmachine_maquina_do_tempo/archivebox/get"
-URL_LIST_FILE = sys.argv[1] if len(sys.argv) > 1 else None
+MONGODB_URI = "mongodb://127.0.0.1:27017"
 DATABASE_NAME = "archivebox_db"
 COLLECTION_NAME = "arquivos_da_home_obtidos_no_wayback_machine"
 LOG_FILE = os.path.join(ARCHIVEBOX_DIR, "archive_and_upload.log")
 
-# Configuração de logging
-logging.basicConfig(
-    filename=LOG_FILE,
-    level=logging.INFO,
-    format='%(asctime)s [%(levelname)s]: %(message)s',
-)
-
-class ArquivosDaHomeWaybackMachineModel:
-    """Modelo de documento para o MongoDB."""
-    def __init__(self, device, content, timestamp, isAdvertisingModified, advertising_id_when_isModified):
-        self.device = device
-        self.content = content
-        self.timestamp = timestamp
-        self.isAdvertisingModified = isAdvertisingModified
-        self.advertising_id_when_isModified = advertising_id_when_isModified
-    
-    def to_dict(self):
-        return {
-            "device": self.device,
-            "content": Binary(self.content.encode('utf-8')),
-            "timestamp": self.timestamp,
-            "isAdvertisingModified": self.isAdvertisingModified,
-            "advertising_id_when_isModified": self.advertising_id_when_isModified,
-        }
-
-async def archive_url(url):
-    """Processa uma URL, arquiva e salva no MongoDB."""
-    try:
-        logging.info(f"Iniciando processamento para URL: {url}")
-        result = run(
-            ["archivebox", "add", url],
-            cwd=ARCHIVEBOX_DIR,
-            capture_output=True,
-            text=True,
-            check=True,
-        )
-
-        output = result.stdout
-        logging.debug(f"Saída do ArchiveBox: {output}")
-
-        match = re.search(r"> \./archive/([\w.]+)/?", output)
-        if not match:
-            logging.error(f"Snapshot não encontrado para URL: {url}")
-            return
-
-        base_path = match.group(1)
-        snapshot_dir = Path(ARCHIVEBOX_DIR) / "archive" / base_path
-        singlefile_html = snapshot_dir / "singlefile.html"
-
-        if not singlefile_html.exists():
-            logging.error(f"Arquivo singlefile.html não encontrado para URL: {url}")
-            return
-
-        with open(singlefile_html, "r", encoding="utf-8") as f:
-            content = f.read()
-
-        timestamp = extract_wayback_timestamp_substring(url)
-        if not timestamp:
-            logging.error(f"Timestamp inválido para URL: {url}")
-            return
-
-        dt_naive = datetime.strptime(timestamp, "%Y%m%d%H%M%S")
-        dt_utc = dt_naive.replace(tzinfo=timezone.utc)
-
-        document = ArquivosDaHomeWaybackMachineModel(
-            device="--window-size=1280,720",
-            content=content,
-            timestamp=dt_utc,
-            isAdvertisingModified=False,
-            advertising_id_when_isModified=None,
-        ).to_dict()
-
-        async with MongoClient("mongodb://127.0.0.1:27017", serverSelectionTimeoutMS=5000) as client:
-            db = client[DATABASE_NAME]
-            collection = db[COLLECTION_NAME]
-            result = await collection.insert_one(document)
-            logging.info(f"Documento inserido com ID: {result.inserted_id}")
-
-    except CalledProcessError as e:
-        logging.error(f"Erro ao executar ArchiveBox: {e.stderr}")
-    except Exception as e:
-        logging.error(f"Erro inesperado ao processar URL {url}: {e}")
+# Quantas capturas (processos do ArchiveBox/Chrome) rodam ao mesmo tempo
+MAX_CONCORRENCIA = 4
+
+# Compilar a regex para extrair o caminho do snapshot (compilada uma única vez)
+ARCHIVE_PATH_REGEX = re.compile(r"> \./archive/([\w.]+)/?")
 
 def extract_wayback_timestamp_substring(url):
     """Extrai o timestamp do Wayback Machine (YYYYMMDDhhmmss)."""
@@ -113,21 +45,189 @@ def extract_wayback_timestamp_substring(url):
         logging.error(f"Marker '/web/' não encontrado na URL: {url}")
         return None
 
+class MotorAsync:
+    """
+    Orquestra as capturas com asyncio: cada URL vira um processo do ArchiveBox
+    (create_subprocess_exec), limitado por um semáforo, com leitura de arquivo
+    fora do event loop e inserção pelo driver assíncrono do MongoDB.
+    """
+    def __init__(self, collection, success_log, error_log, max_concorrencia=MAX_CONCORRENCIA, reaper=None):
+        self.collection = collection
+        self.reaper = reaper
+        self.success_log = Path(success_log)
+        self.error_log = Path(error_log)
+        self.semaforo = asyncio.Semaphore(max_concorrencia)
+        self.lock_logs = asyncio.Lock()
+        self.em_voo = 0
+        METRICAS.registrar_gauge("capturas_em_voo", lambda: self.em_voo)
+
+    async def _registrar(self, caminho, linha):
+        async with self.lock_logs:
+            await asyncio.to_thread(_anexar_linha, caminho, linha)
+
+    async def log_success(self, url):
+        await self._registrar(self.success_log, url)
+
+    async def log_error(self, url, error_message):
+        logging.error(f"{url}: {error_message}")
+        await self._registrar(self.error_log, f"{url}: {error_message}")
+
+    async def capturar(self, url):
+        """Roda o 'archivebox add' e devolve o diretório do snapshot (ou None)."""
+        async with self.semaforo:
+            if self.reaper is not None:
+                # Backpressure: não inicia capturas com o disco abaixo do mínimo
+                await asyncio.to_thread(self.reaper.aguardar_espaco)
+            logging.info(f"Iniciando captura para URL: {url}")
+            self.em_voo += 1
+            try:
+                with METRICAS.tempo("captura"):
+                    output = await executar_processo(["archivebox", "add", url], cwd=ARCHIVEBOX_DIR)
+            finally:
+                self.em_voo -= 1
+
+        match = ARCHIVE_PATH_REGEX.search(output)
+        if not match:
+            return None
+        return Path(ARCHIVEBOX_DIR) / "archive" / match.group(1)
+
+    async def archive_url(self, url):
+        """Processa uma URL, arquiva e salva no MongoDB."""
+        try:
+            timestamp = extract_wayback_timestamp_substring(url)
+            if not timestamp:
+                await self.log_error(url, "Timestamp inválido")
+                return
+
+            snapshot_dir = await self.capturar(url)
+            if snapshot_dir is None:
+                METRICAS.falha("captura", "SnapshotNaoEncontrado")
+                await self.log_error(url, "Snapshot não encontrado na saída do ArchiveBox")
+                return
+
+            singlefile_html = snapshot_dir / "singlefile.html"
+            if not singlefile_html.exists():
+                await self.log_error(url, "Arquivo singlefile.html não encontrado")
+                return
+
+            try:
+                with METRICAS.tempo("leitura"):
+                    content, content_encoding = await asyncio.to_thread(carregar_conteudo, singlefile_html)
+            except ValueError as e:
+                METRICAS.falha("leitura", "ConteudoInvalido")
+                await self.log_error(url, str(e))
+                return
+
+            dt_utc = datetime.strptime(timestamp, "%Y%m%d%H%M%S").replace(tzinfo=timezone.utc)
+            with METRICAS.tempo("codificacao"):
+                document = ArquivosDaHomeWaybackMachineModel(
+                    device="--window-size=1280,720",
+                    content=content,
+                    timestamp=dt_utc,
+                    isAdvertisingModified=False,
+                    advertising_id_when_isModified=None,
+                    content_encoding=content_encoding,
+                ).to_dict()
+
+            with METRICAS.tempo("insercao_mongo"):
+                result = await self.collection.insert_one(document)
+            logging.info(f"Documento inserido com ID: {result.inserted_id} para URL: {url}")
+            if self.reaper is not None:
+                self.reaper.agendar(snapshot_dir)
+            METRICAS.sucesso("pipeline")
+            await self.log_success(url)
+
+        except ErroCaptura as e:
+            METRICAS.falha("captura", e)
+            await self.log_error(url, f"Erro ao executar ArchiveBox: {e.stderr}")
+        except Exception as e:
+            METRICAS.falha("pipeline", e)
+            await self.log_error(url, f"Erro inesperado: {e}")
+
+    async def processar(self, urls):
+        await asyncio.gather(*(self.archive_url(url) for url in urls))
+
+def _anexar_linha(caminho, linha):
+    with open(caminho, "a", encoding="utf-8") as f:
+        f.write(f"{linha}\n")
+
+# =============================
+# Benchmark de sobreposição
+# =============================
+async def benchmark_sobreposicao(n=8, duracao=1.0, max_concorrencia=MAX_CONCORRENCIA):
+    """
+    Dispara n processos que apenas dormem 'duracao' segundos pelo mesmo caminho
+    usado nas capturas (semáforo + create_subprocess_exec) e mede se eles de fato
+    se sobrepõem: tempo de parede contra a soma dos tempos individuais e o pico
+    de processos simultâneos.
+    """
+    semaforo = asyncio.Semaphore(max_concorrencia)
+    em_voo = 0
+    pico = 0
+    duracoes = []
+
+    async def um(i):
+        nonlocal em_voo, pico
+        async with semaforo:
+            em_voo += 1
+            pico = max(pico, em_voo)
+            inicio = time.perf_counter()
+            await executar_processo([sys.executable, "-c", f"import time; time.sleep({duracao})"])
+            duracoes.append(time.perf_counter() - inicio)
+            em_voo -= 1
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(um(i) for i in range(n)))
+    parede = time.perf_counter() - inicio
+    soma = sum(duracoes)
+    return {
+        "processos": n,
+        "max_concorrencia": max_concorrencia,
+        "tempo_parede_s": round(parede, 3),
+        "soma_tempos_s": round(soma, 3),
+        "sobreposicao": round(soma / parede, 2) if parede else 0.0,
+        "pico_simultaneos": pico,
+    }
+
 async def main():
     """Função principal para processar URLs."""
-    if not URL_LIST_FILE:
+    parser = argparse.ArgumentParser(description="Arquiva URLs do Wayback com asyncio.")
+    parser.add_argument("url_list_file", nargs="?", help="Arquivo com uma URL por linha")
+    parser.add_argument("--concorrencia", type=int, default=MAX_CONCORRENCIA)
+    parser.add_argument("--metricas-porta", type=int, default=PORTA_METRICAS,
+                        help="Porta local do endpoint /metrics (0 desliga)")
+    parser.add_argument("--benchmark", type=int, metavar="N",
+                        help="Executa N processos de teste e mede a sobreposição real")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        print(await benchmark_sobreposicao(args.benchmark, max_concorrencia=args.concorrencia))
+        return
+
+    logging.basicConfig(
+        filename=LOG_FILE,
+        level=logging.INFO,
+        format='%(asctime)s [%(levelname)s]: %(message)s',
+    )
+
+    if not args.url_list_file:
         logging.error("Arquivo URL_LIST_FILE não fornecido.")
         sys.exit(1)
 
-    urls_file_path = Path(URL_LIST_FILE)
+    urls_file_path = Path(args.url_list_file)
     if not urls_file_path.exists():
-        logging.error(f"Arquivo {URL_LIST_FILE} não encontrado.")
+        logging.error(f"Arquivo {args.url_list_file} não encontrado.")
+        sys.exit(1)
+
+    if AsyncMongoClient is None:
+        logging.error("Driver assíncrono do MongoDB indisponível: instale pymongo>=4.10 ou motor.")
         sys.exit(1)
 
     with open(urls_file_path, "r", encoding="utf-8") as f:
         urls = [line.strip() for line in f if line.strip() and not line.startswith("#")]
 
     success_log = Path(ARCHIVEBOX_DIR) / "success_insertInto_mongo.txt"
+    error_log = Path(ARCHIVEBOX_DIR) / "error_insertInto_mongo.txt"
     processed_urls = set()
 
     if success_log.exists():
@@ -136,8 +236,23 @@ async def main():
 
     urls_to_process = [url for url in urls if url not in processed_urls]
 
-    tasks = [archive_url(url) for url in urls_to_process]
-    await asyncio.gather(*tasks)
+    if args.metricas_porta:
+        METRICAS.servir(args.metricas_porta)
+
+    client = AsyncMongoClient(MONGODB_URI, serverSelectionTimeoutMS=5000)
+    reaper = ReaperSnapshots(Path(ARCHIVEBOX_DIR) / "archive", error_log=error_log).iniciar()
+    try:
+        collection = client[DATABASE_NAME][COLLECTION_NAME]
+        motor = MotorAsync(collection, success_log, error_log, args.concorrencia, reaper)
+        await motor.processar(urls_to_process)
+    finally:
+        await asyncio.to_thread(reaper.parar)
+        resumo = METRICAS.resumo()
+        logging.info(f"\n{resumo}")
+        print(resumo)
+        fechar = client.close()
+        if asyncio.iscoroutine(fechar):
+            await fechar
 
 if __name__ == "__main__":
     asyncio.run(main())
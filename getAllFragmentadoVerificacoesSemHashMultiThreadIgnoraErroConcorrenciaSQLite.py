@@ -8,8 +8,9 @@ import logging
 import json
 from pathlib import Path
 import re
-from bson.binary import Binary
-import shutil
+from maquina_do_tempo.ingestao import ArquivosDaHomeWaybackMachineModel, ler_snapshot_bytes
+from maquina_do_tempo.limpeza import ReaperSnapshots
+from maquina_do_tempo.metricas import METRICAS, PORTA_METRICAS
 import sqlite3
 import time
 
@@ -77,24 +78,6 @@ def enable_wal_mode(db_path):
     except Exception as e:
         logging.error(f"Erro ao habilitar o modo WAL: {e}")
 
-class ArquivosDaHomeWaybackMachineModel:
-    """Modelo de documento para o MongoDB."""
-    def __init__(self, device, content, timestamp, isAdvertisingModified, advertising_id_when_isModified):
-        self.device = device
-        self.content = content
-        self.timestamp = timestamp
-        self.isAdvertisingModified = isAdvertisingModified
-        self.advertising_id_when_isModified = advertising_id_when_isModified
-    
-    def to_dict(self):
-        return {
-            "device": self.device,
-            "content": Binary(self.content.encode('utf-8')),
-            "timestamp": self.timestamp,
-            "isAdvertisingModified": self.isAdvertisingModified,
-            "advertising_id_when_isModified": self.advertising_id_when_isModified
-        }
-
 def extract_wayback_timestamp_substring(url: str) -> str:
     """
     Extrai o timestamp do Wayback Machine (YYYYMMDDhhmmss) da URL.
@@ -137,15 +120,19 @@ def archive_urls_chunk(urls_chunk, retries=3, delay=5):
     attempt = 0
     while attempt < retries:
         try:
+            # Espera o reaper liberar espaço em disco antes de capturar mais
+            reaper.aguardar_espaco()
+
             # Executa o ArchiveBox com todas as URLs do chunk
             cmd = ["archivebox", "add"] + urls_chunk
-            result = subprocess.run(
-                cmd,
-                cwd=ARCHIVEBOX_DIR,
-                capture_output=True,
-                text=True,
-                check=True
-            )
+            with METRICAS.tempo("captura"):
+                result = subprocess.run(
+                    cmd,
+                    cwd=ARCHIVEBOX_DIR,
+                    capture_output=True,
+                    text=True,
+                    check=True
+                )
 
             logging.info(f"ArchiveBox executado com sucesso para o lote de {len(urls_chunk)} URLs.")
             output = result.stdout
@@ -185,63 +172,58 @@ def archive_urls_chunk(urls_chunk, retries=3, delay=5):
                     singlefile_html = snapshot_dir / "singlefile.html"
 
                     if singlefile_html.exists():
-                        with open(singlefile_html, "r", encoding="utf-8") as f:
-                            logging.info(f"Snapshot encontrado: {singlefile_html}")
-                            timestamp_str = extract_wayback_timestamp_substring(url)
-                            if timestamp_str is not None:
-                                dt_naive = datetime.strptime(timestamp_str, "%Y%m%d%H%M%S")
-                                dt_utc = dt_naive.replace(tzinfo=timezone.utc)
-                                html_content = f.read()
-
-                                if not html_content:
-                                    error_message = f"Conteúdo HTML vazio para URL: {url}\n"
+                        # Leitura só em bytes: o HTML vai para o BSON sem decode/encode
+                        with METRICAS.tempo("leitura"):
+                            html_content = ler_snapshot_bytes(singlefile_html)
+                        logging.info(f"Snapshot encontrado: {singlefile_html}")
+                        timestamp_str = extract_wayback_timestamp_substring(url)
+                        if timestamp_str is not None:
+                            dt_naive = datetime.strptime(timestamp_str, "%Y%m%d%H%M%S")
+                            dt_utc = dt_naive.replace(tzinfo=timezone.utc)
+
+                            if not html_content:
+                                error_message = f"Conteúdo HTML vazio para URL: {url}\n"
+                                logging.error(error_message)
+                                with open(error_log, 'a', encoding='utf-8') as ef:
+                                    ef.write(error_message)
+                            else:
+                                # Monta o documento e insere no Mongo
+                                page_model = ArquivosDaHomeWaybackMachineModel(
+                                    device='--window-size=1280,720',
+                                    content=html_content,
+                                    timestamp=dt_utc,
+                                    isAdvertisingModified=False,
+                                    advertising_id_when_isModified=None
+                                )
+                                with METRICAS.tempo("codificacao"):
+                                    page_dict = page_model.to_dict()
+
+                                if not client:
+                                    error_message = f"Falha na conexão com o MongoDB para URL: {url}\n"
                                     logging.error(error_message)
                                     with open(error_log, 'a', encoding='utf-8') as ef:
                                         ef.write(error_message)
-                                else:
-                                    # Monta o documento e insere no Mongo
-                                    page_model = ArquivosDaHomeWaybackMachineModel(
-                                        device='--window-size=1280,720',
-                                        content=html_content,
-                                        timestamp=dt_utc,
-                                        isAdvertisingModified=False,
-                                        advertising_id_when_isModified=None
-                                    )
-                                    page_dict = page_model.to_dict()
+                                    continue  # não adianta prosseguir
 
-                                    if not client:
-                                        error_message = f"Falha na conexão com o MongoDB para URL: {url}\n"
-                                        logging.error(error_message)
-                                        with open(error_log, 'a', encoding='utf-8') as ef:
-                                            ef.write(error_message)
-                                        continue  # não adianta prosseguir
-
-                                    database = client[DATABASE_NAME]
-                                    collection = database[COLLECTION_NAME]
+                                database = client[DATABASE_NAME]
+                                collection = database[COLLECTION_NAME]
+                                with METRICAS.tempo("insercao_mongo"):
                                     response = collection.insert_one(page_dict)
-                                    logging.info(f"Documento inserido com ID: {response.inserted_id} para URL: {url}")
-
-                                    # Remover o diretório do snapshot
-                                    try:
-                                        shutil.rmtree(snapshot_dir)
-                                        logging.info(f"Diretório {snapshot_dir} removido com sucesso.")
-                                    except Exception as rmtree_error:
-                                        error_message = (
-                                            f"Erro ao remover {snapshot_dir} para URL: {url} - {rmtree_error}\n"
-                                        )
-                                        logging.error(error_message)
-                                        with open(error_log, 'a', encoding='utf-8') as ef:
-                                            ef.write(error_message)
-
-                                    # Registrar o sucesso
-                                    with open(success_log, 'a', encoding='utf-8') as sf:
-                                        sf.write(f"{url}\n")
-                                    logging.info(f"URL {url} registrada com sucesso.")
-                            else:
-                                error_message = f"Erro na extração do timestamp para URL: {url}\n"
-                                logging.error(error_message)
-                                with open(error_log, 'a', encoding='utf-8') as ef:
-                                    ef.write(error_message)
+                                logging.info(f"Documento inserido com ID: {response.inserted_id} para URL: {url}")
+
+                                # Remoção do diretório fica com o reaper (em segundo plano)
+                                reaper.agendar(snapshot_dir)
+
+                                # Registrar o sucesso
+                                with open(success_log, 'a', encoding='utf-8') as sf:
+                                    sf.write(f"{url}\n")
+                                METRICAS.sucesso("pipeline")
+                                logging.info(f"URL {url} registrada com sucesso.")
+                        else:
+                            error_message = f"Erro na extração do timestamp para URL: {url}\n"
+                            logging.error(error_message)
+                            with open(error_log, 'a', encoding='utf-8') as ef:
+                                ef.write(error_message)
                     else:
                         error_message = f"singlefile.html não encontrado para URL: {url}\n"
                         logging.error(error_message)
@@ -249,6 +231,7 @@ def archive_urls_chunk(urls_chunk, retries=3, delay=5):
                             ef.write(error_message)
 
                 except Exception as e_individual:
+                    METRICAS.falha("pipeline", e_individual)
                     error_message = f"Erro processando URL {url} no chunk: {e_individual}\n"
                     logging.error(error_message)
                     with open(error_log, 'a', encoding='utf-8') as ef:
@@ -261,6 +244,7 @@ def archive_urls_chunk(urls_chunk, retries=3, delay=5):
             # Verifica se o erro menciona "database is locked"
             if "database is locked" in e.stderr.lower():
                 attempt += 1
+                METRICAS.retry("captura", "database_locked")
                 if attempt < retries:
                     logging.warning(
                         f"database locked para o chunk, esperando {delay}s e tentando novamente "
@@ -275,6 +259,7 @@ def archive_urls_chunk(urls_chunk, retries=3, delay=5):
                         ef.write(f"Erro de lock após {retries} tentativas para chunk: {urls_chunk}\n")
             else:
                 # Se for outro tipo de erro, registrar e sair
+                METRICAS.falha("captura", e)
                 error_message = f"Erro ao arquivar chunk {urls_chunk}: {e.stderr}\n"
                 logging.error(error_message)
                 with open(error_log, 'a', encoding='utf-8') as ef:
@@ -284,6 +269,7 @@ def archive_urls_chunk(urls_chunk, retries=3, delay=5):
         except Exception as ex:
             if "database is locked" in str(ex).lower():
                 attempt += 1
+                METRICAS.retry("captura", "database_locked")
                 if attempt < retries:
                     logging.warning(
                         f"database locked para o chunk, esperando {delay}s e tentando novamente "
@@ -297,6 +283,7 @@ def archive_urls_chunk(urls_chunk, retries=3, delay=5):
                     with open(error_log, 'a', encoding='utf-8') as ef:
                         ef.write(f"Erro de lock após {retries} tentativas para chunk: {urls_chunk}\n")
             else:
+                METRICAS.falha("captura", ex)
                 error_message = f"Ocorreu um erro inesperado para chunk: {urls_chunk} - {ex}\n"
                 logging.error(error_message)
                 with open(error_log, 'a', encoding='utf-8') as ef:
@@ -311,6 +298,9 @@ def archive_urls_chunk(urls_chunk, retries=3, delay=5):
 
 client = conectarBanco()
 
+# Remove os snapshots já inseridos em segundo plano e segura a captura se o disco encher
+reaper = ReaperSnapshots(Path(ARCHIVEBOX_DIR) / "archive", error_log=Path(ARCHIVEBOX_DIR) / "error_insertInto_mongo.txt")
+
 def main():
     logging.info("Iniciando o processo de arquivamento...")
 
@@ -349,9 +339,18 @@ def main():
 
     # Quebrar as URLs em chunks de 10
     chunk_size = 10
-    for i in range(0, len(urls_to_process), chunk_size):
-        urls_chunk = urls_to_process[i:i+chunk_size]
-        archive_urls_chunk(urls_chunk)
+    METRICAS.servir(PORTA_METRICAS)
+    pendentes = len(urls_to_process)
+    METRICAS.registrar_gauge("urls_pendentes", lambda: pendentes)
+    with reaper:
+        for i in range(0, len(urls_to_process), chunk_size):
+            urls_chunk = urls_to_process[i:i+chunk_size]
+            archive_urls_chunk(urls_chunk)
+            pendentes -= len(urls_chunk)
+
+    resumo = METRICAS.resumo()
+    logging.info(f"\n{resumo}")
+    print(resumo)
 
 if __name__ == "__main__":
     main()
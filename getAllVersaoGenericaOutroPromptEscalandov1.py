@@ -14,6 +14,7 @@ from bson.binary import Binary
 from pymongo import MongoClient
 from pymongo.errors import ServerSelectionTimeoutError
 import shutil
+from maquina_do_tempo.metricas import METRICAS
 
 # =======================================
 # CONFIGURAÇÕES
@@ -95,9 +96,12 @@ def get_wayback_snapshots(url_or_domain: str) -> List[str]:
     }
 
     try:
-        r = requests.get(WAYBACK_CDX_API, params=params, timeout=30)
-        r.raise_for_status()
+        with METRICAS.tempo("cdx"):
+            r = requests.get(WAYBACK_CDX_API, params=params, timeout=30)
+            r.raise_for_status()
+        METRICAS.sucesso("cdx")
     except requests.exceptions.RequestException as e:
+        METRICAS.falha("cdx", e)
         logging.error(f"Erro ao consultar Wayback CDX API: {e}")
         return []
 
@@ -183,13 +187,15 @@ def archive_urls_chunk(urls_chunk: List[str]) -> None:
     while attempt < RETRIES:
         try:
             cmd = ["archivebox", "add"] + urls_chunk
-            result = subprocess.run(
-                cmd,
-                cwd=ARCHIVEBOX_DIR,
-                capture_output=True,
-                text=True,
-                check=True
-            )
+            with METRICAS.tempo("captura"):
+                result = subprocess.run(
+                    cmd,
+                    cwd=ARCHIVEBOX_DIR,
+                    capture_output=True,
+                    text=True,
+                    check=True
+                )
+            METRICAS.sucesso("captura")
             # Se chegou aqui, deu certo
             logging.info(f"ArchiveBox: chunk de {len(urls_chunk)} URLs adicionado com sucesso.")
 
@@ -312,6 +318,7 @@ def archive_urls_chunk(urls_chunk: List[str]) -> None:
             stderr_lower = e.stderr.lower() if e.stderr else ""
             if "database is locked" in stderr_lower:
                 attempt += 1
+                METRICAS.retry("captura", "database_locked")
                 if attempt < RETRIES:
                     logging.warning(
                         f"database locked para esse chunk, esperando {DELAY}s e tentando novamente "
@@ -328,6 +335,7 @@ def archive_urls_chunk(urls_chunk: List[str]) -> None:
                         ef.write(msg + "\n")
             else:
                 # Outro erro
+                METRICAS.falha("captura", e)
                 msg = f"Erro no subprocesso ArchiveBox: {e.stderr}\nChunk: {urls_chunk}"
                 logging.error(msg)
                 with open(error_log_path, "a", encoding="utf-8") as ef:
@@ -338,6 +346,7 @@ def archive_urls_chunk(urls_chunk: List[str]) -> None:
             ex_str = str(ex).lower()
             if "database is locked" in ex_str:
                 attempt += 1
+                METRICAS.retry("captura", "database_locked")
                 if attempt < RETRIES:
                     logging.warning(
                         f"database locked (Exceção) para chunk, esperando {DELAY}s e tentando novamente "
@@ -353,6 +362,7 @@ def archive_urls_chunk(urls_chunk: List[str]) -> None:
                     with open(error_log_path, "a", encoding="utf-8") as ef:
                         ef.write(msg + "\n")
             else:
+                METRICAS.falha("captura", ex)
                 msg = f"Erro inesperado para chunk: {urls_chunk} - {ex}"
                 logging.error(msg)
                 with open(error_log_path, "a", encoding="utf-8") as ef:
@@ -416,6 +426,9 @@ def main():
             except Exception as e:
                 logging.error(f"Erro processando chunk {chunk}: {e}")
 
+    resumo = METRICAS.resumo()
+    logging.info(f"\n{resumo}")
+    print(resumo)
     logging.info("Processo concluído com sucesso!")
 
 if __name__ == "__main__":
@@ -0,0 +1,38 @@
+"""
+Pipeline de captura das homes do Wayback Machine (ArchiveBox + MongoDB).
+
+    python -m maquina_do_tempo urls.txt --engine threads --workers 4
+    python -m maquina_do_tempo --dominio poder360.com.br --engine asyncio
+
+As etapas ficam em estagios.py e as estratégias de execução em engines.py;
+os scripts getAll*.py da raiz são as versões anteriores, mantidas para
+comparação no benchmark/.
+
+Os nomes abaixo são importados sob demanda: importar o pacote (o que
+"python -m maquina_do_tempo.<modulo>" faz antes de rodar o módulo) não
+carrega engines/estagios nem executa de novo os submódulos com CLI.
+"""
+import importlib
+
+_EXPORTADOS = {
+    "ArquivosDaHomeWaybackMachineModel": "ingestao",
+    "ConfigPipeline": "estagios",
+    "ENGINES": "engines",
+    "METRICAS": "metricas",
+    "Pipeline": "estagios",
+    "criar_motor": "engines",
+    "extract_wayback_timestamp_substring": "wayback",
+}
+
+__all__ = sorted(_EXPORTADOS)
+
+def __getattr__(nome):
+    modulo = _EXPORTADOS.get(nome)
+    if modulo is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {nome!r}")
+    valor = getattr(importlib.import_module(f".{modulo}", __name__), nome)
+    globals()[nome] = valor
+    return valor
+
+def __dir__():
+    return sorted(set(globals()) | set(_EXPORTADOS))
@@ -0,0 +1,83 @@
+"""
+Ordem de agendamento das capturas.
+
+O CDX é processado do mais novo para o mais antigo: uma execução interrompida
+tem os últimos meses completos e nada dos anos anteriores. A ordem por
+cobertura bissecta o período recursivamente: primeiro a captura mais perto
+do meio do período, depois as mais perto do meio de cada metade, e assim por
+diante. Dentro de cada nível as metades seguem a ordem de van der Corput
+(bits da posição invertidos), então a cada ponto da execução o que já foi
+capturado é uma amostra espalhada pelo período todo, e dá para parar cedo.
+
+    urls = ordenar_urls(urls, "cobertura")
+"""
+import calendar
+from bisect import bisect_left
+
+from .wayback import extract_wayback_timestamp_substring
+
+# =============================
+# Configurações e Constantes
+# =============================
+ORDENS = ("cobertura", "recentes", "antigas")
+
+def _segundos(timestamp):
+    """Timestamp do Wayback (YYYYMMDDhhmmss) em segundos desde a época, sem datetime (bem mais rápido)."""
+    return calendar.timegm((int(timestamp[:4]), int(timestamp[4:6]), int(timestamp[6:8]),
+                            int(timestamp[8:10]), int(timestamp[10:12]), int(timestamp[12:14])))
+
+def _inverter_bits(valor, bits):
+    return int(format(valor, f"0{bits}b")[::-1], 2) if bits else 0
+
+def ordem_cobertura(segundos):
+    """
+    Índices de 'segundos' (em ordem crescente) na ordem de bissecção do
+    período. Cada intervalo de tempo contribui com a captura mais perto do
+    seu meio; as duas metades descem um nível.
+    """
+    n = len(segundos)
+    if n == 0:
+        return []
+    chaves = []
+    # (início, fim) em índices, (t0, t1) em segundos, profundidade e posição no nível
+    pilha = [(0, n, segundos[0], segundos[-1], 0, 0)]
+    while pilha:
+        inicio, fim, t0, t1, profundidade, posicao = pilha.pop()
+        if segundos[inicio] == segundos[fim - 1]:
+            # Capturas no mesmo segundo: bissecta pela posição
+            meio = segundos[inicio]
+            k = (inicio + fim) // 2
+        else:
+            meio = (t0 + t1) / 2
+            k = bisect_left(segundos, meio, inicio, fim)
+            if k == fim or (k > inicio and meio - segundos[k - 1] <= segundos[k] - meio):
+                k -= 1
+        chaves.append((profundidade, _inverter_bits(posicao, profundidade), k))
+        if inicio < k:
+            pilha.append((inicio, k, t0, meio, profundidade + 1, 2 * posicao))
+        if k + 1 < fim:
+            pilha.append((k + 1, fim, meio, t1, profundidade + 1, 2 * posicao + 1))
+    chaves.sort()
+    return [k for _, _, k in chaves]
+
+def ordenar_urls(urls, ordem="cobertura"):
+    """
+    URLs do Wayback na ordem pedida: cobertura (bissecção do período),
+    recentes (a mais nova primeiro, como o CDX) ou antigas. URLs sem
+    timestamp vão para o fim, na ordem em que vieram.
+    """
+    if ordem not in ORDENS:
+        raise ValueError(f"Ordem desconhecida: {ordem} (use {', '.join(ORDENS)})")
+    com_timestamp = []
+    sem_timestamp = []
+    for url in urls:
+        timestamp = extract_wayback_timestamp_substring(url)
+        if timestamp:
+            com_timestamp.append((_segundos(timestamp), url))
+        else:
+            sem_timestamp.append(url)
+    com_timestamp.sort(key=lambda par: par[0], reverse=ordem == "recentes")
+    if ordem == "cobertura":
+        indices = ordem_cobertura([segundos for segundos, _ in com_timestamp])
+        return [com_timestamp[i][1] for i in indices] + sem_timestamp
+    return [url for _, url in com_timestamp] + sem_timestamp
@@ -0,0 +1,305 @@
+"""
+Análise das falhas de uma execução, em uma passada pelos logs.
+
+Lê, em streaming e em bytes (só as linhas de interesse são decodificadas):
+
+- o ledger de erros (ARCHIVEBOX_DIR/error_insertInto_mongo.txt: "url: mensagem",
+  com o stderr do ArchiveBox nas linhas seguintes);
+- logs em linhas JSON (timeouts.jsonl do watchdog, erros.log do registro.py);
+- o error_wayback_urls.txt dos scripts antigos (blocos terminados em "Chunk: [...]").
+
+Cada falha ganha uma assinatura normalizada (URLs, números e caminhos viram
+marcadores) e uma categoria (banco travado, prazo, Chrome, 429, 404 do
+Wayback...). As categorias transitórias geram a fila de reprocessamento, já
+sem as URLs que tiveram sucesso depois; as demais vão para a lista de falhas
+permanentes.
+
+    python -m maquina_do_tempo.analise_falhas                  # arquivos padrão do ARCHIVEBOX_DIR
+    python -m maquina_do_tempo.analise_falhas erros.txt outro.jsonl --json
+    python -m maquina_do_tempo fila_reprocessamento.txt        # reprocessa
+    python -m maquina_do_tempo.analise_falhas --fila           # ou devolve à fila do MongoDB (fila_mongo.py)
+"""
+import argparse
+import ast
+import functools
+import json
+import logging
+import re
+import sys
+from collections import Counter, defaultdict
+from pathlib import Path
+
+from . import config
+
+# =============================
+# Configurações e Constantes
+# =============================
+FILA_REPROCESSAMENTO_NAME = "fila_reprocessamento.txt"
+FALHAS_PERMANENTES_NAME = "falhas_permanentes.txt"
+# Acima disso uma falha transitória é tratada como permanente
+MAX_FALHAS_POR_URL = 5
+BUFFER_LEITURA = 1024 ** 2
+TAMANHO_REGISTRO = 64 * 1024  # bytes lidos de um registro (o resto é traceback repetido)
+JANELA_CLASSIFICACAO = 4096   # caracteres do início e do fim de um registro usados na classificação
+
+# (categoria, reprocessável, trechos), em ordem de prioridade: vale a primeira com algum trecho no
+# registro. Trechos em minúsculas: a busca é um 'in' no texto já em minúsculas (bem mais rápido que regex)
+CATEGORIAS = (
+    ("banco_travado", True, ("database is locked",)),
+    ("prazo", True, ("s esgotado", "timed out", "timeout")),
+    ("limitacao", True, ("http error 429", "http error 503", "too many requests", "service unavailable")),
+    ("proxy", True, ("proxyerror", "http error 407", "proxy error")),
+    ("chrome", True, ("target closed", "browser has disconnected", "browser disconnected",
+                      "failed to launch the browser", "crashed", "protocol error", "sigsegv", "net::err_")),
+    ("rede", True, ("connection reset", "connection refused", "connection aborted", "connecterror", "urlerror",
+                    "remotedisconnected", "name or service not known", "temporary failure in name resolution")),
+    ("wayback_404", False, ("http error 404", "404 not found", "has not archived that url")),
+    ("wayback_redirecionamento", False, ("http error 301", "http error 302", "http error 307", "http error 308",
+                                         "redirecting to", "redirecionad")),
+    ("archivebox_indice", True, ("unboundlocalerror", "integrityerror", "operationalerror")),
+    ("snapshot_ausente", True, ("snapshot não encontrado", "singlefile.html não encontrado",
+                                "conteúdo html vazio")),
+    ("conteudo_invalido", False, ("não é utf-8", "timestamp inválido")),
+    ("mongo_duplicado", False, ("duplicatekeyerror", "e11000")),
+    ("mongo", True, ("serverselectiontimeouterror", "autoreconnect", "notprimaryerror")),
+)
+REPROCESSAVEIS = {nome for nome, reprocessavel, _ in CATEGORIAS if reprocessavel}
+# Registros idênticos (a mesma mensagem para muitas URLs) são classificados uma vez só
+CACHE_CLASSIFICACAO = 65536
+
+_URL = re.compile(r"https?://\S+")
+_CAMINHO = re.compile(r"(?:/[\w.@-]+){2,}/?")
+_HEX = re.compile(r"\b[0-9a-f]{8,}\b", re.I)
+_NUMERO = re.compile(r"\d+(?:\.\d+)?")
+_EXCECAO = re.compile(r"\s*([\w.]+(?:Error|Exception|Expired|Esgotado)\b.*)$")
+_LEDGER = re.compile(rb"^(https?://\S+?): (.*)$", re.S)
+_CHUNK = re.compile(r"^Chunk: (\[.*\])\s*$")
+
+def classificar(texto):
+    """Categoria de maior prioridade presente no texto, ou 'outro'."""
+    # A mensagem fica no início e a exceção no fim; o meio de um traceback longo não decide nada
+    if len(texto) > JANELA_CLASSIFICACAO:
+        texto = texto[:JANELA_CLASSIFICACAO // 4] + "\n" + texto[-JANELA_CLASSIFICACAO * 3 // 4:]
+    minusculo = texto.lower()
+    for nome, _, trechos in CATEGORIAS:
+        if any(t in minusculo for t in trechos):
+            return nome
+    return "outro"
+
+def assinatura(texto):
+    """Forma normalizada da falha: a última linha de exceção (ou a primeira linha), sem URLs, números e caminhos."""
+    # A exceção costuma estar no fim do traceback: só as últimas linhas são examinadas
+    linha = next((m.group(1) for m in map(_EXCECAO.match, reversed(texto.rsplit("\n", 20)[-20:])) if m), None)
+    if linha is None:
+        linha = texto.strip().split("\n", 1)[0]
+    linha = _URL.sub("<url>", linha)
+    linha = _CAMINHO.sub("<caminho>", linha)
+    linha = _HEX.sub("<hex>", linha)
+    return _NUMERO.sub("<n>", linha).strip()[:160]
+
+@functools.lru_cache(maxsize=CACHE_CLASSIFICACAO)
+def _chave(texto):
+    return classificar(texto), assinatura(texto)
+
+# =============================
+# Leitura das fontes
+# =============================
+def _decodificar(linhas):
+    return b"\n".join(linhas).decode("utf-8", errors="replace")
+
+def ler_ledger(arquivo):
+    """(url, texto) do ledger de erros; linhas que não começam por URL continuam o registro anterior."""
+    url, partes, tamanho = None, [], 0
+    for linha in arquivo:
+        linha = linha.rstrip(b"\r\n")
+        m = _LEDGER.match(linha) if linha[:4] == b"http" else None
+        if m:
+            if url is not None:
+                yield url, _decodificar(partes)
+            url, partes = m.group(1).decode("utf-8", errors="replace"), [m.group(2)]
+            tamanho = len(linha)
+        elif url is not None and tamanho < TAMANHO_REGISTRO:
+            partes.append(linha)
+            tamanho += len(linha)
+    if url is not None:
+        yield url, _decodificar(partes)
+
+def ler_jsonl(arquivo):
+    """
+    (url, texto) das linhas JSON com URL que são falhas: nível WARNING/ERROR
+    (registro.py) ou estouros de prazo sem resgate (timeouts.jsonl).
+    """
+    for linha in arquivo:
+        if b'"url"' not in linha or not (b'"etapa"' in linha or b'"ERROR"' in linha or b'"WARNING"' in linha):
+            continue
+        try:
+            registro = json.loads(linha)
+        except ValueError:
+            continue
+        url = registro.get("url")
+        if not url or registro.get("resgatado") or registro.get("nivel") not in (None, "ERROR", "WARNING"):
+            continue
+        if "etapa" in registro and "nivel" not in registro:
+            texto = f"prazo de {registro.get('orcamento_s') or 0} s esgotado em {registro['etapa']}"
+            yield url, f"{texto}\n{registro.get('stderr') or ''}"
+        else:
+            yield url, "\n".join(str(registro[c]) for c in ("msg", "stderr", "exc") if registro.get(c))
+
+def ler_legado(arquivo):
+    """(url, texto) do error_wayback_urls.txt: o texto vale para todas as URLs do "Chunk: [...]" que o encerra."""
+    partes, tamanho = [], 0
+    for linha in arquivo:
+        if linha[:7] == b"Chunk: ":
+            m = _CHUNK.match(linha.decode("utf-8", errors="replace"))
+            try:
+                urls = ast.literal_eval(m.group(1)) if m else []
+            except (ValueError, SyntaxError):
+                urls = []
+            texto = _decodificar(partes)
+            for url in urls:
+                yield url, texto
+            partes, tamanho = [], 0
+        elif tamanho < TAMANHO_REGISTRO:
+            partes.append(linha.rstrip(b"\r\n"))
+            tamanho += len(linha)
+
+def ler_fonte(caminho):
+    """Detecta o formato pelo início do arquivo e devolve os registros (url, texto)."""
+    with open(caminho, "rb", buffering=BUFFER_LEITURA) as arquivo:
+        inicio = arquivo.read(4096)
+        arquivo.seek(0)
+        primeira = inicio.lstrip().split(b"\n", 1)[0]
+        if primeira.startswith(b"{"):
+            leitor = ler_jsonl
+        elif _LEDGER.match(primeira):
+            leitor = ler_ledger
+        else:
+            leitor = ler_legado
+        yield from leitor(arquivo)
+
+# =============================
+# Análise
+# =============================
+class Analise:
+    """Agrupamento das falhas por categoria e assinatura, e falhas por URL."""
+    def __init__(self):
+        self.registros = 0
+        self.por_categoria = Counter()
+        self.por_assinatura = Counter()
+        self.exemplos = {}
+        self.urls = defaultdict(Counter)  # url -> {categoria: falhas}
+
+    def adicionar(self, url, texto):
+        chave = _chave(texto)
+        categoria = chave[0]
+        self.registros += 1
+        self.por_categoria[categoria] += 1
+        self.por_assinatura[chave] += 1
+        self.exemplos.setdefault(chave, url)
+        self.urls[url][categoria] += 1
+
+    def separar(self, sucessos=(), max_falhas=MAX_FALHAS_POR_URL):
+        """
+        (reprocessar, permanentes) das URLs sem sucesso posterior. Vão para
+        reprocessar as de categoria dominante transitória que não passaram de
+        'max_falhas'; permanentes é [(url, categoria)].
+        """
+        reprocessar, permanentes = [], []
+        for url, categorias in self.urls.items():
+            if url in sucessos:
+                continue
+            categoria, _ = categorias.most_common(1)[0]
+            if categoria in REPROCESSAVEIS and sum(categorias.values()) <= max_falhas:
+                reprocessar.append(url)
+            else:
+                permanentes.append((url, categoria))
+        return reprocessar, permanentes
+
+    def relatorio(self, limite=10):
+        linhas = [f"{self.registros} falhas em {len(self.urls)} URLs", "",
+                  f"{'categoria':<26}{'reprocessável':>14}{'falhas':>9}"]
+        for categoria, quantidade in self.por_categoria.most_common():
+            reprocessavel = "sim" if categoria in REPROCESSAVEIS else "não"
+            linhas.append(f"{categoria:<26}{reprocessavel:>14}{quantidade:>9}")
+        linhas += ["", f"{'falhas':>7}  assinatura (exemplo)"]
+        for (categoria, texto), quantidade in self.por_assinatura.most_common(limite):
+            linhas.append(f"{quantidade:>7}  [{categoria}] {texto}")
+            linhas.append(f"{'':>9}{self.exemplos[(categoria, texto)]}")
+        return "\n".join(linhas)
+
+    def to_dict(self, limite=50):
+        return {
+            "registros": self.registros,
+            "urls": len(self.urls),
+            "categorias": dict(self.por_categoria.most_common()),
+            "assinaturas": [
+                {"categoria": c, "assinatura": a, "falhas": q, "exemplo": self.exemplos[(c, a)]}
+                for (c, a), q in self.por_assinatura.most_common(limite)
+            ],
+        }
+
+def analisar(caminhos):
+    analise = Analise()
+    for caminho in caminhos:
+        for url, texto in ler_fonte(caminho):
+            analise.adicionar(url, texto)
+    return analise
+
+def main():
+    parser = argparse.ArgumentParser(description="Agrupa as falhas dos logs e gera a fila de reprocessamento.")
+    parser.add_argument("arquivos", nargs="*",
+                        help=f"Logs a analisar (padrão: {config.ERROR_LOG_NAME}, {config.TIMEOUT_LOG_NAME} e "
+                             "error_wayback_urls.txt do ARCHIVEBOX_DIR)")
+    parser.add_argument("--archivebox-dir", default=config.ARCHIVEBOX_DIR)
+    parser.add_argument("--max-falhas", type=int, default=MAX_FALHAS_POR_URL,
+                        help="Falhas transitórias por URL antes de considerá-la permanente")
+    parser.add_argument("--saida", default=None, help="Diretório das listas geradas (padrão: ARCHIVEBOX_DIR)")
+    parser.add_argument("--json", action="store_true", help="Relatório em JSON")
+    parser.add_argument("--fila", action="store_true",
+                        help="Também devolve as URLs reprocessáveis à fila compartilhada no MongoDB "
+                             "(fila_mongo.py), inclusive as que ela já deu como falha")
+    parser.add_argument("--mongodb-uri", default=config.MONGODB_URI)
+    args = parser.parse_args()
+
+    base = Path(args.archivebox_dir)
+    if args.arquivos:
+        caminhos = [Path(a) for a in args.arquivos]
+    else:
+        caminhos = [base / n for n in (config.ERROR_LOG_NAME, config.TIMEOUT_LOG_NAME, "error_wayback_urls.txt")]
+    caminhos = [c for c in caminhos if c.exists()]
+    if not caminhos:
+        logging.error("Nenhum log de falhas encontrado.")
+        sys.exit(1)
+
+    analise = analisar(caminhos)
+    sucesso = base / config.SUCCESS_LOG_NAME
+    sucessos = set()
+    if sucesso.exists():
+        with open(sucesso, encoding="utf-8") as f:
+            sucessos = {linha.strip() for linha in f if linha.strip()}
+    reprocessar, permanentes = analise.separar(sucessos, args.max_falhas)
+
+    saida = Path(args.saida) if args.saida else base
+    saida.mkdir(parents=True, exist_ok=True)
+    (saida / FILA_REPROCESSAMENTO_NAME).write_text("".join(f"{u}\n" for u in reprocessar), encoding="utf-8")
+    (saida / FALHAS_PERMANENTES_NAME).write_text("".join(f"{u}\t{c}\n" for u, c in permanentes), encoding="utf-8")
+
+    devolvidas = None
+    if args.fila:
+        from .fila_mongo import abrir_fila
+        devolvidas = abrir_fila(args.mongodb_uri).reprocessar(reprocessar)
+
+    if args.json:
+        resumo = dict(analise.to_dict(), reprocessar=len(reprocessar), permanentes=len(permanentes))
+        if devolvidas is not None:
+            resumo["devolvidas_fila"] = devolvidas
+        print(json.dumps(resumo, ensure_ascii=False, indent=2))
+    else:
+        print(analise.relatorio())
+        print(f"\n{len(reprocessar)} URLs em {saida / FILA_REPROCESSAMENTO_NAME}; "
+              f"{len(permanentes)} em {saida / FALHAS_PERMANENTES_NAME}.")
+        if devolvidas is not None:
+            print(f"{devolvidas} URLs devolvidas à fila do MongoDB.")
+
+if __name__ == "__main__":
+    main()
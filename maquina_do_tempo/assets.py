@@ -0,0 +1,261 @@
+"""
+Armazenamento endereçado por conteúdo dos assets embutidos pelo SingleFile.
+
+O SingleFile embute em cada captura o mesmo CSS, fontes, logos e scripts
+(data URIs em base64 e blocos <style>/<script>). Entre milhares de capturas
+da mesma home, quase todo o documento se repete. Aqui esses trechos são separados do HTML,
+identificados pelo SHA-256 e gravados uma única vez na coleção de assets; o
+documento da página guarda só o esqueleto e as referências:
+
+    documento["content"]  HTML sem os trechos separados (compactado ou não)
+    documento["assets"]   [[posição no esqueleto, sha256], ...] em ordem
+
+reconstruir() devolve exatamente os bytes originais. Assets já gravados nem
+saem do processo: o armazém lembra os hashes que já conhece.
+
+    python -m maquina_do_tempo.assets capturas/*.html   # mede a economia
+"""
+import argparse
+import hashlib
+import logging
+import re
+import sys
+import threading
+import zlib
+from collections import OrderedDict
+from pathlib import Path
+
+from . import config
+from .ingestao import (COMPACTAR, NIVEL_COMPACTACAO, VALIDAR_UTF8, ArquivosDaHomeWaybackMachineModel, compactar,
+                       ler_conteudo, ler_snapshot_bytes, validar_utf8)
+from .metricas import METRICAS
+from .wayback import timestamp_para_datetime
+
+# =============================
+# Configurações e Constantes
+# =============================
+# Trechos menores que isto ficam no esqueleto (a referência custaria mais que o trecho)
+TAMANHO_MINIMO = 1024  # bytes
+# Hashes lembrados por processo para não consultar o banco de novo
+HASHES_CONHECIDOS = 100_000
+
+_DATA_URI = re.compile(rb"data:[\w.+-]+/[\w.+-]+(?:;[\w.+-]+=[\w.+-]+)*;base64,[A-Za-z0-9+/]+=*")
+# Conteúdo dos blocos <style> e <script> inline (o SingleFile embute CSS e JS neles)
+_BLOCOS = re.compile(rb"<(style|script)\b[^>]*>(.*?)</\1\s*>", re.I | re.S)
+
+def _trechos(html, minimo):
+    """
+    Intervalos (início, fim) a separar, ordenados e sem sobreposição: cada data
+    URI e as partes dos blocos <style>/<script> entre eles. Assim a fonte
+    embutida num CSS é deduplicada mesmo quando o resto do CSS muda.
+    """
+    data_uris = [m.span() for m in _DATA_URI.finditer(html)]
+    trechos = list(data_uris)
+    for bloco in _BLOCOS.finditer(html):
+        inicio, fim = bloco.span(2)
+        for d_inicio, d_fim in data_uris:
+            if d_fim <= inicio or d_inicio >= fim:
+                continue
+            trechos.append((inicio, d_inicio))
+            inicio = d_fim
+        trechos.append((inicio, fim))
+    return sorted((i, f) for i, f in trechos if f - i >= minimo)
+
+def separar(html, minimo=TAMANHO_MINIMO):
+    """
+    Separa os assets do HTML (bytes). Devolve (esqueleto, referencias, assets):
+    referencias é [[posição no esqueleto, sha256], ...] e assets {sha256: bytes}.
+    """
+    view = memoryview(html)
+    partes, referencias, assets = [], [], {}
+    anterior = posicao = 0
+    for inicio, fim in _trechos(html, minimo):
+        partes.append(view[anterior:inicio])
+        posicao += inicio - anterior
+        trecho = bytes(view[inicio:fim])
+        digest = hashlib.sha256(trecho).hexdigest()
+        assets.setdefault(digest, trecho)
+        referencias.append([posicao, digest])
+        anterior = fim
+    partes.append(view[anterior:])
+    return b"".join(partes), referencias, assets
+
+def remontar(esqueleto, referencias, assets):
+    """Inverso de separar(): insere cada asset na sua posição do esqueleto."""
+    partes = []
+    anterior = 0
+    for posicao, digest in referencias:
+        partes.append(esqueleto[anterior:posicao])
+        partes.append(assets[digest])
+        anterior = posicao
+    partes.append(esqueleto[anterior:])
+    return b"".join(partes)
+
+def montar_documento_deduplicado(snapshot_dir, timestamp_str, compactar_conteudo=COMPACTAR, validar=VALIDAR_UTF8,
+                                 minimo=TAMANHO_MINIMO):
+    """
+    Como estagios.montar_documento, mas com os assets separados. Devolve
+    (documento, assets); os assets precisam ser gravados antes do documento.
+    """
+    singlefile_html = Path(snapshot_dir) / "singlefile.html"
+    if not singlefile_html.exists():
+        raise FileNotFoundError(f"Arquivo singlefile.html não encontrado em {snapshot_dir}")
+
+    with METRICAS.tempo("leitura"):
+        html = ler_snapshot_bytes(singlefile_html)
+    if not html:
+        raise ValueError("Conteúdo HTML vazio")
+    if validar and not validar_utf8(html):
+        raise ValueError("Conteúdo HTML não é UTF-8 válido")
+
+    with METRICAS.tempo("deduplicacao"):
+        esqueleto, referencias, assets = separar(html, minimo)
+    with METRICAS.tempo("codificacao"):
+        documento = ArquivosDaHomeWaybackMachineModel(
+            device=config.DEVICE,
+            content=compactar(esqueleto) if compactar_conteudo else esqueleto,
+            timestamp=timestamp_para_datetime(timestamp_str),
+            isAdvertisingModified=False,
+            advertising_id_when_isModified=None,
+            content_encoding="zlib" if compactar_conteudo else None,
+        ).to_dict()
+    documento["assets"] = referencias
+    METRICAS.contar("assets_bytes_total", len(html) - len(esqueleto), tipo="separados")
+    return documento, assets
+
+class ArmazemAssets:
+    """
+    Coleção de assets ({_id: sha256, content, content_encoding?, tamanho}).
+    gravar() só envia o que o banco ainda não tem: os hashes conhecidos ficam
+    num LRU local e os demais são conferidos com uma consulta $in.
+    """
+    def __init__(self, colecao, compactar_conteudo=True, conhecidos=HASHES_CONHECIDOS):
+        self.colecao = colecao
+        self.compactar_conteudo = compactar_conteudo
+        self._conhecidos = OrderedDict()
+        self._limite = conhecidos
+        self._lock = threading.Lock()
+
+    def _desconhecidos(self, hashes):
+        with self._lock:
+            faltam = []
+            for digest in hashes:
+                if digest in self._conhecidos:
+                    self._conhecidos.move_to_end(digest)
+                else:
+                    faltam.append(digest)
+            return faltam
+
+    def _lembrar(self, hashes):
+        with self._lock:
+            for digest in hashes:
+                self._conhecidos[digest] = True
+                self._conhecidos.move_to_end(digest)
+            while len(self._conhecidos) > self._limite:
+                self._conhecidos.popitem(last=False)
+
+    def _documento(self, digest, conteudo):
+        documento = {"_id": digest, "tamanho": len(conteudo)}
+        if self.compactar_conteudo:
+            documento["content"] = zlib.compress(conteudo, NIVEL_COMPACTACAO)
+            documento["content_encoding"] = "zlib"
+        else:
+            documento["content"] = conteudo
+        return documento
+
+    def _novos(self, assets, existentes):
+        novos = [self._documento(d, c) for d, c in assets.items() if d not in existentes]
+        METRICAS.contar("assets_total", len(assets) - len(novos), resultado="reaproveitado")
+        METRICAS.contar("assets_total", len(novos), resultado="novo")
+        return novos
+
+    def gravar(self, assets):
+        """Grava os assets ausentes. Corridas entre workers terminam em chave duplicada, que é ignorada."""
+        faltam = self._desconhecidos(assets)
+        if faltam:
+            existentes = {d["_id"] for d in self.colecao.find({"_id": {"$in": faltam}}, {"_id": 1})}
+            novos = self._novos({d: assets[d] for d in faltam}, existentes)
+            if novos:
+                try:
+                    self.colecao.insert_many(novos, ordered=False)
+                except Exception as e:
+                    if not _somente_duplicadas(e):
+                        raise
+        self._lembrar(assets)
+
+    async def gravar_async(self, assets):
+        """Versão de gravar() para a coleção do AsyncMongoClient."""
+        faltam = self._desconhecidos(assets)
+        if faltam:
+            cursor = self.colecao.find({"_id": {"$in": faltam}}, {"_id": 1})
+            existentes = {d["_id"] async for d in cursor}
+            novos = self._novos({d: assets[d] for d in faltam}, existentes)
+            if novos:
+                try:
+                    await self.colecao.insert_many(novos, ordered=False)
+                except Exception as e:
+                    if not _somente_duplicadas(e):
+                        raise
+        self._lembrar(assets)
+
+    def obter(self, hashes):
+        """{sha256: bytes} dos hashes pedidos. Lança KeyError se algum não existir."""
+        hashes = list(dict.fromkeys(hashes))
+        encontrados = {d["_id"]: ler_conteudo(d) for d in self.colecao.find({"_id": {"$in": hashes}})}
+        faltam = [d for d in hashes if d not in encontrados]
+        if faltam:
+            raise KeyError(f"Assets ausentes na coleção: {', '.join(faltam[:5])}")
+        return encontrados
+
+def _somente_duplicadas(erro):
+    """True se o erro do insert_many veio só de chaves duplicadas (código 11000)."""
+    detalhes = getattr(erro, "details", None) or {}
+    erros = detalhes.get("writeErrors") or []
+    return bool(erros) and all(e.get("code") == 11000 for e in erros) and not detalhes.get("writeConcernErrors")
+
+def reconstruir(documento, armazem):
+    """HTML original (bytes) de um documento, com ou sem assets separados."""
+    esqueleto = ler_conteudo(documento)
+    referencias = documento.get("assets")
+    if not referencias:
+        return esqueleto
+    return remontar(esqueleto, referencias, armazem.obter(d for _, d in referencias))
+
+# =============================
+# Medição
+# =============================
+def medir(caminhos, minimo=TAMANHO_MINIMO):
+    """Bytes originais x bytes gravados (esqueletos + assets únicos) para um conjunto de capturas."""
+    originais = esqueletos = 0
+    unicos = {}
+    for caminho in caminhos:
+        html = ler_snapshot_bytes(caminho)
+        esqueleto, referencias, assets = separar(html, minimo)
+        if remontar(esqueleto, referencias, assets) != html:
+            raise AssertionError(f"Reconstrução diferente do original: {caminho}")
+        originais += len(html)
+        esqueletos += len(esqueleto)
+        unicos.update(assets)
+    return originais, esqueletos, sum(len(a) for a in unicos.values()), len(unicos)
+
+def main():
+    parser = argparse.ArgumentParser(description="Mede a economia da deduplicação de assets em capturas.")
+    parser.add_argument("arquivos", nargs="+", help="singlefile.html de várias capturas")
+    parser.add_argument("--minimo", type=int, default=TAMANHO_MINIMO, help="Tamanho mínimo de um asset (bytes)")
+    args = parser.parse_args()
+
+    caminhos = [Path(a) for a in args.arquivos if Path(a).exists()]
+    if not caminhos:
+        logging.error("Nenhum arquivo encontrado.")
+        sys.exit(1)
+
+    originais, esqueletos, assets, quantidade = medir(caminhos, args.minimo)
+    gravados = esqueletos + assets
+    print(f"capturas:           {len(caminhos)}")
+    print(f"bytes originais:    {originais}")
+    print(f"bytes esqueletos:   {esqueletos}")
+    print(f"bytes assets:       {assets} ({quantidade} únicos)")
+    print(f"redução:            {originais / max(gravados, 1):.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,355 @@
+"""
+Tabela de atributos das capturas em Parquet, particionada por ano e mês.
+
+Cada análise abria de novo o HTML de megabytes de cada documento da coleção
+arquivos_da_home_obtidos_no_wayback_machine. Aqui os atributos são extraídos
+uma vez por captura e gravados em ARCHIVEBOX_DIR/atributos:
+
+    atributos/ano=2021/mes=03/capturas.parquet
+
+uma linha por documento: manchetes (h1-h3), links (internos e externos),
+slots de anúncio, scripts, tamanho do HTML e do texto visível, SimHash e o
+grupo de quase duplicatas (timestamp da primeira captura do grupo, em ordem
+cronológica, com a distância de quase_duplicatas.py).
+
+A atualização é incremental: só os documentos novos (pelo _id), os de uma
+VERSAO anterior da extração ou, com --recalcular, os do período pedido são
+lidos do MongoDB; as partições sem mudança não são regravadas. Os grupos são
+refeitos sobre os SimHashes de todas as linhas (sem reler HTML), e uma
+partição também é regravada se o grupo de alguma linha mudou.
+
+    python -m maquina_do_tempo.atributos atualizar
+    python -m maquina_do_tempo.atributos atualizar --recalcular --de 202103 --ate 202103
+
+    tabela = carregar(ARCHIVEBOX_DIR / "atributos", de="2015", ate="2022")
+    df = tabela.to_pandas()
+
+Depende do 'pyarrow' (pip install pyarrow).
+"""
+import argparse
+import calendar
+import logging
+import os
+import re
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from urllib.parse import urlsplit
+
+from . import config
+from .cpu import FORMATO_ANUNCIO_REGEX, GPT_SLOT_REGEX, workers_padrao
+from .html_texto import links, manchetes, remover_invisivel, texto_visivel
+from .ingestao import ler_conteudo
+from .manifesto import timestamp_para_limite
+from .quase_duplicatas import DISTANCIA_PADRAO, IndiceQuaseDuplicatas, para_int64, simhash_html
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = ds = pq = None
+
+# =============================
+# Configurações e Constantes
+# =============================
+VERSAO = 1  # aumentar quando a extração mudar: as linhas antigas são recalculadas
+ATRIBUTOS_DIR_NAME = "atributos"
+ARQUIVO_PARTICAO = "capturas.parquet"
+LOTE = 100  # documentos lidos do MongoDB por vez
+ORIGINAL_PADRAO = "https://www.poder360.com.br/"
+
+_SCRIPT = re.compile(rb"<script\b", re.I)
+
+def _exigir_pyarrow():
+    if pa is None:
+        raise RuntimeError("Os atributos precisam do pacote 'pyarrow' "
+                           "(pip install pyarrow; ver requirements-extras.txt).")
+
+def esquema():
+    _exigir_pyarrow()
+    return pa.schema([
+        ("id", pa.string()),
+        ("timestamp", pa.timestamp("s")),
+        ("device", pa.string()),
+        ("tamanho_bytes", pa.int64()),
+        ("texto_caracteres", pa.int64()),
+        ("manchetes", pa.list_(pa.string())),
+        ("links", pa.int32()),
+        ("links_internos", pa.int32()),
+        ("links_externos", pa.int32()),
+        ("slots_anuncio", pa.int32()),
+        ("blocos_publicidade", pa.int32()),
+        ("scripts", pa.int32()),
+        ("simhash", pa.int64()),
+        ("grupo_quase_duplicata", pa.timestamp("s")),
+        ("versao", pa.int16()),
+    ])
+
+# =============================
+# Extração
+# =============================
+def _host(url):
+    host = urlsplit(url).hostname or ""
+    return host[4:] if host.startswith("www.") else host
+
+def contar_links(html, host):
+    """(total, internos, externos) dos <a href>; links do Wayback contam pelo endereço original."""
+    total = internos = externos = 0
+    for alvo in links(html):
+        total += 1
+        if alvo.startswith("//"):
+            alvo = "http:" + alvo
+        partes = urlsplit(alvo)
+        if partes.scheme not in ("", "http", "https"):
+            continue  # mailto:, javascript:, data:...
+        destino = _host(alvo)
+        if not destino or destino == host or destino.endswith("." + host):
+            internos += 1
+        else:
+            externos += 1
+    return total, internos, externos
+
+def extrair_atributos(html, host):
+    """Atributos de um HTML (bytes) de uma home de 'host', sem o SimHash."""
+    visivel = remover_invisivel(html)
+    total, internos, externos = contar_links(visivel, host)
+    return {
+        "tamanho_bytes": len(html),
+        "texto_caracteres": len(texto_visivel(visivel)),
+        "manchetes": manchetes(visivel),
+        "links": total,
+        "links_internos": internos,
+        "links_externos": externos,
+        "slots_anuncio": len(set(GPT_SLOT_REGEX.findall(html))),
+        "blocos_publicidade": len(FORMATO_ANUNCIO_REGEX.findall(html)),
+        "scripts": len(_SCRIPT.findall(html)),
+    }
+
+def _sem_fuso(valor):
+    return valor.replace(tzinfo=None) if valor is not None and valor.tzinfo is not None else valor
+
+def atributos_documento(documento, host):
+    """Linha da tabela para um documento do MongoDB (executado nos workers)."""
+    simhash = (documento.get("analise") or {}).get("simhash")
+    linha = {"id": str(documento["_id"]), "timestamp": _sem_fuso(documento["timestamp"]),
+             "device": documento.get("device"), "simhash": simhash, "versao": VERSAO}
+    if "content" not in documento:
+        # Quase duplicata gravada sem o conteúdo: só o SimHash e o grupo
+        return linha
+    html = ler_conteudo(documento)
+    linha.update(extrair_atributos(html, host))
+    if simhash is None:
+        linha["simhash"] = para_int64(simhash_html(html))
+    return linha
+
+# =============================
+# Partições
+# =============================
+def _particao(timestamp):
+    return timestamp.year, timestamp.month
+
+def _caminho_particao(diretorio, particao):
+    ano, mes = particao
+    return Path(diretorio) / f"ano={ano}" / f"mes={mes:02d}" / ARQUIVO_PARTICAO
+
+def _dataset(diretorio):
+    """As partições de 'diretorio' como um dataset, com as colunas 'ano' e 'mes' vindas dos caminhos."""
+    particoes = pa.schema([("ano", pa.int16()), ("mes", pa.int8())])
+    return ds.dataset(diretorio, schema=pa.unify_schemas([esquema(), particoes]), format="parquet",
+                      partitioning=ds.partitioning(particoes, flavor="hive"))
+
+def _ler_estado(diretorio):
+    """id -> (timestamp, simhash, grupo, versao) das linhas já gravadas."""
+    if not Path(diretorio).exists():
+        return {}
+    tabela = _dataset(diretorio).to_table(
+        columns=["id", "timestamp", "simhash", "grupo_quase_duplicata", "versao"])
+    colunas = [tabela.column(nome).to_pylist() for nome in tabela.column_names]
+    return {linha[0]: linha[1:] for linha in zip(*colunas)}
+
+def _gravar_particao(diretorio, particao, linhas):
+    caminho = _caminho_particao(diretorio, particao)
+    if not linhas:
+        caminho.unlink(missing_ok=True)
+        return
+    caminho.parent.mkdir(parents=True, exist_ok=True)
+    linhas.sort(key=lambda linha: (linha["timestamp"], linha["id"]))
+    tabela = pa.Table.from_pylist(linhas, schema=esquema())
+    fd, temporario = tempfile.mkstemp(dir=caminho.parent, prefix=f".{caminho.name}.")
+    os.close(fd)
+    pq.write_table(tabela, temporario, compression="zstd")
+    os.replace(temporario, caminho)
+
+def agrupar_quase_duplicatas(capturas, distancia=DISTANCIA_PADRAO):
+    """
+    {id: timestamp do grupo} para (id, timestamp, simhash) em qualquer ordem.
+    As capturas são vistas em ordem cronológica: o grupo é a primeira de cada
+    sequência de quase iguais (as sem SimHash formam o próprio grupo).
+    """
+    indice = IndiceQuaseDuplicatas(None, distancia)
+    grupos = {}
+    for id_, timestamp, simhash in sorted(capturas, key=lambda c: (c[1], c[0])):
+        grupos[id_] = timestamp
+        if simhash is None:
+            continue
+        timestamp_str = timestamp.strftime("%Y%m%d%H%M%S")
+        vizinho = indice.consultar("", timestamp_str, simhash)
+        if vizinho is not None:
+            grupos[id_] = datetime.strptime(vizinho[0], "%Y%m%d%H%M%S")
+        else:
+            indice.adicionar("", timestamp_str, simhash)
+    return grupos
+
+# =============================
+# Atualização
+# =============================
+def _calcular(colecao, ids, host, workers):
+    """Gerador das linhas dos documentos 'ids', lidos em lotes e processados em 'workers' processos."""
+    projecao = {"content": 1, "content_encoding": 1, "timestamp": 1, "device": 1, "analise.simhash": 1}
+    executor = ProcessPoolExecutor(workers) if workers > 1 else None
+    try:
+        for inicio in range(0, len(ids), LOTE):
+            documentos = list(colecao.find({"_id": {"$in": ids[inicio:inicio + LOTE]}}, projecao))
+            if executor is None:
+                yield from (atributos_documento(documento, host) for documento in documentos)
+            else:
+                yield from executor.map(atributos_documento, documentos, [host] * len(documentos))
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+def atualizar(colecao, diretorio, original=ORIGINAL_PADRAO, recalcular=False, de=None, ate=None,
+              distancia=DISTANCIA_PADRAO, workers=None):
+    """
+    Sincroniza a tabela em 'diretorio' com a coleção. Devolve um dict com
+    quantas linhas foram calculadas e removidas e quantas partições gravadas.
+    """
+    _exigir_pyarrow()
+    inicio = time.perf_counter()
+    estado = _ler_estado(diretorio)
+    atuais = {str(d["_id"]): (d["_id"], _sem_fuso(d["timestamp"])) for d in colecao.find({}, {"timestamp": 1})}
+
+    inicio_periodo = _limite_datetime(de) if de is not None else datetime.min
+    fim_periodo = _limite_datetime(ate, fim=True) if ate is not None else datetime.max
+    removidos = [id_ for id_ in estado if id_ not in atuais]
+    pendentes = [id_ for id_, (_, timestamp) in atuais.items()
+                 if id_ not in estado or estado[id_][3] != VERSAO
+                 or (recalcular and inicio_periodo <= timestamp <= fim_periodo)]
+    sujas = {_particao(estado[id_][0]) for id_ in removidos + pendentes if id_ in estado}
+    logging.info(f"Atributos: {len(pendentes)} capturas a calcular, {len(removidos)} removidas "
+                 f"({len(estado)} na tabela, {len(atuais)} no MongoDB).")
+
+    novas = {}
+    for linha in _calcular(colecao, sorted((atuais[id_][0] for id_ in pendentes), key=str), _host(original),
+                           workers or workers_padrao()):
+        novas[linha["id"]] = linha
+        sujas.add(_particao(linha["timestamp"]))
+        if len(novas) % 1000 == 0:
+            logging.info(f"Atributos: {len(novas)}/{len(pendentes)} capturas calculadas.")
+
+    # Grupos sobre a tabela inteira: uma captura nova pode mudar o grupo das seguintes
+    capturas = [(id_, linha["timestamp"], linha["simhash"]) for id_, linha in novas.items()]
+    capturas += [(id_, valores[0], valores[1]) for id_, valores in estado.items()
+                 if id_ not in novas and id_ in atuais]
+    grupos = agrupar_quase_duplicatas(capturas, distancia)
+    for id_, valores in estado.items():
+        if id_ in grupos and id_ not in novas and grupos[id_] != valores[2]:
+            sujas.add(_particao(valores[0]))
+
+    for particao in sorted(sujas):
+        caminho = _caminho_particao(diretorio, particao)
+        linhas = [linha for linha in (pq.read_table(caminho).to_pylist() if caminho.exists() else [])
+                  if linha["id"] in atuais and linha["id"] not in novas]
+        linhas += [linha for linha in novas.values() if _particao(linha["timestamp"]) == particao]
+        for linha in linhas:
+            linha["grupo_quase_duplicata"] = grupos[linha["id"]]
+        _gravar_particao(diretorio, particao, linhas)
+
+    resultado = {"calculadas": len(novas), "removidas": len(removidos), "particoes": len(sujas),
+                 "total": len(atuais), "segundos": round(time.perf_counter() - inicio, 1)}
+    logging.info(f"Atributos atualizados: {resultado}")
+    return resultado
+
+def _limite_datetime(valor, fim=False):
+    """'2020', '202003'... como datetime do início (ou do último segundo) do período."""
+    texto = str(timestamp_para_limite(valor, fim))  # valida o formato
+    digitos = len(str(valor))
+    ano = int(texto[:4])
+    mes = int(texto[4:6]) if digitos >= 6 else (12 if fim else 1)
+    dia = int(texto[6:8]) if digitos >= 8 else (calendar.monthrange(ano, mes)[1] if fim else 1)
+    hora = int(texto[8:10]) if digitos >= 10 else (23 if fim else 0)
+    minuto = int(texto[10:12]) if digitos >= 12 else (59 if fim else 0)
+    segundo = int(texto[12:14]) if digitos >= 14 else (59 if fim else 0)
+    return datetime(ano, mes, dia, hora, minuto, segundo)
+
+def carregar(diretorio, de=None, ate=None, colunas=None):
+    """
+    Tabela do Arrow com as capturas entre 'de' e 'ate' (timestamps parciais,
+    como '2020' ou '202103'). Só as partições do período são lidas; a
+    .to_pandas() dá o DataFrame.
+    """
+    _exigir_pyarrow()
+    dataset = _dataset(diretorio)
+    condicoes = []
+    if de is not None:
+        limite = _limite_datetime(de)
+        condicoes += [ds.field("ano") >= limite.year, ds.field("timestamp") >= pa.scalar(limite, pa.timestamp("s"))]
+    if ate is not None:
+        limite = _limite_datetime(ate, fim=True)
+        condicoes += [ds.field("ano") <= limite.year, ds.field("timestamp") <= pa.scalar(limite, pa.timestamp("s"))]
+    filtro = None
+    for condicao in condicoes:
+        filtro = condicao if filtro is None else filtro & condicao
+    return dataset.to_table(columns=colunas, filter=filtro)
+
+def main():
+    parser = argparse.ArgumentParser(description="Tabela de atributos das capturas em Parquet (por ano e mês).")
+    parser.add_argument("--diretorio", default=str(Path(config.ARCHIVEBOX_DIR) / ATRIBUTOS_DIR_NAME))
+    sub = parser.add_subparsers(dest="comando", required=True)
+    atualizar_cmd = sub.add_parser("atualizar", help="Calcula os atributos das capturas novas ou alteradas")
+    atualizar_cmd.add_argument("--mongodb-uri", default=config.MONGODB_URI)
+    atualizar_cmd.add_argument("--original", default=ORIGINAL_PADRAO,
+                               help="URL original dos documentos (define os links internos)")
+    atualizar_cmd.add_argument("--recalcular", action="store_true",
+                               help="Recalcula as capturas do período (--de/--ate), mesmo as já presentes")
+    atualizar_cmd.add_argument("--de", help="Timestamp inicial (ex.: 2020, 202103)")
+    atualizar_cmd.add_argument("--ate", help="Timestamp final, inclusivo")
+    atualizar_cmd.add_argument("--distancia", type=int, default=DISTANCIA_PADRAO,
+                               help="Bits de diferença para duas capturas ficarem no mesmo grupo")
+    atualizar_cmd.add_argument("--workers", type=int, default=None)
+    resumo = sub.add_parser("resumo", help="Capturas por ano na tabela")
+    resumo.add_argument("--de")
+    resumo.add_argument("--ate")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(message)s")
+
+    if pa is None:
+        parser.error("os atributos precisam do pacote 'pyarrow' (pip install pyarrow; ver requirements-extras.txt)")
+
+    if args.comando == "atualizar":
+        from .banco import conectarBanco, obter_colecao
+        client = conectarBanco(args.mongodb_uri)
+        if client is None:
+            raise SystemExit(1)
+        try:
+            print(atualizar(obter_colecao(client), args.diretorio, args.original, args.recalcular, args.de,
+                            args.ate, args.distancia, args.workers))
+        finally:
+            client.close()
+        return
+
+    inicio = time.perf_counter()
+    tabela = carregar(args.diretorio, args.de, args.ate, colunas=["ano", "grupo_quase_duplicata"])
+    capturas, grupos = {}, {}
+    for ano, grupo in zip(tabela.column("ano").to_pylist(), tabela.column("grupo_quase_duplicata").to_pylist()):
+        capturas[ano] = capturas.get(ano, 0) + 1
+        grupos.setdefault(ano, set()).add(grupo)
+    for ano in sorted(capturas):
+        print(f"{ano}  {capturas[ano]:>8} capturas  {len(grupos[ano]):>8} grupos distintos")
+    logging.info(f"{tabela.num_rows} linhas lidas em {(time.perf_counter() - inicio) * 1000:.0f} ms.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+import logging
+import sqlite3
+
+from .config import COLLECTION_NAME, DATABASE_NAME, MONGODB_URI
+
+try:
+    from pymongo import MongoClient
+    from pymongo.errors import ServerSelectionTimeoutError
+except ImportError:
+    MongoClient = None
+    ServerSelectionTimeoutError = None
+
+try:
+    # pymongo >= 4.10 traz o driver assíncrono nativo
+    from pymongo import AsyncMongoClient
+except ImportError:
+    try:
+        from motor.motor_asyncio import AsyncIOMotorClient as AsyncMongoClient
+    except ImportError:
+        AsyncMongoClient = None
+
+def conectarBanco(uri=MONGODB_URI):
+    """Estabelece a conexão com o MongoDB. Retorna o client ou None."""
+    if MongoClient is None:
+        raise RuntimeError("O pymongo não está instalado (pip install -r requirements.txt).")
+    try:
+        client = MongoClient(uri, serverSelectionTimeoutMS=5000)
+        # Força a verificação da conexão
+        client.server_info()
+        logging.info("Conexão ao MongoDB bem-sucedida!")
+        return client
+    except ServerSelectionTimeoutError as e:
+        logging.error(f"Erro ao conectar ao MongoDB: {e}")
+        return None
+
+def conectar_banco_async(uri=MONGODB_URI):
+    """Client do driver assíncrono (pymongo >= 4.10 ou motor). A conexão é verificada na primeira operação."""
+    if AsyncMongoClient is None:
+        raise RuntimeError("Driver assíncrono do MongoDB indisponível: instale pymongo>=4.10 ou motor.")
+    return AsyncMongoClient(uri, serverSelectionTimeoutMS=5000)
+
+def obter_colecao(client, database=DATABASE_NAME, collection=COLLECTION_NAME):
+    return client[database][collection]
+
+def enable_wal_mode(db_path):
+    """Habilita o modo WAL no SQLite do ArchiveBox (ajuda em gravações concorrentes)."""
+    try:
+        conn = sqlite3.connect(db_path)
+        cursor = conn.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL;")
+        result = cursor.fetchone()
+        logging.info(f"Modo WAL habilitado no banco de dados: {result[0]}")
+        conn.close()
+    except Exception as e:
+        logging.error(f"Erro ao habilitar o modo WAL: {e}")
@@ -0,0 +1,201 @@
+"""
+Índice de busca textual das homes capturadas (SQLite FTS5).
+
+Para saber "quando a manchete X esteve na home" era preciso decodificar o
+content de cada documento do MongoDB e aplicar uma regex em Python. Aqui o
+texto visível (html_texto.py) de cada captura vai, na ingestão, para uma
+tabela FTS5 em ARCHIVEBOX_DIR/busca_texto.sqlite3:
+
+- o rowid é o timestamp da captura (YYYYMMDDhhmmss * 1000 + desempate entre
+  URLs originais no mesmo segundo), então o filtro por período vira um
+  intervalo de rowid, que o FTS5 resolve sem varrer os resultados;
+- duas colunas: 'titulos' (<title> e h1-h3) e 'corpo' (o texto visível);
+- tokenizador unicode61 sem acentos: "eleicao" acha "eleição";
+- cada captura é um INSERT com commit (WAL; vários workers e processos
+  gravam no mesmo arquivo), e capturas já indexadas são ignoradas.
+
+    python -m maquina_do_tempo.busca_texto buscar '"reforma tributária"' --de 2021 --ate 202206
+    python -m maquina_do_tempo.busca_texto indexar-mongo      # capturas já gravadas no MongoDB
+"""
+import argparse
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from . import config
+from .html_texto import remover_invisivel, texto_visivel, titulos
+from .manifesto import timestamp_para_limite
+from .metricas import METRICAS
+
+# =============================
+# Configurações e Constantes
+# =============================
+BUSCA_NAME = "busca_texto.sqlite3"
+DESEMPATE = 1000  # capturas de URLs originais diferentes no mesmo segundo
+TEMPO_ESPERA_TRAVA = 30  # segundos (busy_timeout) com outros processos gravando
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS capturas (
+    id INTEGER PRIMARY KEY,
+    timestamp TEXT NOT NULL,
+    original TEXT NOT NULL,
+    UNIQUE (original, timestamp)
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS busca USING fts5(
+    titulos, corpo, tokenize = 'unicode61 remove_diacritics 2'
+);
+"""
+
+def _id_minimo(timestamp):
+    return int(timestamp) * DESEMPATE
+
+class IndiceTexto:
+    """Índice FTS5 de uma instalação. Thread-safe (uma conexão, com lock)."""
+    def __init__(self, caminho):
+        self.caminho = Path(caminho)
+        self.caminho.parent.mkdir(parents=True, exist_ok=True)
+        self._conexao = sqlite3.connect(self.caminho, timeout=TEMPO_ESPERA_TRAVA, check_same_thread=False)
+        self._conexao.execute("PRAGMA journal_mode=WAL")
+        self._conexao.execute("PRAGMA synchronous=NORMAL")
+        self._conexao.executescript(_ESQUEMA)
+        self._lock = threading.Lock()
+
+    def fechar(self):
+        with self._lock:
+            self._conexao.close()
+
+    def indexar(self, timestamp, original, html):
+        """Extrai e indexa o texto de uma captura. Devolve False se ela já estava no índice."""
+        visivel = remover_invisivel(html)
+        cabecalhos = "\n".join(titulos(visivel))
+        corpo = texto_visivel(visivel)
+        with self._lock, self._conexao:
+            if self._conexao.execute("SELECT 1 FROM capturas WHERE original = ? AND timestamp = ?",
+                                     (original, timestamp)).fetchone():
+                return False
+            # Primeiro id livre no segundo da captura
+            ocupado = self._conexao.execute("SELECT max(id) FROM capturas WHERE id BETWEEN ? AND ?",
+                                            (_id_minimo(timestamp), _id_minimo(timestamp) + DESEMPATE - 1)
+                                            ).fetchone()[0]
+            rowid = _id_minimo(timestamp) if ocupado is None else ocupado + 1
+            self._conexao.execute("INSERT INTO capturas (id, timestamp, original) VALUES (?, ?, ?)",
+                                  (rowid, timestamp, original))
+            self._conexao.execute("INSERT INTO busca (rowid, titulos, corpo) VALUES (?, ?, ?)",
+                                  (rowid, cabecalhos, corpo))
+        METRICAS.contar("busca_indexadas_total")
+        return True
+
+    def indexar_arquivo(self, timestamp, original, caminho):
+        with METRICAS.tempo("busca_indexacao"):
+            return self.indexar(timestamp, original, Path(caminho).read_bytes())
+
+    @staticmethod
+    def _filtros(sql, consulta, de=None, ate=None, original=None, so_titulos=False):
+        """Completa 'sql' (um SELECT sobre busca JOIN capturas c) com o MATCH e os filtros; devolve os parâmetros."""
+        if so_titulos:
+            consulta = f"titulos : ({consulta})"
+        # CROSS JOIN fixa a ordem: o FTS5 na frente; com "original" o planejador
+        # preferiria percorrer capturas e refazer o MATCH linha a linha
+        sql.append("FROM busca CROSS JOIN capturas c ON c.id = busca.rowid WHERE busca MATCH ?")
+        parametros = [consulta]
+        if de is not None:
+            sql.append("AND busca.rowid >= ?")
+            parametros.append(_id_minimo(timestamp_para_limite(de)))
+        if ate is not None:
+            sql.append("AND busca.rowid <= ?")
+            parametros.append(_id_minimo(timestamp_para_limite(ate, fim=True)) + DESEMPATE - 1)
+        if original is not None:
+            sql.append("AND c.original = ?")
+            parametros.append(original)
+        return parametros
+
+    def buscar(self, consulta, limite=50, **filtros):
+        """
+        Capturas que casam com 'consulta' (sintaxe do FTS5: "frase exata",
+        AND/OR/NOT, prefixo*), da mais antiga para a mais nova. Filtros: 'de'/
+        'ate' (timestamps parciais: '2020', '202103'), 'original' e
+        'so_titulos'. Devolve dicts com timestamp, original e um trecho com os
+        termos entre [ ].
+        """
+        sql = ["SELECT c.timestamp, c.original, snippet(busca, -1, '[', ']', '…', 12)"]
+        parametros = self._filtros(sql, consulta, **filtros)
+        sql.append("ORDER BY busca.rowid LIMIT ?")
+        parametros.append(limite)
+        with self._lock:
+            linhas = self._conexao.execute(" ".join(sql), parametros).fetchall()
+        return [{"timestamp": ts, "original": orig, "trecho": trecho} for ts, orig, trecho in linhas]
+
+    def periodos(self, consulta, **filtros):
+        """
+        Primeira e última captura em que 'consulta' aparece, e em quantas (os
+        mesmos filtros de buscar). Uma agregação no SQLite: nenhum resultado
+        nem trecho é montado em Python.
+        """
+        sql = ["SELECT min(busca.rowid), max(busca.rowid), count(*)"]
+        parametros = self._filtros(sql, consulta, **filtros)
+        with self._lock:
+            primeira, ultima, total = self._conexao.execute(" ".join(sql), parametros).fetchone()
+            if not total:
+                return None
+            primeira, ultima = (self._conexao.execute("SELECT timestamp FROM capturas WHERE id = ?", (i,)).fetchone()[0]
+                                for i in (primeira, ultima))
+        return {"primeira": primeira, "ultima": ultima, "capturas": total}
+
+    def __len__(self):
+        with self._lock:
+            return self._conexao.execute("SELECT count(*) FROM capturas").fetchone()[0]
+
+def indexar_mongo(indice, colecao, original, lote=200):
+    """Indexa os documentos já gravados no MongoDB (os já indexados são pulados). Devolve quantos entraram."""
+    from .ingestao import ler_conteudo
+    novos = 0
+    for documento in colecao.find({}, {"content": 1, "content_encoding": 1, "timestamp": 1}, batch_size=lote):
+        if "content" not in documento:
+            continue  # quase duplicata gravada sem o conteúdo
+        timestamp = documento["timestamp"].strftime("%Y%m%d%H%M%S")
+        novos += indice.indexar(timestamp, original, ler_conteudo(documento))
+    return novos
+
+def main():
+    parser = argparse.ArgumentParser(description="Busca textual nas homes capturadas (SQLite FTS5).")
+    parser.add_argument("--indice", default=str(Path(config.ARCHIVEBOX_DIR) / BUSCA_NAME))
+    sub = parser.add_subparsers(dest="comando", required=True)
+    buscar = sub.add_parser("buscar", help="Consulta no índice (sintaxe do FTS5)")
+    buscar.add_argument("consulta")
+    buscar.add_argument("--de", help="Timestamp inicial (ex.: 2020, 202103)")
+    buscar.add_argument("--ate", help="Timestamp final, inclusivo")
+    buscar.add_argument("--original", help="URL original exata")
+    buscar.add_argument("--titulos", action="store_true", help="Só no <title> e nas manchetes (h1-h3)")
+    buscar.add_argument("--limite", type=int, default=50)
+    buscar.add_argument("--resumo", action="store_true", help="Só a primeira e a última aparição")
+    mongo = sub.add_parser("indexar-mongo", help="Indexa as capturas já gravadas no MongoDB")
+    mongo.add_argument("--mongodb-uri", default=config.MONGODB_URI)
+    mongo.add_argument("--original", default="https://www.poder360.com.br/",
+                       help="URL original dos documentos (a coleção não a guarda)")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(message)s")
+
+    indice = IndiceTexto(args.indice)
+    if args.comando == "indexar-mongo":
+        from .banco import conectarBanco, obter_colecao
+        client = conectarBanco(args.mongodb_uri)
+        if client is None:
+            raise SystemExit(1)
+        inicio = time.perf_counter()
+        novos = indexar_mongo(indice, obter_colecao(client), args.original)
+        print(f"{novos} capturas indexadas em {time.perf_counter() - inicio:.1f} s ({len(indice)} no índice).")
+        return
+
+    filtros = {"de": args.de, "ate": args.ate, "original": args.original, "so_titulos": args.titulos}
+    inicio = time.perf_counter()
+    if args.resumo:
+        print(indice.periodos(args.consulta, **filtros))
+    else:
+        for resultado in indice.buscar(args.consulta, limite=args.limite, **filtros):
+            print(f"{resultado['timestamp']}  {resultado['original']}  {resultado['trecho']}")
+    logging.info(f"Consulta em {(time.perf_counter() - inicio) * 1000:.1f} ms.")
+
+if __name__ == "__main__":
+    main()
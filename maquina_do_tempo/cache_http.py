@@ -0,0 +1,371 @@
+"""
+Proxy HTTP local com cache em disco para os recursos do Wayback.
+
+Ao renderizar uma captura, o Chrome do SingleFile baixa de novo cada recurso
+(.../web/<ts>im_/..., cs_, js_), embora capturas vizinhas repitam os mesmos
+recursos com o mesmo timestamp. Todas as capturas passam por este proxy
+(WAYBACK_PROXY), que guarda em disco as respostas 200 dessas URLs e os
+redirecionamentos (3xx, com o Location) para a captura mais próxima. O
+conteúdo do Wayback para um timestamp não muda, então um acerto no cache é
+sempre válido e não há revalidação.
+
+- Cache LRU com limite de tamanho: a ordem vem do mtime dos arquivos (que é
+  atualizado a cada acerto), então sobrevive a reinícios.
+- Requisições simultâneas da mesma URL fazem uma única busca na origem.
+- Requisições http:// ao web.archive.org saem por https (ou para o espelho
+  WAYBACK_HTTP_BASE, se houver); redirecionamentos não são seguidos aqui e vão
+  para o cliente com o Location https://web.archive.org/... trocado por
+  http://, para que o cliente volte por este proxy (e pelo cache) em vez de
+  abrir um túnel CONNECT. É o caso comum dos assets: a URL leva o timestamp
+  da página e o Wayback redireciona para a captura do próprio asset.
+- O resto (outros hosts, CONNECT para https) passa direto, sem cache.
+- Hosts bloqueados pela estratégia de carregamento (carregamento.py), vivos
+  ou arquivados no Wayback, recebem 204 sem ir à origem.
+- Com um PoolProxies, as buscas na origem saem pelos proxies do pool.
+
+    cache = ProxyCache("/dados/cache_wayback", tamanho_maximo=20 * 1024 ** 3)
+    url = cache.iniciar()            # http://127.0.0.1:<porta>
+    ...
+    cache.parar()
+
+    python -m maquina_do_tempo.cache_http --dir /dados/cache_wayback --porta 8899
+"""
+import argparse
+import hashlib
+import http.client
+import json
+import logging
+import os
+import re
+import select
+import socket
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import urlsplit, urlunsplit
+
+from . import config
+from .captura_http import url_espelho
+from .carregamento import ESTRATEGIAS, host_bloqueado, obter_estrategia
+from .metricas import METRICAS
+
+# =============================
+# Configurações e Constantes
+# =============================
+TAMANHO_MAXIMO = int(float(os.environ.get("CACHE_HTTP_GB", 10)) * 1024 ** 3)
+TIMEOUT_ORIGEM = 60  # segundos
+
+# Só respostas de URLs com timestamp e modo (im_, cs_, js_, if_, id_...) são imutáveis
+_URL_IMUTAVEL = re.compile(r"^/web/\d{14}[a-z]{2}_/")
+HOSTS_HTTPS = ("web.archive.org",)
+# Cabeçalhos que não são repassados (hop-by-hop ou recalculados aqui)
+_SEM_REPASSE = {"connection", "keep-alive", "proxy-authenticate", "proxy-authorization", "te", "trailers",
+                "transfer-encoding", "upgrade", "content-length", "content-encoding"}
+STATUS_CACHEAVEIS = (200, 301, 302, 303, 307, 308)
+# Cabeçalhos guardados junto com a resposta (o Location dos redirecionamentos)
+_CABECALHOS_CACHE = {"location", "memento-datetime"}
+
+class _SemRedirecionamento(urllib.request.HTTPRedirectHandler):
+    """O 3xx volta como HTTPError e é repassado (e cacheado) como veio; quem segue é o cliente."""
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+def cacheavel(url):
+    return bool(_URL_IMUTAVEL.match(urlsplit(url).path))
+
+def url_origem(url):
+    """
+    http://web.archive.org/... sai como https (o Wayback redireciona http para
+    https), ou para o espelho de config.WAYBACK_HTTP_BASE.
+    """
+    partes = urlsplit(url)
+    if partes.hostname in HOSTS_HTTPS and config.WAYBACK_HTTP_BASE:
+        return url_espelho(url)
+    if partes.scheme == "http" and partes.hostname in HOSTS_HTTPS:
+        return urlunsplit(("https",) + tuple(partes)[1:])
+    return url
+
+def location_pelo_proxy(cabecalhos):
+    """Troca o Location https:// de HOSTS_HTTPS por http://: o cliente segue o 3xx de volta por este proxy."""
+    trocados = []
+    for nome, valor in cabecalhos:
+        if nome.lower() == "location":
+            partes = urlsplit(valor)
+            if partes.scheme == "https" and partes.hostname in HOSTS_HTTPS:
+                valor = urlunsplit(("http",) + tuple(partes)[1:])
+        trocados.append((nome, valor))
+    return trocados
+
+class CacheDisco:
+    """
+    Arquivos <dir>/<2 hex>/<sha256 da URL>: uma linha JSON (status, tipo,
+    cabeçalhos) e o corpo. O índice LRU fica em memória e é reconstruído do mtime ao abrir.
+    """
+    def __init__(self, diretorio, tamanho_maximo=TAMANHO_MAXIMO):
+        self.diretorio = Path(diretorio)
+        self.tamanho_maximo = tamanho_maximo
+        self._lru = OrderedDict()  # chave -> tamanho, do menos para o mais recente
+        self.tamanho = 0
+        self._lock = threading.Lock()
+        self.diretorio.mkdir(parents=True, exist_ok=True)
+        self._carregar_indice()
+        METRICAS.registrar_gauge("cache_http_bytes", lambda: self.tamanho)
+
+    def _carregar_indice(self):
+        entradas = []
+        for caminho in self.diretorio.glob("??/*"):
+            if caminho.suffix == ".tmp":
+                caminho.unlink(missing_ok=True)  # escrita interrompida
+                continue
+            estado = caminho.stat()
+            entradas.append((estado.st_mtime, caminho.name, estado.st_size))
+        for _, chave, tamanho in sorted(entradas):
+            self._lru[chave] = tamanho
+            self.tamanho += tamanho
+        self._despejar()
+
+    @staticmethod
+    def chave(url):
+        return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+    def _caminho(self, chave):
+        return self.diretorio / chave[:2] / chave
+
+    def obter(self, url):
+        """(status, tipo, corpo, cabeçalhos) ou None; cabeçalhos é uma lista de pares (nome, valor)."""
+        chave = self.chave(url)
+        with self._lock:
+            if chave not in self._lru:
+                return None
+            self._lru.move_to_end(chave)
+        caminho = self._caminho(chave)
+        try:
+            with open(caminho, "rb") as f:
+                meta = json.loads(f.readline())
+                corpo = f.read()
+            os.utime(caminho)  # mtime = último uso, para a ordem LRU após reinício
+        except (OSError, ValueError):
+            with self._lock:
+                self.tamanho -= self._lru.pop(chave, 0)
+            return None
+        return meta["status"], meta.get("tipo"), corpo, [tuple(par) for par in meta.get("cabecalhos", ())]
+
+    def guardar(self, url, status, tipo, corpo, cabecalhos=()):
+        chave = self.chave(url)
+        caminho = self._caminho(chave)
+        caminho.parent.mkdir(exist_ok=True)
+        temporario = caminho.with_name(f"{chave}.{threading.get_ident()}.tmp")
+        with open(temporario, "wb") as f:
+            meta = {"status": status, "tipo": tipo, "url": url,
+                    "cabecalhos": [[nome, valor] for nome, valor in cabecalhos if nome.lower() in _CABECALHOS_CACHE]}
+            f.write(json.dumps(meta).encode("utf-8") + b"\n")
+            f.write(corpo)
+        os.replace(temporario, caminho)
+        tamanho = caminho.stat().st_size
+        with self._lock:
+            self.tamanho += tamanho - self._lru.pop(chave, 0)
+            self._lru[chave] = tamanho
+            self._despejar()
+
+    def _despejar(self):
+        """Remove os menos usados até caber no limite. Chamado com o lock."""
+        while self.tamanho > self.tamanho_maximo and self._lru:
+            chave, tamanho = self._lru.popitem(last=False)
+            self.tamanho -= tamanho
+            try:
+                self._caminho(chave).unlink()
+            except OSError:
+                pass
+            METRICAS.contar("cache_http_total", resultado="despejo")
+
+class ProxyCache:
+    """Servidor do proxy. Uma instância atende todos os workers (threads, processos ou asyncio)."""
+    def __init__(self, diretorio, tamanho_maximo=TAMANHO_MAXIMO, pool=None, timeout=TIMEOUT_ORIGEM, bloquear=()):
+        self.cache = CacheDisco(diretorio, tamanho_maximo)
+        self.pool = pool
+        self.bloquear = tuple(bloquear)
+        self.timeout = timeout
+        self._em_voo = {}  # url -> threading.Event da busca em andamento
+        self._lock = threading.Lock()
+        self._servidor = None
+        self.url = None
+
+    def _abrir(self, url, metodo="GET", corpo=None, cabecalhos=None):
+        """
+        Busca na origem (pelo pool de proxies, se houver), sem seguir
+        redirecionamentos. Devolve (status, tipo, corpo, cabeçalhos), com os
+        cabeçalhos como lista de pares (os repetidos, como Set-Cookie, ficam).
+        """
+        requisicao = urllib.request.Request(url_origem(url), data=corpo, method=metodo, headers=cabecalhos or {})
+        proxy = self.pool.escolher() if self.pool is not None else None
+        rotas = {"http": proxy.url, "https": proxy.url} if proxy is not None else {}
+        abridor = urllib.request.build_opener(urllib.request.ProxyHandler(rotas), _SemRedirecionamento)
+        inicio = time.monotonic()
+        try:
+            with METRICAS.tempo("cache_http_origem"):
+                with abridor.open(requisicao, timeout=self.timeout) as resposta:
+                    resultado = (resposta.status, resposta.headers.get("Content-Type"), resposta.read(),
+                                 resposta.headers.items())
+        except urllib.error.HTTPError as e:
+            resultado = e.code, e.headers.get("Content-Type"), e.read(), e.headers.items()
+        except (OSError, http.client.HTTPException):  # HTTPException: resposta truncada (IncompleteRead)
+            if self.pool is not None:
+                self.pool.registrar(proxy, False)
+            raise
+        except BaseException:
+            if self.pool is not None:
+                self.pool.devolver(proxy)
+            raise
+        if 300 <= resultado[0] < 400:
+            resultado = resultado[:3] + (location_pelo_proxy(resultado[3]),)
+        if self.pool is not None:
+            status = resultado[0]
+            bloqueado = proxy is not None and status in (403, 429, 503)
+            self.pool.registrar(proxy, status < 500 and not bloqueado, time.monotonic() - inicio, bloqueado=bloqueado)
+        return resultado
+
+    def buscar(self, url):
+        """(status, tipo, corpo, cabeçalhos, origem) de uma URL cacheável; origem é 'hit' ou 'miss'."""
+        while True:
+            encontrado = self.cache.obter(url)
+            if encontrado is not None:
+                METRICAS.contar("cache_http_total", resultado="hit")
+                return encontrado + ("hit",)
+            with self._lock:
+                evento = self._em_voo.get(url)
+                if evento is None:
+                    evento = self._em_voo[url] = threading.Event()
+                    dono = True
+                else:
+                    dono = False
+            if not dono:
+                # Outra thread já está buscando a mesma URL: espera e tenta o cache de novo
+                evento.wait(self.timeout)
+                continue
+            try:
+                status, tipo, corpo, cabecalhos = self._abrir(url)
+                if status in STATUS_CACHEAVEIS:
+                    self.cache.guardar(url, status, tipo, corpo, cabecalhos)
+                METRICAS.contar("cache_http_total", resultado="miss")
+                return status, tipo, corpo, cabecalhos, "miss"
+            finally:
+                with self._lock:
+                    self._em_voo.pop(url, None)
+                evento.set()
+
+    def iniciar(self, porta=0, host="127.0.0.1"):
+        """Sobe o proxy em uma thread daemon e devolve a URL (http://host:porta)."""
+        estado = self
+
+        class _Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _responder(self, status, tipo, corpo, cabecalhos=None, origem=None):
+                self.send_response(status)
+                for nome, valor in cabecalhos or ():
+                    if nome.lower() not in _SEM_REPASSE and nome.lower() != "content-type":
+                        self.send_header(nome, valor)
+                self.send_header("Content-Type", tipo or "application/octet-stream")
+                self.send_header("Content-Length", str(len(corpo)))
+                if origem:
+                    self.send_header("X-Cache", origem.upper())
+                self.end_headers()
+                if self.command != "HEAD":
+                    self.wfile.write(corpo)
+
+            def _repassar(self):
+                if not urlsplit(self.path).scheme:
+                    self._responder(400, "text/plain", b"o proxy espera uma URL absoluta")
+                    return
+                if host_bloqueado(self.path, estado.bloquear):
+                    METRICAS.contar("cache_http_total", resultado="bloqueio")
+                    self._responder(204, "text/plain", b"")
+                    return
+                try:
+                    if self.command == "GET" and cacheavel(self.path):
+                        status, tipo, corpo, cabecalhos, origem = estado.buscar(self.path)
+                        self._responder(status, tipo, corpo, cabecalhos, origem=origem)
+                        return
+                    tamanho = int(self.headers.get("Content-Length") or 0)
+                    dados = self.rfile.read(tamanho) if tamanho else None
+                    cabecalhos = {k: v for k, v in self.headers.items()
+                                  if k.lower() not in _SEM_REPASSE and k.lower() not in ("host", "accept-encoding")}
+                    status, tipo, corpo, extras = estado._abrir(self.path, self.command, dados, cabecalhos)
+                    METRICAS.contar("cache_http_total", resultado="passagem")
+                    self._responder(status, tipo, corpo, extras)
+                except OSError as e:
+                    METRICAS.falha("cache_http", e)
+                    self._responder(502, "text/plain", str(e).encode("utf-8"))
+
+            do_GET = do_HEAD = do_POST = _repassar
+
+            def do_CONNECT(self):
+                # https: túnel sem cache (o conteúdo é cifrado)
+                if host_bloqueado(self.path, estado.bloquear):
+                    METRICAS.contar("cache_http_total", resultado="bloqueio")
+                    self._responder(403, "text/plain", b"host bloqueado")
+                    return
+                host, _, porta = self.path.rpartition(":")
+                try:
+                    destino = socket.create_connection((host, int(porta)), timeout=30)
+                except (OSError, ValueError) as e:
+                    self._responder(502, "text/plain", str(e).encode("utf-8"))
+                    return
+                self.send_response(200, "Connection Established")
+                self.end_headers()
+                conexoes = [self.connection, destino]
+                try:
+                    while True:
+                        prontas, _, erro = select.select(conexoes, [], conexoes, 60)
+                        if erro or not prontas:
+                            break
+                        for origem in prontas:
+                            dados = origem.recv(65536)
+                            if not dados:
+                                return
+                            (destino if origem is self.connection else self.connection).sendall(dados)
+                finally:
+                    destino.close()
+                    self.close_connection = True
+
+            def log_message(self, *args):
+                pass
+
+        self._servidor = ThreadingHTTPServer((host, porta), _Handler)
+        self._servidor.daemon_threads = True
+        threading.Thread(target=self._servidor.serve_forever, name="cache-http", daemon=True).start()
+        host, porta = self._servidor.server_address[:2]
+        self.url = f"http://{host}:{porta}"
+        logging.info(f"Cache HTTP em {self.url} ({self.cache.diretorio}, {self.cache.tamanho / 1024 ** 2:.0f} MiB).")
+        return self.url
+
+    def parar(self):
+        if self._servidor is not None:
+            self._servidor.shutdown()
+            self._servidor.server_close()
+            self._servidor = None
+
+def main():
+    parser = argparse.ArgumentParser(description="Proxy com cache em disco para os recursos do Wayback.")
+    parser.add_argument("--dir", default=os.path.join(config.ARCHIVEBOX_DIR, "cache_http"))
+    parser.add_argument("--porta", type=int, default=8899)
+    parser.add_argument("--tamanho-gb", type=float, default=TAMANHO_MAXIMO / 1024 ** 3)
+    parser.add_argument("--carregamento", choices=list(ESTRATEGIAS), default=config.CARREGAMENTO,
+                        help="Estratégia cujos hosts bloqueados o proxy recusa")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s]: %(message)s')
+    cache = ProxyCache(args.dir, int(args.tamanho_gb * 1024 ** 3),
+                       bloquear=obter_estrategia(args.carregamento).bloquear)
+    print(f"Cache HTTP em {cache.iniciar(args.porta)}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        cache.parar()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+"""
+Captura leve das URLs 'if_' do Wayback por HTTP, sem abrir o Chrome.
+
+A URL .../web/<ts>if_/<original> devolve o HTML arquivado sem a barra do
+Wayback. Para análises que não precisam da página renderizada, baixar esse
+HTML com um client HTTP (keep-alive, HTTP/2 quando o pacote 'h2' existe,
+gzip) é ordens de grandeza mais barato que o SingleFile. O resultado é
+gravado como singlefile.html em um diretório de snapshot, para que as etapas
+seguintes (documento, processadores, limpeza) não mudem.
+
+O HTML é gravado byte a byte como o Wayback o serviu (sem decodificar nem
+trocar o charset). Opcionalmente, CSS, scripts e imagens são embutidos no
+HTML (data URI e <style>/<script> inline), como faz o SingleFile; cada asset
+passa pelo limitador do Wayback como qualquer outra requisição.
+
+Depende do 'httpx' (pip install httpx; HTTP/2 com pip install 'httpx[http2]').
+"""
+import asyncio
+import base64
+import itertools
+import os
+import re
+import threading
+import time
+from pathlib import Path
+from urllib.parse import urljoin, urlsplit, urlunsplit
+
+from . import config
+from .limitador import STATUS_LIMITACAO
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+try:
+    import h2  # noqa: F401  (habilita HTTP/2 no httpx)
+    HTTP2 = True
+except ImportError:
+    HTTP2 = False
+
+# =============================
+# Configurações e Constantes
+# =============================
+TIMEOUT = 30.0                          # segundos por requisição
+CONEXOES_MAXIMAS = 32                   # por client (um client por proxy)
+ASSET_TAMANHO_MAXIMO = 2 * 1024 ** 2    # assets maiores ficam como link
+ASSETS_POR_PAGINA = 100
+URL_ASSET_TAMANHO_MAXIMO = 2048         # "URLs" maiores são restos de JS/markup casados pelas regex
+USER_AGENT = "Mozilla/5.0 (compatible; maquina_do_tempo/1.0; +https://web.archive.org)"
+
+_MODO_WAYBACK = re.compile(r"/web/(\d{14})(?:[a-z]{2}_)?/")
+_LINK_CSS = re.compile(rb"<link\b[^>]*\brel=[\"']?stylesheet[\"']?[^>]*>", re.I)
+_SCRIPT = re.compile(rb"<script\b([^>]*?)\bsrc=([\"'])(.*?)\2([^>]*)>\s*</script>", re.I | re.S)
+_IMG = re.compile(rb"(<img\b[^>]*?\bsrc=)([\"'])(.*?)\2", re.I | re.S)
+_HREF = re.compile(rb"\bhref=([\"'])(.*?)\1", re.I | re.S)
+
+_contador = itertools.count()
+
+class ErroCapturaHTTP(Exception):
+    """
+    Falha de uma tentativa de captura por HTTP. 'stderr' imita a saída das
+    ferramentas de captura ("HTTP Error 429: ..."), para que o tratamento de
+    retry/bloqueio seja o mesmo do 'archivebox add'.
+    """
+    def __init__(self, status, mensagem, retry_after=None):
+        self.status = status
+        self.retry_after = retry_after
+        self.stderr = f"HTTP Error {status}: {mensagem}" if status else mensagem
+        super().__init__(self.stderr)
+
+def url_bruta(url):
+    """Força o modo 'if_' (HTML original, sem a barra do Wayback) em uma URL do Wayback."""
+    return _MODO_WAYBACK.sub(lambda m: f"/web/{m.group(1)}if_/", url, count=1)
+
+def url_espelho(url, base=None):
+    """Troca o host web.archive.org por 'base' (espelho ou Wayback falso do benchmark)."""
+    base = config.WAYBACK_HTTP_BASE if base is None else base
+    partes = urlsplit(url)
+    if not base or partes.hostname not in ("web.archive.org", "archive.org"):
+        return url
+    destino = urlsplit(base)
+    return urlunsplit((destino.scheme, destino.netloc, partes.path, partes.query, partes.fragment))
+
+def _url_atributo(valor):
+    """Valor de um atributo (bytes) como URL; bytes fora do UTF-8 não aparecem em URLs válidas."""
+    return valor.decode("utf-8", errors="replace").strip()
+
+def coletar_assets(html, base):
+    """URLs absolutas dos CSS, scripts e imagens referenciados no HTML em bytes (sem repetição, na ordem)."""
+    urls = []
+    for tag in _LINK_CSS.finditer(html):
+        href = _HREF.search(tag.group(0))
+        if href:
+            urls.append(href.group(2))
+    urls.extend(m.group(3) for m in _SCRIPT.finditer(html))
+    urls.extend(m.group(3) for m in _IMG.finditer(html))
+    urls = [_url_atributo(u) for u in urls]
+    absolutas = [urljoin(base, u) for u in urls
+                 if u and not u.startswith("data:") and len(u) <= URL_ASSET_TAMANHO_MAXIMO and "<" not in u]
+    return list(dict.fromkeys(absolutas))[:ASSETS_POR_PAGINA]
+
+def inlinar_assets(html, base, conteudos):
+    """
+    Embute no HTML (bytes) os assets de 'conteudos' ({url absoluta: (bytes,
+    content-type)}). Os que faltam em 'conteudos' (falharam ou grandes
+    demais) continuam como link. Só os trechos substituídos mudam: o resto do
+    documento fica com os bytes originais.
+    """
+    def obter(url):
+        return conteudos.get(urljoin(base, _url_atributo(url)))
+
+    def css(m):
+        href = _HREF.search(m.group(0))
+        asset = obter(href.group(2)) if href else None
+        if asset is None:
+            return m.group(0)
+        return b"<style>" + asset[0].replace(b"</style", b"<\\/style") + b"</style>"
+
+    def script(m):
+        asset = obter(m.group(3))
+        if asset is None:
+            return m.group(0)
+        return b"<script" + m.group(1) + m.group(4) + b">" + asset[0].replace(b"</script", b"<\\/script") + b"</script>"
+
+    def img(m):
+        asset = obter(m.group(3))
+        if asset is None:
+            return m.group(0)
+        conteudo, tipo = asset
+        uri = f"data:{tipo or 'application/octet-stream'};base64,".encode("ascii") + base64.b64encode(conteudo)
+        return m.group(1) + m.group(2) + uri + m.group(2)
+
+    html = _LINK_CSS.sub(css, html)
+    html = _SCRIPT.sub(script, html)
+    return _IMG.sub(img, html)
+
+class CapturadorHTTP:
+    """
+    Baixa capturas 'if_' e grava o snapshot em ARCHIVEBOX_DIR/archive. Os
+    clients (um por proxy, com pool de conexões keep-alive) são criados sob
+    demanda; os síncronos servem às threads, os assíncronos ao event loop.
+    Cada chamada a buscar()/buscar_async() é uma tentativa: os retries ficam
+    com quem chama (estagios.capturar_http).
+    """
+    def __init__(self, archivebox_dir, inlinar=False, timeout=TIMEOUT, base=None, proxy_padrao=None):
+        if httpx is None:
+            raise RuntimeError("A captura por HTTP precisa do pacote 'httpx' "
+                               "(pip install httpx; ver requirements-extras.txt).")
+        self.archive_dir = Path(archivebox_dir) / "archive"
+        self.inlinar = inlinar
+        self.timeout = timeout
+        self.base = base
+        # Proxy usado quando a tentativa não traz um do pool (ex.: o cache HTTP)
+        self.proxy_padrao = proxy_padrao
+        self._clientes = {}
+        self._clientes_async = {}
+        self._lock = threading.Lock()
+
+    def _opcoes(self, proxy):
+        return dict(
+            http2=HTTP2,
+            timeout=self.timeout,
+            follow_redirects=True,  # o Wayback redireciona para o timestamp mais próximo
+            headers={"User-Agent": USER_AGENT, "Accept-Encoding": "gzip, deflate"},
+            limits=httpx.Limits(max_connections=CONEXOES_MAXIMAS, max_keepalive_connections=CONEXOES_MAXIMAS),
+            proxy=proxy.url if proxy is not None else self.proxy_padrao,
+        )
+
+    def _cliente(self, proxy):
+        chave = proxy.url if proxy is not None else None
+        with self._lock:
+            cliente = self._clientes.get(chave)
+            if cliente is None:
+                cliente = self._clientes[chave] = httpx.Client(**self._opcoes(proxy))
+            return cliente
+
+    def _cliente_async(self, proxy):
+        chave = proxy.url if proxy is not None else None
+        cliente = self._clientes_async.get(chave)
+        if cliente is None:
+            cliente = self._clientes_async[chave] = httpx.AsyncClient(**self._opcoes(proxy))
+        return cliente
+
+    @staticmethod
+    def _verificar(resposta):
+        """HTML da resposta (bytes, como servido) ou ErroCapturaHTTP (status, bloqueio ou conteúdo que não é HTML)."""
+        if resposta.status_code != 200:
+            retry_after = resposta.headers.get("Retry-After") if resposta.status_code in STATUS_LIMITACAO else None
+            raise ErroCapturaHTTP(resposta.status_code, resposta.reason_phrase, retry_after)
+        tipo = resposta.headers.get("Content-Type", "")
+        if tipo and "html" not in tipo.lower():
+            raise ErroCapturaHTTP(None, f"Conteúdo não é HTML ({tipo})")
+        return resposta.content
+
+    def _salvar(self, url, html):
+        """Grava o HTML como singlefile.html em archive/<timestamp>.http<pid><n>."""
+        m = _MODO_WAYBACK.search(url)
+        ts = m.group(1) if m else str(int(time.time()))
+        snapshot_dir = self.archive_dir / f"{ts}.http{os.getpid()}{next(_contador):06d}"
+        snapshot_dir.mkdir(parents=True, exist_ok=True)
+        (snapshot_dir / "singlefile.html").write_bytes(html)
+        return snapshot_dir
+
+    @staticmethod
+    def _asset(resposta):
+        """
+        (bytes, content-type) de um asset, ou None se ele ficar como link. Um
+        429/503 lança ErroCapturaHTTP: a tentativa inteira volta para o
+        retry, que penaliza o limitador e o proxy como na página.
+        """
+        if resposta.status_code in STATUS_LIMITACAO:
+            raise ErroCapturaHTTP(resposta.status_code, f"asset: {resposta.reason_phrase}",
+                                  resposta.headers.get("Retry-After"))
+        if resposta.status_code != 200 or len(resposta.content) > ASSET_TAMANHO_MAXIMO:
+            return None
+        return resposta.content, resposta.headers.get("Content-Type", "").split(";")[0].strip()
+
+    def buscar(self, url, proxy=None, limitador=None):
+        """Uma tentativa de captura. Devolve o diretório do snapshot."""
+        alvo = url_espelho(url_bruta(url), self.base)
+        cliente = self._cliente(proxy)
+        try:
+            html = self._verificar(cliente.get(alvo))
+            if self.inlinar:
+                conteudos = {}
+                for asset in coletar_assets(html, alvo):
+                    if limitador is not None:
+                        limitador.adquirir()
+                    try:
+                        resultado = self._asset(cliente.get(url_espelho(asset, self.base)))
+                    except (httpx.HTTPError, httpx.InvalidURL):
+                        resultado = None
+                    if resultado is not None:
+                        conteudos[asset] = resultado
+                html = inlinar_assets(html, alvo, conteudos)
+        except httpx.HTTPError as e:
+            raise ErroCapturaHTTP(None, f"{type(e).__name__}: {e}") from e
+        return self._salvar(url, html)
+
+    async def buscar_async(self, url, proxy=None, limitador=None):
+        """Versão assíncrona de buscar(); os assets são baixados em paralelo (no ritmo do limitador)."""
+        alvo = url_espelho(url_bruta(url), self.base)
+        cliente = self._cliente_async(proxy)
+        try:
+            html = self._verificar(await cliente.get(alvo))
+            if self.inlinar:
+                assets = coletar_assets(html, alvo)
+
+                async def baixar(asset):
+                    if limitador is not None:
+                        await limitador.adquirir_async()
+                    try:
+                        return self._asset(await cliente.get(url_espelho(asset, self.base)))
+                    except (httpx.HTTPError, httpx.InvalidURL):
+                        return None
+
+                resultados = await asyncio.gather(*(baixar(a) for a in assets), return_exceptions=True)
+                for resultado in resultados:
+                    if isinstance(resultado, BaseException):
+                        raise resultado
+                conteudos = {a: r for a, r in zip(assets, resultados) if r is not None}
+                html = inlinar_assets(html, alvo, conteudos)
+        except httpx.HTTPError as e:
+            raise ErroCapturaHTTP(None, f"{type(e).__name__}: {e}") from e
+        return await asyncio.to_thread(self._salvar, url, html)
+
+    def fechar(self):
+        for cliente in self._clientes.values():
+            cliente.close()
+        self._clientes.clear()
+
+    async def fechar_async(self):
+        for cliente in self._clientes_async.values():
+            await cliente.aclose()
+        self._clientes_async.clear()
+        self.fechar()
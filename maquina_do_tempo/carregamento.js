@@ -0,0 +1,99 @@
+// Carregamento determinístico da página antes da captura do SingleFile.
+//
+// Injetado com --browser-script (carregamento.py). Em vez de esperar a rede
+// ficar ociosa, espera o conteúdo principal (ou o DOM parar de mudar), rola a
+// página em passos do tamanho da janela forçando as imagens lazy e só então
+// libera a captura (protocolo de user script do SingleFile). Tudo tem prazo.
+(() => {
+    const CONFIG = Object.assign({
+        seletores: ["main", "article", "[role=main]", "#content", "#main", ".content"],
+        estabilidadeMs: 1000,
+        prazoMs: 20000,
+        passoMaximoMs: 1500,
+        rolagem: true,
+    }, /*CONFIG*/{});
+
+    const inicio = Date.now();
+    const dormir = ms => new Promise(resolve => setTimeout(resolve, Math.max(0, ms)));
+    const restante = () => CONFIG.prazoMs - (Date.now() - inicio);
+
+    // Atributos ficam de fora: carrosséis e animações mudam estilos o tempo todo
+    let ultimaMutacao = Date.now();
+    new MutationObserver(() => { ultimaMutacao = Date.now(); })
+        .observe(document, { childList: true, subtree: true, characterData: true });
+    const parado = () => Date.now() - ultimaMutacao;
+
+    const carregado = new Promise(resolve => {
+        if (document.readyState !== "loading") resolve();
+        else document.addEventListener("DOMContentLoaded", resolve, { once: true });
+    });
+
+    function conteudoPrincipal() {
+        return CONFIG.seletores.some(seletor => {
+            const elemento = document.querySelector(seletor);
+            return elemento && elemento.textContent.trim().length > 0;
+        });
+    }
+
+    function forcarLazy() {
+        for (const elemento of document.querySelectorAll("img[loading=lazy], iframe[loading=lazy]")) {
+            elemento.loading = "eager";
+        }
+        for (const elemento of document.querySelectorAll("[data-src], [data-lazy-src], [data-original]")) {
+            const src = elemento.dataset.src || elemento.dataset.lazySrc || elemento.dataset.original;
+            if (src && elemento.getAttribute("src") !== src) elemento.setAttribute("src", src);
+        }
+        for (const elemento of document.querySelectorAll("[data-srcset]")) {
+            if (elemento.getAttribute("srcset") !== elemento.dataset.srcset) {
+                elemento.setAttribute("srcset", elemento.dataset.srcset);
+            }
+        }
+    }
+
+    function imagensVisiveisPendentes() {
+        return Array.from(document.images).some(imagem =>
+            !imagem.complete && imagem.getBoundingClientRect().top < window.innerHeight);
+    }
+
+    async function rolar() {
+        let y = 0;
+        while (restante() > 0) {
+            const altura = document.documentElement.scrollHeight;
+            if (y + window.innerHeight >= altura) break;
+            y += Math.max(Math.floor(window.innerHeight * 0.9), 200);
+            window.scrollTo(0, y);
+            forcarLazy();
+            // O passo termina quando as imagens visíveis chegaram e o DOM sossegou
+            const limite = Date.now() + Math.min(CONFIG.passoMaximoMs, restante());
+            while (Date.now() < limite && (imagensVisiveisPendentes() || parado() < 200)) {
+                await dormir(50);
+            }
+        }
+        window.scrollTo(0, 0);
+    }
+
+    async function preparar() {
+        await carregado;
+        while (restante() > 0 && !conteudoPrincipal() && parado() < CONFIG.estabilidadeMs) {
+            await dormir(100);
+        }
+        forcarLazy();
+        if (CONFIG.rolagem) await rolar();
+        while (restante() > 0 && parado() < CONFIG.estabilidadeMs) {
+            await dormir(Math.min(CONFIG.estabilidadeMs - parado(), restante()));
+        }
+    }
+
+    // Começa assim que o DOM existe, em paralelo à espera do SingleFile
+    const preparo = preparar();
+    let concluido = false;
+    window.addEventListener("single-file-on-before-capture-request", evento => {
+        if (concluido) return;
+        evento.preventDefault();
+        preparo.finally(() => {
+            concluido = true;
+            window.dispatchEvent(new CustomEvent("single-file-request-capture"));
+        });
+    });
+    window.dispatchEvent(new CustomEvent("single-file-user-script-init"));
+})();
@@ -0,0 +1,144 @@
+"""
+Estratégias de carregamento da página antes da captura pelo SingleFile.
+
+Esperar 'networkidle' em páginas com GTM, analytics e anúncios custa até o
+timeout: sempre há um beacon ou um script de rastreamento pendente. Uma
+estratégia combina:
+
+- bloqueio dos hosts de rastreamento (regras de DNS do Chrome para os hosts
+  vivos; o cache HTTP também recusa as cópias arquivadas deles no Wayback,
+  como .../web/<ts>im_/https://sb.scorecardresearch.com/...);
+- espera por um evento mais cedo que a rede ociosa ('load' ou
+  'domcontentloaded') e, no navegador, pelo conteúdo principal (seletores)
+  ou pelo DOM estável (carregamento.js);
+- rolagem adaptativa em passos do tamanho da janela, forçando imagens lazy,
+  no lugar do scroll.js (100 px a cada 500 ms).
+
+O plugin do SingleFile recebe tudo pelo ambiente do 'archivebox add':
+WAYBACK_CHROME_ARGS e WAYBACK_SINGLEFILE_ARGS (listas JSON).
+
+    estrategia = obter_estrategia("padrao")
+    env = estrategia.ambiente(ARCHIVEBOX_DIR)
+"""
+import json
+import os
+import re
+import tempfile
+from pathlib import Path
+from urllib.parse import urlsplit
+
+# =============================
+# Configurações e Constantes
+# =============================
+# Rastreamento e métricas: não mudam o conteúdo, só seguram a rede
+HOSTS_RASTREADORES = (
+    "googletagmanager.com", "google-analytics.com", "analytics.google.com", "scorecardresearch.com",
+    "chartbeat.com", "chartbeat.net", "hotjar.com", "quantserve.com", "nr-data.net", "newrelic.com",
+    "cloudflareinsights.com", "connect.facebook.net", "clarity.ms", "onesignal.com", "navdmp.com",
+)
+# Anúncios: bloqueá-los muda o que a captura mostra (só na estratégia "rapida")
+HOSTS_ANUNCIOS = (
+    "doubleclick.net", "googlesyndication.com", "adservice.google.com", "amazon-adsystem.com",
+    "taboola.com", "outbrain.com", "criteo.com", "criteo.net", "adsrvr.org",
+)
+SELETORES_CONTEUDO = ("main", "article", "[role=main]", "#content", "#main", ".content")
+SCRIPT = Path(__file__).with_name("carregamento.js")
+
+# URL do Wayback com a original embutida: /web/<ts><modo>/<url original>
+_ORIGINAL_WAYBACK = re.compile(r"^/web/\d{1,14}(?:[a-z]{2}_)?/+(?:https?:/+)?([^/:?#]+)", re.I)
+
+def host_bloqueado(url, hosts):
+    """True se a URL (direta, 'host:porta' de CONNECT ou arquivada no Wayback) é de um dos hosts ou subdomínio."""
+    if not hosts:
+        return False
+    partes = urlsplit(url if "//" in url else f"//{url}")
+    host = (partes.hostname or "").lower()
+    if host in ("web.archive.org", "archive.org"):
+        original = _ORIGINAL_WAYBACK.match(partes.path)
+        host = original.group(1).lower() if original else ""
+    return any(host == h or host.endswith("." + h) for h in hosts)
+
+class EstrategiaCarregamento:
+    """
+    Como a página é carregada antes da captura. 'esperar' é o --browser-wait-until
+    do SingleFile (None mantém o padrão dele, networkidle0); sem 'script', a
+    página não é rolada nem esperada no navegador.
+    """
+    def __init__(self, nome, esperar="load", bloquear=HOSTS_RASTREADORES, seletores=SELETORES_CONTEUDO,
+                 estabilidade_ms=1000, prazo_ms=20000, rolagem=True, script=True):
+        self.nome = nome
+        self.esperar = esperar
+        self.bloquear = tuple(bloquear)
+        self.seletores = list(seletores)
+        self.estabilidade_ms = estabilidade_ms
+        self.prazo_ms = prazo_ms
+        self.rolagem = rolagem
+        self.usar_script = script
+
+    def regras_dns(self):
+        """Valor de --host-resolver-rules: os hosts (e subdomínios) bloqueados não resolvem."""
+        return ", ".join(f"MAP {padrao} ~NOTFOUND" for h in self.bloquear for padrao in (h, f"*.{h}"))
+
+    def script(self):
+        """carregamento.js com os parâmetros desta estratégia."""
+        parametros = json.dumps({
+            "seletores": self.seletores,
+            "estabilidadeMs": self.estabilidade_ms,
+            "prazoMs": self.prazo_ms,
+            "rolagem": self.rolagem,
+        })
+        return SCRIPT.read_text(encoding="utf-8").replace("/*CONFIG*/{}", parametros, 1)
+
+    def gravar_script(self, diretorio):
+        """Grava o script em <diretorio>/carregamento_<nome>.js (escrita atômica) e devolve o caminho."""
+        Path(diretorio).mkdir(parents=True, exist_ok=True)
+        destino = Path(diretorio) / f"carregamento_{self.nome}.js"
+        conteudo = self.script()
+        if destino.exists() and destino.read_text(encoding="utf-8") == conteudo:
+            return destino
+        fd, temporario = tempfile.mkstemp(dir=diretorio, prefix=".carregamento_", suffix=".js")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(conteudo)
+        os.replace(temporario, destino)
+        return destino
+
+    def argumentos_chrome(self):
+        return [f"--host-resolver-rules={self.regras_dns()}"] if self.bloquear else []
+
+    def argumentos_singlefile(self, caminho_script=None):
+        argumentos = []
+        if self.esperar:
+            argumentos.append(f"--browser-wait-until={self.esperar}")
+        if caminho_script is not None:
+            argumentos += [f"--browser-script={caminho_script}", "--user-script-enabled=true"]
+        return argumentos
+
+    def ambiente(self, diretorio, env=None):
+        """Ambiente do 'archivebox add' com os argumentos extras que o plugin do SingleFile repassa."""
+        env = dict(os.environ if env is None else env)
+        caminho = self.gravar_script(diretorio) if self.usar_script else None
+        chrome = self.argumentos_chrome()
+        singlefile = self.argumentos_singlefile(caminho)
+        for nome, valor in (("WAYBACK_CHROME_ARGS", chrome), ("WAYBACK_SINGLEFILE_ARGS", singlefile)):
+            if valor:
+                env[nome] = json.dumps(valor)
+            else:
+                env.pop(nome, None)
+        return env
+
+ESTRATEGIAS = {
+    # Comportamento antigo do SingleFile: rede ociosa, nada bloqueado
+    "rede_ociosa": EstrategiaCarregamento("rede_ociosa", esperar=None, bloquear=(), script=False),
+    # Sem rastreadores, 'load' + conteúdo principal/DOM estável + rolagem
+    "padrao": EstrategiaCarregamento("padrao"),
+    # Também sem anúncios, a partir do DOMContentLoaded e com prazos curtos
+    "rapida": EstrategiaCarregamento("rapida", esperar="domcontentloaded",
+                                     bloquear=HOSTS_RASTREADORES + HOSTS_ANUNCIOS,
+                                     estabilidade_ms=500, prazo_ms=10000),
+}
+
+def obter_estrategia(nome):
+    try:
+        return ESTRATEGIAS[nome]
+    except KeyError:
+        raise ValueError(f"Estratégia de carregamento desconhecida: {nome} (use {', '.join(ESTRATEGIAS)})") from None
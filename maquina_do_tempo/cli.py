@@ -0,0 +1,248 @@
+import argparse
+import logging
+import os
+import sys
+from pathlib import Path
+
+from . import captura_http, config, manifesto
+from .banco import enable_wal_mode
+from .agendamento import ORDENS, ordenar_urls
+from .cache_http import TAMANHO_MAXIMO, ProxyCache
+from .carregamento import ESTRATEGIAS
+from .cpu import PROCESSADORES, EstagioCPU
+from .desligamento import PRAZO_DRENAGEM, Desligamento
+from .engines import ENGINES, criar_motor
+from .estagios import ConfigPipeline, Ledger
+from .fila_mongo import identificar_dono
+from .limpeza import ReaperSnapshots
+from .manifesto import Manifesto
+from .metricas import METRICAS, PORTA_METRICAS
+from .proxies import carregar_proxies
+from .quase_duplicatas import DISTANCIA_PADRAO
+from .quase_duplicatas import MODOS as MODOS_QUASE_DUPLICATAS
+from .registro import configurar_registro, parar_registro
+from .wayback import get_wayback_snapshots, load_urls_from_file, save_urls_to_file
+
+def obter_urls(args, cfg):
+    """
+    URLs a processar: do arquivo ou manifesto informado, ou do CDX (salvas em
+    URL_LIST_NAME e, com o numpy, também como manifesto).
+    """
+    if args.dominio:
+        urls = get_wayback_snapshots(args.dominio, args.cdx_api, limitador=cfg.limitador())
+        save_urls_to_file(urls, os.path.join(args.archivebox_dir, config.URL_LIST_NAME))
+        if manifesto.np is not None and urls:
+            Manifesto.criar(urls).salvar(os.path.join(args.archivebox_dir, config.MANIFESTO_NAME))
+        return urls
+
+    if not Path(args.url_list_file).exists():
+        logging.error(f"Arquivo {args.url_list_file} não encontrado.")
+        sys.exit(1)
+    if Manifesto.eh_manifesto(args.url_list_file):
+        # Pendentes e falhas transitórias (a ordem da execução vem de --ordem)
+        capturas = Manifesto.abrir(args.url_list_file)
+        indices = capturas.filtrar(status=[manifesto.PENDENTE, manifesto.FALHA])
+        return list(capturas.urls(indices))
+    return load_urls_from_file(args.url_list_file)
+
+def sincronizar_manifesto(caminho, cfg):
+    """Grava no manifesto de entrada o resultado da execução (ledgers de sucesso e de erro)."""
+    capturas = Manifesto.abrir(caminho, escrita=True)
+    falhas = [linha.split(": ", 1)[0] for linha in Ledger(cfg.error_log).carregar()]
+    capturas.sincronizar(Ledger(cfg.success_log).carregar(), falhas)
+    logging.info(f"Manifesto atualizado: {capturas.resumo()}")
+
+def criar_parser():
+    parser = argparse.ArgumentParser(
+        prog="python -m maquina_do_tempo",
+        description="Captura as homes do Wayback Machine com o ArchiveBox e grava no MongoDB.",
+    )
+    origem = parser.add_mutually_exclusive_group()
+    origem.add_argument("url_list_file", nargs="?",
+                        help="Arquivo com uma URL do Wayback por linha, ou diretório de manifesto (manifesto.py)")
+    origem.add_argument("--dominio", help="Consulta o CDX deste domínio/URL em vez de ler um arquivo")
+    parser.add_argument("--fila", action="store_true",
+                        help="Pega o trabalho da fila compartilhada no MongoDB (fila_mongo.py), com leases; "
+                             "a origem, se informada, é enfileirada antes (sem duplicar)")
+    parser.add_argument("--fila-sair-ociosa", action="store_true",
+                        help="Com --fila, termina assim que não houver trabalho disponível, em vez de esperar "
+                             "as URLs em retry e as leases das outras máquinas")
+    parser.add_argument("--engine", choices=list(ENGINES), default="threads",
+                        help="Estratégia de execução (padrão: threads)")
+    parser.add_argument("--ordem", choices=ORDENS, default=config.ORDEM_CAPTURAS,
+                        help="Ordem das capturas: cobertura (bissecção do período, uma amostra espalhada a "
+                             "cada ponto da execução), recentes (como o CDX) ou antigas")
+    parser.add_argument("--workers", type=int, default=config.MAX_WORKERS,
+                        help="Threads, processos ou capturas simultâneas, conforme a engine")
+    parser.add_argument("--archivebox-dir", default=config.ARCHIVEBOX_DIR,
+                        help="Diretório do ArchiveBox (padrão: $ARCHIVEBOX_DIR)")
+    parser.add_argument("--mongodb-uri", default=config.MONGODB_URI)
+    parser.add_argument("--cdx-api", default=config.WAYBACK_CDX_API)
+    parser.add_argument("--metricas-porta", type=int, default=PORTA_METRICAS,
+                        help="Porta local do endpoint /metrics (0 desliga)")
+    parser.add_argument("--taxa-wayback", type=float, default=config.WAYBACK_TAXA_INICIAL,
+                        help="Requisições/s iniciais ao web.archive.org; a taxa se adapta a 429/503 (0 desliga)")
+    parser.add_argument("--limite-compartilhado", default=config.WAYBACK_LIMITE_ARQUIVO,
+                        help="Arquivo SQLite para dividir o limite entre processos "
+                             "(padrão com --engine processes: ARCHIVEBOX_DIR/limite_wayback.sqlite3)")
+    parser.add_argument("--processadores", default="",
+                        help=f"Processadores de HTML separados por vírgula ({', '.join(PROCESSADORES)})")
+    parser.add_argument("--cpu-workers", type=int, default=None,
+                        help="Processos da etapa de CPU (padrão: núcleos - 1)")
+    parser.add_argument("--proxies", default=config.WAYBACK_PROXIES,
+                        help="Proxies das capturas, separados por vírgula (padrão: $WAYBACK_PROXIES)")
+    parser.add_argument("--proxies-arquivo", default=config.WAYBACK_PROXIES_ARQUIVO,
+                        help="Arquivo com um proxy por linha (padrão: $WAYBACK_PROXIES_ARQUIVO)")
+    parser.add_argument("--captura", choices=["archivebox", "http"], default="archivebox",
+                        help="archivebox (SingleFile/Chrome) ou http (HTML 'if_' sem navegador, "
+                             "com fallback para o archivebox por URL)")
+    parser.add_argument("--inlinar-assets", action="store_true",
+                        help="Na captura http, embute CSS, scripts e imagens no HTML")
+    parser.add_argument("--deduplicar-assets", action="store_true",
+                        help="Grava os assets embutidos (data URIs, <style>, <script>) uma vez na coleção "
+                             f"{config.ASSETS_COLLECTION_NAME}; o documento guarda só as referências")
+    parser.add_argument("--cache-http", default=config.CACHE_HTTP_DIR,
+                        help="Diretório do cache em disco dos recursos do Wayback; as capturas passam por um "
+                             "proxy local com esse cache (padrão: $CACHE_HTTP_DIR)")
+    parser.add_argument("--cache-http-gb", type=float, default=TAMANHO_MAXIMO / 1024 ** 3,
+                        help="Tamanho máximo do cache HTTP (despejo LRU)")
+    parser.add_argument("--carregamento", choices=list(ESTRATEGIAS), default=config.CARREGAMENTO,
+                        help="Como a página carrega antes do SingleFile: rede_ociosa (networkidle, como antes), "
+                             "padrao (sem rastreadores, conteúdo principal/DOM estável e rolagem adaptativa) "
+                             "ou rapida (também sem anúncios, prazos curtos)")
+    parser.add_argument("--quase-duplicatas", choices=MODOS_QUASE_DUPLICATAS,
+                        default=config.QUASE_DUPLICATAS or None,
+                        help="Compara o SimHash (texto visível e estrutura) com as capturas anteriores da mesma "
+                             "URL: marcar grava o documento com 'quase_duplicata_de'; pular grava sem o conteúdo "
+                             "nem os assets")
+    parser.add_argument("--distancia-quase-duplicatas", type=int, default=DISTANCIA_PADRAO,
+                        help="Bits de diferença (de 64) até os quais duas capturas são quase iguais")
+    parser.add_argument("--busca-texto", action="store_true", default=config.BUSCA_TEXTO,
+                        help="Indexa o texto de cada captura no SQLite FTS5 de ARCHIVEBOX_DIR "
+                             "(consultas: python -m maquina_do_tempo.busca_texto buscar ...)")
+    parser.add_argument("--intervalos-artigos", action="store_true", default=config.INTERVALOS_ARTIGOS,
+                        help="Registra os links de matéria de cada captura no índice de intervalos de "
+                             "ARCHIVEBOX_DIR (consultas: python -m maquina_do_tempo.intervalos_artigos ...)")
+    parser.add_argument("--orcamento-captura", type=float, default=config.ORCAMENTOS_ETAPAS["captura"],
+                        help="Prazo (s) de cada captura; no prazo a árvore de processos é morta e o DOM já "
+                             f"salvo é resgatado. Estouros vão para {config.TIMEOUT_LOG_NAME} (0 desliga)")
+    parser.add_argument("--orcamento-cpu", type=float, default=config.ORCAMENTOS_ETAPAS["cpu"],
+                        help="Prazo (s) dos processadores de HTML por página (0 desliga)")
+    parser.add_argument("--prazo-desligamento", type=float, default=PRAZO_DRENAGEM,
+                        help="No SIGINT/SIGTERM, segundos para as capturas em voo terminarem antes de serem "
+                             "mortas (um segundo sinal mata na hora)")
+    parser.add_argument("--sem-checkpoint", action="store_true",
+                        help="Ignora o checkpoint de uma execução interrompida e refaz a lista de URLs")
+    parser.add_argument("--sem-limpeza", action="store_true",
+                        help="Mantém os diretórios de snapshot após o insert")
+    return parser
+
+def main(argv=None):
+    parser = criar_parser()
+    args = parser.parse_args(argv)
+    processadores = [nome.strip() for nome in args.processadores.split(",") if nome.strip()]
+    desconhecidos = [nome for nome in processadores if nome not in PROCESSADORES]
+    if desconhecidos:
+        parser.error(f"processadores desconhecidos: {', '.join(desconhecidos)}")
+    if args.captura == "http" and captura_http.httpx is None:
+        parser.error("--captura http precisa do pacote 'httpx' (pip install httpx; ver requirements-extras.txt)")
+    if not (args.url_list_file or args.dominio or args.fila):
+        parser.error("informe url_list_file, --dominio ou --fila")
+    if args.url_list_file and Manifesto.eh_manifesto(args.url_list_file) and manifesto.np is None:
+        parser.error("manifestos binários precisam do pacote 'numpy' (pip install numpy; ver requirements-extras.txt)")
+
+    configurar_registro(args.archivebox_dir, processos=args.engine == "processes")
+    logging.info(f"Iniciando o processo de arquivamento (engine={args.engine}, workers={args.workers}).")
+
+    limite_arquivo = args.limite_compartilhado
+    if not limite_arquivo and args.engine == "processes":
+        # Cada worker teria o próprio bucket: o limite real seria multiplicado pelo número de processos
+        limite_arquivo = os.path.join(args.archivebox_dir, "limite_wayback.sqlite3")
+    cfg = ConfigPipeline(archivebox_dir=args.archivebox_dir, mongodb_uri=args.mongodb_uri,
+                         processadores=processadores, taxa_wayback=args.taxa_wayback,
+                         limite_arquivo=limite_arquivo,
+                         proxies=carregar_proxies(args.proxies, args.proxies_arquivo),
+                         modo_captura=args.captura, inlinar_assets=args.inlinar_assets,
+                         deduplicar_assets=args.deduplicar_assets,
+                         orcamentos={"captura": args.orcamento_captura or None, "cpu": args.orcamento_cpu or None},
+                         carregamento=args.carregamento, fila_dono=identificar_dono() if args.fila else "",
+                         quase_duplicatas=args.quase_duplicatas or "",
+                         distancia_quase_duplicatas=args.distancia_quase_duplicatas,
+                         busca_texto=args.busca_texto, intervalos_artigos=args.intervalos_artigos)
+    enable_wal_mode(os.path.join(args.archivebox_dir, "index.sqlite3"))
+
+    # Origem da execução: o checkpoint só vale para a mesma lista, domínio e ordem
+    origem = {"url_list_file": str(Path(args.url_list_file).resolve()) if args.url_list_file else None,
+              "dominio": args.dominio, "ordem": args.ordem}
+    desligamento = Desligamento(args.archivebox_dir, prazo=args.prazo_desligamento)
+    fila = None
+    if args.fila:
+        # A fila do MongoDB decide o que falta: os ledgers locais não veem as outras máquinas
+        fila = cfg.fila()
+        if args.url_list_file or args.dominio:
+            inseridas = fila.enfileirar(ordenar_urls(obter_urls(args, cfg), args.ordem))
+            logging.info(f"{inseridas} URLs novas na fila.")
+        logging.info(f"Fila ({fila.dono}): {fila.resumo()}")
+        urls_to_process = fila.iniciar_heartbeat().urls(ate_ociosa=args.fila_sair_ociosa,
+                                                        parar=desligamento.solicitado)
+    else:
+        ja_processadas = Ledger(cfg.success_log).carregar()
+        urls_to_process = None if args.sem_checkpoint else desligamento.carregar_checkpoint(origem)
+        if urls_to_process is None:
+            urls = obter_urls(args, cfg)
+            if not urls:
+                logging.warning("Nenhuma URL encontrada para arquivar.")
+                return
+            urls_to_process = ordenar_urls(urls, args.ordem)
+        # O checkpoint já vem ordenado; os sucessos posteriores a ele também saem
+        urls_to_process = [url for url in urls_to_process if url not in ja_processadas]
+        logging.info(f"{len(ja_processadas)} URLs já processadas; {len(urls_to_process)} serão processadas.")
+        if not urls_to_process:
+            logging.info("Todas as URLs já foram processadas com sucesso.")
+            return
+
+    if args.metricas_porta:
+        METRICAS.servir(args.metricas_porta)
+
+    motor = criar_motor(args.engine, args.workers)
+    reaper = None
+    if not args.sem_limpeza:
+        reaper = ReaperSnapshots(Path(args.archivebox_dir) / "archive", error_log=cfg.error_log).iniciar()
+    cpu = None
+    if cfg.processadores and args.engine != "processes":
+        cpu = EstagioCPU(cfg.processadores, args.cpu_workers).iniciar()
+    cache = None
+    if args.cache_http:
+        cache = ProxyCache(args.cache_http, int(args.cache_http_gb * 1024 ** 3), pool=cfg.pool_proxies(),
+                           bloquear=cfg.estrategia_carregamento().bloquear)
+        cfg.cache_http = cache.iniciar()
+    desligamento.instalar()
+    concluido = False
+    try:
+        motor.executar(desligamento.entrada(urls_to_process), cfg, reaper, cpu)
+        concluido = not desligamento.solicitado.is_set()
+    finally:
+        desligamento.restaurar()
+        if fila is not None:
+            fila.liberar()
+        elif concluido:
+            desligamento.descartar_checkpoint()
+        else:
+            desligamento.salvar_checkpoint(origem, urls_to_process, Ledger(cfg.success_log).carregar())
+        if cache is not None:
+            cache.parar()
+        if cpu is not None:
+            cpu.parar()
+        if reaper is not None:
+            reaper.parar()
+        if args.url_list_file and Manifesto.eh_manifesto(args.url_list_file):
+            sincronizar_manifesto(args.url_list_file, cfg)
+        METRICAS.parar_servidor()
+        resumo = METRICAS.resumo()
+        pool = cfg.pool_proxies()
+        # Com processos e sem o cache, as estatísticas do pool ficam nos workers
+        if pool and (args.engine != "processes" or cache is not None):
+            resumo += f"\n\n{pool.resumo()}"
+        logging.info(f"\n{resumo}")
+        print(resumo)
+        parar_registro()
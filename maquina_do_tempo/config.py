@@ -0,0 +1,93 @@
+"""
+Configuração compartilhada do pacote. Tudo o que dependia da máquina (caminho
+do ArchiveBox, URI do MongoDB) pode ser sobrescrito por variável de ambiente
+ou pela linha de comando.
+"""
+import os
+import re
+from pathlib import Path
+
+# =============================
+# Configurações e Constantes
+# =============================
+ARCHIVEBOX_DIR = os.environ.get(
+    "ARCHIVEBOX_DIR",
+    str(Path.home() / "waybackmachine_maquina_do_tempo" / "archivebox" / "get"),
+)
+MONGODB_URI = os.environ.get("MONGODB_URI", "mongodb://127.0.0.1:27017")
+DATABASE_NAME = "archivebox_db"
+COLLECTION_NAME = "arquivos_da_home_obtidos_no_wayback_machine"
+# Assets embutidos deduplicados (um documento por SHA-256; ver assets.py)
+ASSETS_COLLECTION_NAME = "assets_embutidos"
+# Fila de trabalho compartilhada entre máquinas (fila_mongo.py)
+FILA_COLLECTION_NAME = "fila_capturas"
+
+WAYBACK_CDX_API = os.environ.get("WAYBACK_CDX_API", "http://web.archive.org/cdx/search/cdx")
+# Host que substitui web.archive.org na captura por HTTP e no cache (espelho; vazio = o próprio Wayback)
+WAYBACK_HTTP_BASE = os.environ.get("WAYBACK_HTTP_BASE", "")
+
+# Dispositivo gravado em cada documento (janela usada pelo Chrome do ArchiveBox)
+DEVICE = "--window-size=1280,720"
+
+# Arquivos de controle, relativos ao ARCHIVEBOX_DIR
+SUCCESS_LOG_NAME = "success_insertInto_mongo.txt"
+ERROR_LOG_NAME = "error_insertInto_mongo.txt"
+LOG_FILE_NAME = "archive_and_upload.log"
+URL_LIST_NAME = "urls_list_func_singlefile.txt"
+MANIFESTO_NAME = "capturas.manifesto"  # diretório do manifesto binário (manifesto.py)
+
+# Ordem das capturas na execução (agendamento.ORDENS): cobertura espalha o progresso pelo período
+ORDEM_CAPTURAS = os.environ.get("WAYBACK_ORDEM", "cobertura")
+
+# Workers padrão das engines com paralelismo (threads, processes, asyncio)
+MAX_WORKERS = 4
+
+# Tentativas quando o SQLite do ArchiveBox responde 'database is locked'
+RETRIES = 3
+RETRY_DELAY = 5  # segundos
+
+# Prazos por etapa (segundos; watchdog.py). A captura é morta no prazo e o DOM já salvo é
+# resgatado; o ArchiveBox recebe TIMEOUT = 75% do prazo para encerrar o extractor antes.
+ORCAMENTOS_ETAPAS = {
+    "captura": float(os.environ.get("ORCAMENTO_CAPTURA", 180)),
+    "cpu": float(os.environ.get("ORCAMENTO_CPU", 60)),
+}
+WATCHDOG_TOLERANCIA = 5  # segundos entre o SIGTERM e o SIGKILL da árvore de processos
+TIMEOUT_LOG_NAME = "timeouts.jsonl"
+
+# Limitador de requisições ao web.archive.org (requisições por segundo)
+WAYBACK_TAXA_INICIAL = float(os.environ.get("WAYBACK_TAXA", 1.0))
+WAYBACK_TAXA_MINIMA = 1 / 60
+WAYBACK_TAXA_MAXIMA = 4.0
+WAYBACK_INCREMENTO = 0.05   # aumento da taxa a cada sucesso
+WAYBACK_CAPACIDADE = 4      # rajada máxima
+# Arquivo SQLite para dividir o limite entre processos (vazio = limite por processo)
+WAYBACK_LIMITE_ARQUIVO = os.environ.get("WAYBACK_LIMITE_ARQUIVO", "")
+
+# Proxies das capturas: lista separada por vírgula, arquivo (um por linha) e/ou chave da ZenRows.
+# Nunca grave credenciais no código: use as variáveis de ambiente.
+WAYBACK_PROXIES = os.environ.get("WAYBACK_PROXIES", "")
+WAYBACK_PROXIES_ARQUIVO = os.environ.get("WAYBACK_PROXIES_ARQUIVO", "")
+ZENROWS_API_KEY = os.environ.get("ZENROWS_API_KEY", "")
+PROXY_EWMA_ALPHA = 0.3          # peso da observação mais recente
+PROXY_TAXA_FALHA_MAXIMA = 0.5   # acima disso o proxy é afastado
+PROXY_FATOR_LENTIDAO = 3.0      # afastado se a latência passar de 3x a mediana do pool
+PROXY_AFASTAMENTO = 30.0        # segundos do primeiro afastamento (dobra a cada bloqueio)
+
+# Cache em disco dos recursos do Wayback (cache_http.py); vazio = sem cache
+CACHE_HTTP_DIR = os.environ.get("CACHE_HTTP_DIR", "")
+
+# Estratégia de carregamento da página antes do SingleFile (carregamento.ESTRATEGIAS)
+CARREGAMENTO = os.environ.get("WAYBACK_CARREGAMENTO", "padrao")
+
+# Quase duplicatas (quase_duplicatas.py): "" desliga, "marcar" ou "pular" (grava sem o conteúdo nem os assets)
+QUASE_DUPLICATAS = os.environ.get("WAYBACK_QUASE_DUPLICATAS", "")
+
+# Índice de busca textual (busca_texto.py) alimentado na ingestão
+BUSCA_TEXTO = os.environ.get("WAYBACK_BUSCA_TEXTO", "") not in ("", "0")
+
+# Índice de intervalos das matérias na home (intervalos_artigos.py) alimentado na ingestão
+INTERVALOS_ARTIGOS = os.environ.get("WAYBACK_INTERVALOS_ARTIGOS", "") not in ("", "0")
+
+# Regex para extrair o caminho do snapshot da saída do 'archivebox add'
+ARCHIVE_PATH_REGEX = re.compile(r"> \./archive/([\w.]+)/?")
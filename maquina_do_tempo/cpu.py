@@ -0,0 +1,196 @@
+"""
+Etapa de pós-processamento de HTML em processos separados (fora do GIL).
+
+Os processadores recebem o HTML como buffer somente leitura (mmap do
+singlefile.html ou um bloco de memória compartilhada) e devolvem um dict
+pequeno, que é o único dado que volta do worker por pickle:
+
+    @registrar_processador("meu_campo")
+    def meu_campo(buf):
+        return {...}
+
+    with EstagioCPU(["sha256", "anuncios"]) as cpu:
+        resultado = cpu.submeter_arquivo(caminho).result()
+"""
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import resource_tracker, shared_memory
+
+from .ingestao import mapear_snapshot
+from .metricas import METRICAS
+from .quase_duplicatas import para_int64, simhash_html
+
+# Processadores disponíveis: nome -> função(buf) -> valor serializável
+PROCESSADORES = {}
+
+def registrar_processador(nome):
+    """Decorador que registra um processador de HTML pelo nome usado na CLI."""
+    def registrar(funcao):
+        PROCESSADORES[nome] = funcao
+        return funcao
+    return registrar
+
+def workers_padrao():
+    """Um worker por núcleo disponível, deixando um para o event loop/threads de captura."""
+    try:
+        nucleos = len(os.sched_getaffinity(0))
+    except AttributeError:
+        nucleos = os.cpu_count() or 1
+    return max(1, nucleos - 1)
+
+# =============================
+# Processadores embutidos
+# =============================
+GPT_SLOT_REGEX = re.compile(rb'id="(div-gpt-ad-[\w-]+)"')
+FORMATO_ANUNCIO_REGEX = re.compile(rb'box-advertising--(\d{3,4})\b')
+
+@registrar_processador("sha256")
+def sha256(buf):
+    return hashlib.sha256(buf).hexdigest()
+
+@registrar_processador("anuncios")
+def anuncios(buf):
+    """Slots do Google Publisher Tag e formatos (largura) dos blocos de publicidade da home."""
+    formatos = {}
+    for match in FORMATO_ANUNCIO_REGEX.finditer(buf):
+        largura = match.group(1).decode("ascii")
+        formatos[largura] = formatos.get(largura, 0) + 1
+    slots = sorted({m.group(1).decode("ascii") for m in GPT_SLOT_REGEX.finditer(buf)})
+    return {"slots_gpt": slots, "formatos": formatos}
+
+@registrar_processador("simhash")
+def simhash(buf):
+    """SimHash do texto visível e da estrutura (quase_duplicatas.py), como int64 para o BSON."""
+    return para_int64(simhash_html(buf))
+
+def executar_processadores(buf, nomes):
+    """Roda os processadores pedidos sobre o buffer. Erros de um processador não afetam os outros."""
+    resultado = {}
+    for nome in nomes:
+        try:
+            resultado[nome] = PROCESSADORES[nome](buf)
+        except Exception as e:
+            logging.error(f"Processador '{nome}' falhou: {e}")
+            resultado[nome] = None
+    return resultado
+
+def processar_arquivo(caminho, nomes):
+    """Executado no worker: mapeia o arquivo, sem que o conteúdo passe pelo pickle."""
+    with mapear_snapshot(caminho) as mapa:
+        return executar_processadores(mapa, nomes)
+
+def processar_memoria_compartilhada(nome_bloco, tamanho, nomes):
+    """Executado no worker: lê o HTML de um bloco de memória compartilhada criado pelo pai."""
+    try:
+        # O bloco pertence ao pai; o worker não deve registrá-lo para remoção
+        bloco = shared_memory.SharedMemory(name=nome_bloco, track=False)
+    except TypeError:  # Python < 3.13
+        bloco = shared_memory.SharedMemory(name=nome_bloco)
+        resource_tracker.unregister(bloco._name, "shared_memory")
+    try:
+        view = bloco.buf[:tamanho]
+        try:
+            return executar_processadores(view, nomes)
+        finally:
+            view.release()
+    finally:
+        bloco.close()
+
+class EstagioCPU:
+    """
+    Pool de processos para os processadores de HTML.
+
+    As capturas submetem direto na fila única de chamadas do ProcessPoolExecutor
+    e cada worker ocioso puxa a próxima tarefa, então um snapshot pesado não
+    segura os demais. Há no máximo 2 tarefas por worker em voo: acima disso
+    submeter_*() bloqueia quem submete (backpressure sobre a captura).
+    """
+    def __init__(self, processadores, workers=None):
+        desconhecidos = [nome for nome in processadores if nome not in PROCESSADORES]
+        if desconhecidos:
+            raise ValueError(
+                f"Processadores desconhecidos: {', '.join(desconhecidos)} (opções: {', '.join(PROCESSADORES)})"
+            )
+        self.processadores = list(processadores)
+        self.workers = workers or workers_padrao()
+        self._executor = None
+        self._lock = threading.Lock()
+        self._vagas = threading.BoundedSemaphore(self.workers * 2)
+        self.em_voo = 0
+        METRICAS.registrar_gauge("cpu_em_voo", lambda: self.em_voo)
+
+    # ---------- ciclo de vida ----------
+    def iniciar(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+                logging.info(f"Etapa de CPU com {self.workers} processos: {', '.join(self.processadores)}")
+        return self
+
+    def parar(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def __enter__(self):
+        return self.iniciar()
+
+    def __exit__(self, *exc):
+        self.parar()
+
+    # ---------- submissão ----------
+    def _submeter(self, funcao, *args):
+        self._vagas.acquire()
+        inicio = time.perf_counter()
+        try:
+            future = self.iniciar()._executor.submit(funcao, *args)
+        except Exception:
+            self._vagas.release()
+            raise
+        with self._lock:
+            self.em_voo += 1
+
+        # Medido do lado de quem submete: inclui o tempo na fila do pool
+        def registrar(f):
+            with self._lock:
+                self.em_voo -= 1
+            self._vagas.release()
+            METRICAS.observar("cpu", time.perf_counter() - inicio)
+            if f.cancelled():
+                METRICAS.falha("cpu", "CancelledError")
+            elif f.exception() is None:
+                METRICAS.sucesso("cpu")
+            else:
+                METRICAS.falha("cpu", f.exception())
+        future.add_done_callback(registrar)
+        return future
+
+    def submeter_arquivo(self, caminho):
+        """Agenda os processadores sobre um arquivo; devolve um Future com o dict de resultados."""
+        return self._submeter(processar_arquivo, str(caminho), self.processadores)
+
+    def submeter_buffer(self, dados):
+        """
+        Agenda os processadores sobre bytes já em memória, copiados uma vez para
+        memória compartilhada (em vez de serializados pelo pickle).
+        """
+        bloco = shared_memory.SharedMemory(create=True, size=max(1, len(dados)))
+        bloco.buf[:len(dados)] = dados
+        try:
+            future = self._submeter(processar_memoria_compartilhada, bloco.name, len(dados), self.processadores)
+        except Exception:
+            bloco.close()
+            bloco.unlink()
+            raise
+
+        def liberar(_):
+            bloco.close()
+            bloco.unlink()
+
+        future.add_done_callback(liberar)
+        return future
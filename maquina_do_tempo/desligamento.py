@@ -0,0 +1,304 @@
+"""
+Desligamento gracioso (SIGINT/SIGTERM) com checkpoint para retomar rápido.
+
+Matar os scripts getAll* no meio deixava snapshots pela metade, linhas de
+sucesso por gravar e, nas variantes com threads, Chromes órfãos. Aqui:
+
+- o primeiro sinal fecha a entrada: nenhuma URL nova sai para as engines
+  (todas consomem as URLs sob demanda) e as capturas em voo terminam;
+- se a drenagem passar do prazo (PRAZO_DRENAGEM), ou com um segundo sinal,
+  as árvores de processo das capturas em voo (archivebox, Chrome, node) são
+  mortas, os snapshots pela metade são apagados e nenhuma captura nova começa;
+- as capturas em voo ficam registradas em ARCHIVEBOX_DIR/.capturas_em_voo
+  (um arquivo por grupo de processos, com o pid do processo principal da
+  execução dona), o que vale também para os workers da engine de processos e
+  para os órfãos de uma execução morta com SIGKILL, mortos na próxima
+  partida; as capturas de outra execução viva no mesmo diretório não são
+  tocadas;
+- ao sair, o checkpoint guarda a lista ordenada do que falta: a próxima
+  partida com a mesma origem retoma dele, sem consultar o CDX de novo nem
+  reordenar milhões de URLs.
+
+Os ledgers e o MongoDB são gravados a cada URL; a drenagem termina com o
+fechamento normal dos pipelines (clients do MongoDB, fila do registro).
+
+    desligamento = Desligamento(ARCHIVEBOX_DIR).instalar()
+    motor.executar(desligamento.entrada(urls), cfg)
+    desligamento.salvar_checkpoint(origem, urls, sucessos)
+"""
+import json
+import logging
+import os
+import shutil
+import signal
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from . import config
+from .metricas import METRICAS
+
+# =============================
+# Configurações e Constantes
+# =============================
+PRAZO_DRENAGEM = float(os.environ.get("DESLIGAMENTO_PRAZO", 120))  # segundos para as capturas em voo terminarem
+CHECKPOINT_NAME = "checkpoint.json"
+CHECKPOINT_URLS_NAME = "checkpoint_restantes.txt"
+PROCESSOS_DIR_NAME = ".capturas_em_voo"
+ABORTAR_NAME = "ABORTAR"  # marcador: nenhuma captura nova começa (vale entre processos)
+DONO_ENV = "MAQUINA_DO_TEMPO_DONO"  # pid do processo principal; herdado pelos workers da engine de processos
+
+class CapturaInterrompida(Exception):
+    """A captura não começou (ou foi morta) porque o desligamento foi abortado."""
+
+def _gravar_atomico(caminho, conteudo):
+    caminho = Path(caminho)
+    fd, temporario = tempfile.mkstemp(dir=caminho.parent, prefix=f".{caminho.name}.")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(conteudo)
+    os.replace(temporario, caminho)
+
+def _comando(pid):
+    try:
+        return Path(f"/proc/{pid}/cmdline").read_bytes().replace(b"\0", b" ").decode(errors="replace")
+    except OSError:
+        return None
+
+def _dono():
+    """Pid da execução a que este processo pertence (o principal, também nos workers)."""
+    return int(os.environ.get(DONO_ENV) or os.getpid())
+
+def _vivo(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+class RegistroProcessos:
+    """
+    Grupos de processos das capturas em voo, um arquivo por pid em
+    'diretorio' com o dono (pid do processo principal da execução). Baseado
+    em arquivos para valer entre os workers da engine de processos e entre
+    execuções; matar() e limpar_orfaos() só tocam nas entradas desta execução
+    ou de execuções mortas.
+    """
+    def __init__(self, diretorio):
+        self.diretorio = Path(diretorio)
+
+    def adicionar(self, pid, url=None):
+        self.diretorio.mkdir(parents=True, exist_ok=True)
+        (self.diretorio / str(pid)).write_text(json.dumps({"url": url, "inicio": time.time(), "dono": _dono()}),
+                                               encoding="utf-8")
+
+    def remover(self, pid):
+        try:
+            (self.diretorio / str(pid)).unlink()
+        except FileNotFoundError:
+            pass
+
+    def ativos(self):
+        if not self.diretorio.exists():
+            return []
+        return [int(caminho.name) for caminho in self.diretorio.iterdir() if caminho.name.isdigit()]
+
+    def dono(self, pid):
+        """Dono da entrada 'pid' (None se ela sumiu ou é de uma versão sem dono)."""
+        try:
+            return json.loads((self.diretorio / str(pid)).read_text(encoding="utf-8")).get("dono")
+        except (OSError, ValueError):
+            return None
+
+    def _nossos(self):
+        """Entradas desta execução ou de um dono que já morreu (as de outra execução viva ficam)."""
+        atual = _dono()
+        return [pid for pid in self.ativos() if (dono := self.dono(pid)) is None or dono == atual or not _vivo(dono)]
+
+    def abortado(self):
+        return (self.diretorio / ABORTAR_NAME).exists()
+
+    def abortar(self):
+        self.diretorio.mkdir(parents=True, exist_ok=True)
+        (self.diretorio / ABORTAR_NAME).touch()
+
+    def desmarcar(self):
+        try:
+            (self.diretorio / ABORTAR_NAME).unlink()
+        except FileNotFoundError:
+            pass
+
+    def matar(self, sinal=signal.SIGTERM):
+        """Envia 'sinal' aos grupos registrados por esta execução (ou órfãos). Devolve quantos ainda existiam."""
+        mortos = 0
+        for pid in self._nossos():
+            try:
+                os.killpg(pid, sinal)
+                mortos += 1
+            except ProcessLookupError:
+                self.remover(pid)
+            except PermissionError:
+                pass
+        return mortos
+
+    def limpar_orfaos(self):
+        """
+        Na partida: mata os grupos que sobraram de uma execução morta (só se o
+        processo ainda for do archivebox; o pid pode ter sido reutilizado) e
+        limpa o registro. As entradas de outra execução viva no mesmo
+        diretório ficam. Devolve quantos foram mortos.
+        """
+        mortos = 0
+        for pid in self._nossos():
+            comando = _comando(pid)
+            if comando is not None and "archivebox" in comando:
+                try:
+                    os.killpg(pid, signal.SIGKILL)
+                    mortos += 1
+                except (ProcessLookupError, PermissionError):
+                    pass
+            self.remover(pid)
+        self.desmarcar()
+        if mortos:
+            logging.warning(f"{mortos} capturas órfãs de uma execução anterior foram mortas.")
+        return mortos
+
+def registro_processos(archivebox_dir):
+    return RegistroProcessos(Path(archivebox_dir) / PROCESSOS_DIR_NAME)
+
+def apagar_snapshot_parcial(stdout, archivebox_dir):
+    """Apaga o diretório do snapshot de uma captura morta no meio (se a saída chegou a indicá-lo)."""
+    match = config.ARCHIVE_PATH_REGEX.search(stdout or "")
+    if not match:
+        return None
+    snapshot_dir = Path(archivebox_dir) / "archive" / match.group(1)
+    shutil.rmtree(snapshot_dir, ignore_errors=True)
+    return snapshot_dir
+
+class Desligamento:
+    """
+    Coordena o desligamento do processo principal. instalar() troca os
+    handlers de SIGINT/SIGTERM (só na thread principal); restaurar() devolve
+    os anteriores.
+    """
+    def __init__(self, archivebox_dir, prazo=PRAZO_DRENAGEM, tolerancia=config.WATCHDOG_TOLERANCIA):
+        self.archivebox_dir = Path(archivebox_dir)
+        self.prazo = prazo
+        self.tolerancia = tolerancia
+        self.processos = registro_processos(archivebox_dir)
+        self.solicitado = threading.Event()
+        self.abortado = False
+        self.motivo = None
+        self._anteriores = {}
+        self._timer = None
+
+    # -----------------------------
+    # Sinais
+    # -----------------------------
+    def instalar(self):
+        # Dono das capturas registradas daqui em diante, inclusive pelos workers (herdam o ambiente)
+        os.environ[DONO_ENV] = str(os.getpid())
+        self.processos.limpar_orfaos()
+        for sinal in (signal.SIGINT, signal.SIGTERM):
+            self._anteriores[sinal] = signal.signal(sinal, self._ao_sinal)
+        return self
+
+    def restaurar(self):
+        for sinal, anterior in self._anteriores.items():
+            signal.signal(sinal, anterior)
+        self._anteriores = {}
+        if self._timer is not None:
+            self._timer.cancel()
+        self.processos.desmarcar()
+
+    def _ao_sinal(self, signum, frame):
+        nome = signal.Signals(signum).name
+        if not self.solicitado.is_set():
+            self.solicitar(nome)
+        elif not self.abortado:
+            logging.warning(f"{nome} de novo: abortando as capturas em voo.")
+            self.abortar()
+        elif signum == signal.SIGINT:
+            raise KeyboardInterrupt
+
+    def solicitar(self, motivo="pedido"):
+        """Fecha a entrada de URLs; as capturas em voo têm 'prazo' segundos para terminar."""
+        self.motivo = motivo
+        self.solicitado.set()
+        METRICAS.contar("desligamentos_total", motivo=motivo)
+        logging.warning(f"{motivo}: sem novas capturas; aguardando as em voo por até {self.prazo:.0f} s "
+                        "(repita o sinal para abortar).")
+        if self.prazo is not None:
+            self._timer = threading.Timer(self.prazo, self.abortar)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def abortar(self):
+        """Mata as árvores de processo das capturas em voo (SIGTERM e, após a tolerância, SIGKILL)."""
+        if self.abortado:
+            return
+        self.abortado = True
+        self.processos.abortar()
+        em_voo = self.processos.matar(signal.SIGTERM)
+        logging.warning(f"Desligamento abortado: {em_voo} capturas em voo interrompidas.")
+        if em_voo:
+            timer = threading.Timer(self.tolerancia, self.processos.matar, args=(signal.SIGKILL,))
+            timer.daemon = True
+            timer.start()
+
+    def entrada(self, urls):
+        """Gerador sobre 'urls' que para de entregar assim que o desligamento é pedido."""
+        for url in urls:
+            if self.solicitado.is_set():
+                return
+            yield url
+
+    # -----------------------------
+    # Checkpoint
+    # -----------------------------
+    @property
+    def caminho_checkpoint(self):
+        return self.archivebox_dir / CHECKPOINT_NAME
+
+    def salvar_checkpoint(self, origem, urls, sucessos):
+        """Grava as URLs de 'urls' (na ordem) que não estão em 'sucessos' e a origem da execução."""
+        restantes = [url for url in urls if url not in sucessos]
+        _gravar_atomico(self.archivebox_dir / CHECKPOINT_URLS_NAME, "".join(f"{url}\n" for url in restantes))
+        _gravar_atomico(self.caminho_checkpoint, json.dumps({
+            "quando": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "motivo": self.motivo,
+            "abortado": self.abortado,
+            "origem": origem,
+            "restantes": len(restantes),
+            "arquivo": CHECKPOINT_URLS_NAME,
+        }, ensure_ascii=False, indent=2))
+        logging.info(f"Checkpoint gravado: {len(restantes)} URLs restantes em {CHECKPOINT_URLS_NAME}.")
+        return len(restantes)
+
+    def carregar_checkpoint(self, origem):
+        """URLs restantes do checkpoint se ele for da mesma origem, senão None."""
+        try:
+            dados = json.loads(self.caminho_checkpoint.read_text(encoding="utf-8"))
+        except (FileNotFoundError, ValueError):
+            return None
+        if dados.get("origem") != origem:
+            logging.info("Checkpoint de outra origem ignorado.")
+            return None
+        caminho = self.archivebox_dir / dados.get("arquivo", CHECKPOINT_URLS_NAME)
+        try:
+            with open(caminho, "r", encoding="utf-8") as f:
+                urls = [linha.strip() for linha in f if linha.strip()]
+        except FileNotFoundError:
+            return None
+        logging.info(f"Retomando do checkpoint de {dados.get('quando')}: {len(urls)} URLs restantes.")
+        return urls
+
+    def descartar_checkpoint(self):
+        for nome in (CHECKPOINT_NAME, CHECKPOINT_URLS_NAME):
+            try:
+                (self.archivebox_dir / nome).unlink()
+            except FileNotFoundError:
+                pass
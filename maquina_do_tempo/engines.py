@@ -0,0 +1,179 @@
+"""
+Estratégias de execução do pipeline. Todas recebem a mesma lista de URLs e o
+mesmo ConfigPipeline e rodam as mesmas etapas (estagios.Pipeline); mudam só a
+forma de distribuir o trabalho:
+
+    sequential  uma URL por vez
+    threads     ThreadPoolExecutor com um client do MongoDB compartilhado
+    processes   ProcessPoolExecutor, um Pipeline (e um client) por processo
+    asyncio     create_subprocess_exec + driver assíncrono do MongoDB
+"""
+import asyncio
+import logging
+import signal
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+from .config import MAX_WORKERS
+from .limitador import redefinir_limitadores
+from .metricas import METRICAS
+
+class MotorSequencial:
+    nome = "sequential"
+
+    def __init__(self, workers=1):
+        self.workers = 1
+
+    def executar(self, urls, cfg, reaper=None, cpu=None):
+        pipeline = cfg.criar(reaper, cpu)
+        try:
+            # Com um gerador (fila do MongoDB) o total não é conhecido: o gauge fica em 0
+            pendentes = len(urls) if hasattr(urls, "__len__") else 0
+            METRICAS.registrar_gauge("urls_pendentes", lambda: pendentes)
+            for url in urls:
+                pipeline.processar(url)
+                pendentes = max(pendentes - 1, 0)
+        finally:
+            pipeline.fechar()
+
+class MotorThreads:
+    nome = "threads"
+
+    def __init__(self, workers=MAX_WORKERS):
+        self.workers = workers
+
+    def executar(self, urls, cfg, reaper=None, cpu=None):
+        # O MongoClient é thread-safe: um único client para todas as threads
+        pipeline = cfg.criar(reaper, cpu)
+        # 'urls' pode ser um gerador (fila do MongoDB): no máximo 2 URLs por thread em voo
+        restantes = iter(urls)
+        em_voo = {}
+        METRICAS.registrar_gauge("urls_pendentes", lambda: len(em_voo))
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                while True:
+                    while len(em_voo) < self.workers * 2:
+                        url = next(restantes, None)
+                        if url is None:
+                            break
+                        em_voo[executor.submit(pipeline.processar, url)] = url
+                    if not em_voo:
+                        break
+
+                    prontos, _ = wait(em_voo, return_when=FIRST_COMPLETED)
+                    for future in prontos:
+                        url = em_voo.pop(future)
+                        try:
+                            future.result()
+                        except Exception as e:
+                            logging.error(f"Erro processando {url}: {e}")
+        finally:
+            pipeline.fechar()
+
+# Pipeline do processo worker, montado uma vez pelo initializer
+_PIPELINE_PROCESSO = None
+
+def _iniciar_processo(cfg):
+    global _PIPELINE_PROCESSO
+    # Ctrl-C chega a todo o grupo do terminal: quem coordena o desligamento é o processo principal
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # Com fork o worker herda as métricas do pai; descarta para não contar duas vezes
+    METRICAS.estado(zerar=True)
+    # Nem os limitadores (e a conexão SQLite do compartilhado) criados no pai antes do fork
+    redefinir_limitadores()
+    _PIPELINE_PROCESSO = cfg.criar()
+
+def _processar_em_processo(url):
+    snapshot_dir = _PIPELINE_PROCESSO.processar(url)
+    # As métricas do worker voltam para o processo principal junto com o resultado
+    return snapshot_dir, METRICAS.estado(zerar=True)
+
+class MotorProcessos:
+    """
+    Um Pipeline por processo. A limpeza e o backpressure ficam no processo
+    principal: os workers devolvem o diretório do snapshot, e novas URLs só são
+    enviadas quando há espaço em disco (no máximo 2 por worker em voo). Os
+    workers já são processos, então os processadores de HTML rodam neles
+    mesmos e o 'cpu' é ignorado.
+    """
+    nome = "processes"
+
+    def __init__(self, workers=MAX_WORKERS):
+        self.workers = workers
+
+    def executar(self, urls, cfg, reaper=None, cpu=None):
+        restantes = iter(urls)
+        em_voo = {}
+        METRICAS.registrar_gauge("urls_pendentes", lambda: len(em_voo))
+        with ProcessPoolExecutor(max_workers=self.workers, initializer=_iniciar_processo,
+                                 initargs=(cfg,)) as executor:
+            while True:
+                while len(em_voo) < self.workers * 2:
+                    url = next(restantes, None)
+                    if url is None:
+                        break
+                    if reaper is not None:
+                        reaper.aguardar_espaco()
+                    em_voo[executor.submit(_processar_em_processo, url)] = url
+                if not em_voo:
+                    break
+
+                prontos, _ = wait(em_voo, return_when=FIRST_COMPLETED)
+                for future in prontos:
+                    url = em_voo.pop(future)
+                    try:
+                        snapshot_dir, estado = future.result()
+                    except Exception as e:
+                        METRICAS.falha("pipeline", e)
+                        logging.error(f"Erro processando {url}: {e}")
+                        continue
+                    METRICAS.mesclar(estado)
+                    if snapshot_dir is not None and reaper is not None:
+                        reaper.agendar(snapshot_dir)
+
+class MotorAsyncio:
+    nome = "asyncio"
+
+    def __init__(self, workers=MAX_WORKERS):
+        self.workers = workers
+
+    async def _executar(self, urls, cfg, reaper, cpu):
+        pipeline = cfg.criar_async(reaper, cpu)
+        # 'workers' tarefas puxando do mesmo iterador: 'urls' pode ser um gerador bloqueante (fila do MongoDB)
+        restantes = iter(urls)
+        trava = asyncio.Lock()
+        em_voo = 0
+        METRICAS.registrar_gauge("capturas_em_voo", lambda: em_voo)
+
+        async def proxima():
+            async with trava:
+                return await asyncio.to_thread(next, restantes, None)
+
+        async def trabalhador():
+            nonlocal em_voo
+            while (url := await proxima()) is not None:
+                em_voo += 1
+                try:
+                    await pipeline.processar_async(url)
+                finally:
+                    em_voo -= 1
+
+        try:
+            await asyncio.gather(*(trabalhador() for _ in range(self.workers)))
+        finally:
+            fechar = pipeline.fechar()
+            if fechar is not None:
+                await fechar
+
+    def executar(self, urls, cfg, reaper=None, cpu=None):
+        asyncio.run(self._executar(urls, cfg, reaper, cpu))
+
+ENGINES = {
+    motor.nome: motor
+    for motor in (MotorSequencial, MotorThreads, MotorProcessos, MotorAsyncio)
+}
+
+def criar_motor(nome, workers=MAX_WORKERS):
+    try:
+        return ENGINES[nome](workers)
+    except KeyError:
+        raise ValueError(f"Engine desconhecida: {nome} (opções: {', '.join(ENGINES)})") from None
@@ -0,0 +1,703 @@
+"""
+Etapas do pipeline, compartilhadas por todas as engines:
+
+    captura (archivebox add, ou HTTP 'if_' com fallback) -> leitura do singlefile.html
+        -> documento (com os assets separados, opcional) -> insert no MongoDB
+
+Cada engine (engines.py) só decide COMO as URLs são distribuídas; o que
+acontece com cada URL está aqui, em Pipeline.processar / processar_async.
+"""
+import asyncio
+import logging
+import signal
+import subprocess
+import threading
+import time
+from concurrent.futures import TimeoutError as FuturoTimeout
+from pathlib import Path
+
+from . import config
+from .assets import ArmazemAssets, montar_documento_deduplicado
+from .banco import conectar_banco_async, conectarBanco, obter_colecao
+from .captura_http import CapturadorHTTP, ErroCapturaHTTP
+from .carregamento import obter_estrategia
+from .busca_texto import BUSCA_NAME, IndiceTexto
+from .cpu import processar_arquivo
+from .desligamento import CapturaInterrompida, registro_processos
+from .fila_mongo import abrir_fila
+from .intervalos_artigos import INTERVALOS_NAME, IndiceIntervalos
+from .limitador import indica_limitacao, obter_limitador
+from .ingestao import COMPACTAR, VALIDAR_UTF8, ArquivosDaHomeWaybackMachineModel, carregar_conteudo
+from .metricas import METRICAS
+from .proxies import PoolProxies, carregar_proxies, obter_pool
+from .quase_duplicatas import DISTANCIA_PADRAO, IndiceQuaseDuplicatas
+from .quase_duplicatas import INDICE_NAME as QUASE_DUPLICATAS_INDICE
+from .watchdog import PrazoEsgotado, Watchdog
+from .wayback import extract_wayback_timestamp_substring, timestamp_para_datetime, url_original
+
+class ErroCaptura(Exception):
+    """Falha do processo de captura (código de saída diferente de zero)."""
+    def __init__(self, returncode, stderr):
+        super().__init__(f"código de saída {returncode}: {stderr}")
+        self.returncode = returncode
+        self.stderr = stderr
+
+def _banco_travado(stderr):
+    return "database is locked" in (stderr or "").lower()
+
+class Ledger:
+    """Arquivo texto de uma linha por registro (success/error), seguro entre threads."""
+    def __init__(self, caminho):
+        self.caminho = Path(caminho)
+        self._lock = threading.Lock()
+
+    def registrar(self, linha):
+        with self._lock:
+            with open(self.caminho, "a", encoding="utf-8") as f:
+                f.write(f"{linha}\n")
+
+    def carregar(self):
+        if not self.caminho.exists():
+            return set()
+        with open(self.caminho, "r", encoding="utf-8") as f:
+            return {line.strip() for line in f if line.strip()}
+
+# =============================
+# Captura
+# =============================
+def _proxy_bloqueado(stderr):
+    """429/503 ou 403 na saída da captura: com proxy, o bloqueio é do IP do proxy."""
+    texto = (stderr or "").lower()
+    return indica_limitacao(texto) or "http error 403" in texto or "403 forbidden" in texto
+
+def _tratar_falha(url, e, tentativa, retries, delay, limitador, pool, proxy, retry_after=None):
+    """
+    Registra a falha no pool de proxies e decide a próxima tentativa. Devolve
+    a espera (segundos) antes de repetir ou None se o erro deve subir.
+    """
+    bloqueado = proxy is not None and _proxy_bloqueado(e.stderr)
+    if pool is not None:
+        pool.registrar(proxy, False, bloqueado=bloqueado)
+    if tentativa >= retries:
+        return None
+    if _banco_travado(e.stderr):
+        METRICAS.retry("captura", "database_locked")
+        logging.warning(f"Banco travado ao capturar {url}; tentativa {tentativa}/{retries}.")
+        return delay
+    if bloqueado and len(pool) > 1:
+        # Outro proxy (outro IP) pode passar: repete sem frear o limitador global
+        METRICAS.retry("captura", "proxy_bloqueado")
+        return 0
+    if limitador is not None and indica_limitacao(e.stderr):
+        limitador.penalizar(retry_after)
+        return 0
+    return None
+
+def capturar(url, archivebox_dir, retries=config.RETRIES, delay=config.RETRY_DELAY, limitador=None, pool=None,
+             env=None, watchdog=None):
+    """
+    Roda 'archivebox add <url>' e devolve o diretório do snapshot (ou None se a
+    saída não indicar um). Repete em 'database is locked' e, com 'limitador',
+    em 429/503 do Wayback; demais erros viram ErroCaptura. Com 'pool'
+    (PoolProxies), cada tentativa sai por um proxy do pool. 'env' é o ambiente
+    do subprocesso (estratégia de carregamento, WAYBACK_PROXY do cache HTTP). Com
+    'watchdog', a captura tem prazo e, se ele esgotar, o DOM já salvo é resgatado.
+    """
+    cmd = ["archivebox", "add", url]
+    for tentativa in range(1, retries + 1):
+        if limitador is not None:
+            limitador.adquirir()
+        proxy = pool.escolher() if pool is not None else None
+        inicio = time.monotonic()
+        try:
+            ambiente = PoolProxies.ambiente(proxy, env) if pool is not None else env
+            with METRICAS.tempo("captura"):
+                if watchdog is not None:
+                    result = watchdog.executar(cmd, "captura", cwd=archivebox_dir, env=ambiente)
+                else:
+                    result = subprocess.run(cmd, cwd=archivebox_dir, capture_output=True, text=True, check=True,
+                                            env=ambiente)
+            break
+        except subprocess.CalledProcessError as e:
+            espera = _tratar_falha(url, e, tentativa, retries, delay, limitador, pool, proxy)
+            if espera is None:
+                raise ErroCaptura(e.returncode, e.stderr) from e
+            time.sleep(espera)
+        except PrazoEsgotado as e:
+            # Página lenta: repetir prenderia o worker de novo
+            return _resgatar(url, e, archivebox_dir, watchdog, pool, proxy)
+        except BaseException:
+            # Interrupção ou erro local (ex. archivebox ausente): o proxy não tem culpa, só volta ao pool
+            if pool is not None:
+                pool.devolver(proxy)
+            raise
+
+    if pool is not None:
+        pool.registrar(proxy, True, time.monotonic() - inicio)
+    if limitador is not None:
+        limitador.registrar_sucesso()
+    logging.debug("Saída do ArchiveBox", extra={"url": url, "stdout": result.stdout})
+    match = config.ARCHIVE_PATH_REGEX.search(result.stdout)
+    if not match:
+        return None
+    return Path(archivebox_dir) / "archive" / match.group(1)
+
+def _resgatar(url, erro, archivebox_dir, watchdog, pool, proxy):
+    if pool is not None:
+        pool.registrar(proxy, False)
+    snapshot_dir = watchdog.resgatar(url, erro, archivebox_dir)
+    if snapshot_dir is None:
+        raise ErroCaptura(-signal.SIGKILL, f"{erro} sem DOM para resgatar; stderr: {erro.stderr[-500:]}") from erro
+    return snapshot_dir
+
+async def executar_processo(cmd, cwd=None, env=None):
+    """
+    Executa um comando sem bloquear o event loop e devolve o stdout decodificado.
+    Lança ErroCaptura se o processo terminar com erro.
+    """
+    proc = await asyncio.create_subprocess_exec(
+        *cmd,
+        cwd=cwd,
+        env=env,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    stdout, stderr = await proc.communicate()
+    if proc.returncode != 0:
+        raise ErroCaptura(proc.returncode, stderr.decode("utf-8", errors="replace"))
+    return stdout.decode("utf-8", errors="replace")
+
+async def capturar_async(url, archivebox_dir, retries=config.RETRIES, delay=config.RETRY_DELAY, limitador=None,
+                         pool=None, env=None, watchdog=None):
+    """Versão assíncrona de capturar()."""
+    cmd = ["archivebox", "add", url]
+    for tentativa in range(1, retries + 1):
+        if limitador is not None:
+            await limitador.adquirir_async()
+        proxy = pool.escolher() if pool is not None else None
+        inicio = time.monotonic()
+        try:
+            ambiente = PoolProxies.ambiente(proxy, env) if pool is not None else env
+            with METRICAS.tempo("captura"):
+                if watchdog is not None:
+                    try:
+                        output = (await watchdog.executar_async(cmd, "captura", cwd=archivebox_dir,
+                                                                env=ambiente)).stdout
+                    except subprocess.CalledProcessError as e:
+                        raise ErroCaptura(e.returncode, e.stderr) from e
+                else:
+                    output = await executar_processo(cmd, cwd=archivebox_dir, env=ambiente)
+            break
+        except ErroCaptura as e:
+            espera = _tratar_falha(url, e, tentativa, retries, delay, limitador, pool, proxy)
+            if espera is None:
+                raise
+            await asyncio.sleep(espera)
+        except PrazoEsgotado as e:
+            return await asyncio.to_thread(_resgatar, url, e, archivebox_dir, watchdog, pool, proxy)
+        except BaseException:
+            if pool is not None:
+                pool.devolver(proxy)
+            raise
+
+    if pool is not None:
+        pool.registrar(proxy, True, time.monotonic() - inicio)
+    if limitador is not None:
+        limitador.registrar_sucesso()
+    logging.debug("Saída do ArchiveBox", extra={"url": url, "stdout": output})
+    match = config.ARCHIVE_PATH_REGEX.search(output)
+    if not match:
+        return None
+    return Path(archivebox_dir) / "archive" / match.group(1)
+
+def capturar_http(url, capturador, retries=config.RETRIES, delay=config.RETRY_DELAY, limitador=None, pool=None):
+    """
+    Captura 'url' com o CapturadorHTTP (HTML 'if_' sem navegador), com os mesmos
+    retries, limitador e proxies de capturar(). Lança ErroCapturaHTTP se falhar.
+    """
+    for tentativa in range(1, retries + 1):
+        if limitador is not None:
+            limitador.adquirir()
+        proxy = pool.escolher() if pool is not None else None
+        inicio = time.monotonic()
+        try:
+            with METRICAS.tempo("captura_http"):
+                snapshot_dir = capturador.buscar(url, proxy, limitador)
+            break
+        except ErroCapturaHTTP as e:
+            espera = _tratar_falha(url, e, tentativa, retries, delay, limitador, pool, proxy, e.retry_after)
+            if espera is None:
+                raise
+            time.sleep(espera)
+        except BaseException:
+            if pool is not None:
+                pool.devolver(proxy)
+            raise
+
+    if pool is not None:
+        pool.registrar(proxy, True, time.monotonic() - inicio)
+    if limitador is not None:
+        limitador.registrar_sucesso()
+    return snapshot_dir
+
+async def capturar_http_async(url, capturador, retries=config.RETRIES, delay=config.RETRY_DELAY, limitador=None,
+                              pool=None):
+    """Versão assíncrona de capturar_http()."""
+    for tentativa in range(1, retries + 1):
+        if limitador is not None:
+            await limitador.adquirir_async()
+        proxy = pool.escolher() if pool is not None else None
+        inicio = time.monotonic()
+        try:
+            with METRICAS.tempo("captura_http"):
+                snapshot_dir = await capturador.buscar_async(url, proxy, limitador)
+            break
+        except ErroCapturaHTTP as e:
+            espera = _tratar_falha(url, e, tentativa, retries, delay, limitador, pool, proxy, e.retry_after)
+            if espera is None:
+                raise
+            await asyncio.sleep(espera)
+        except BaseException:
+            if pool is not None:
+                pool.devolver(proxy)
+            raise
+
+    if pool is not None:
+        pool.registrar(proxy, True, time.monotonic() - inicio)
+    if limitador is not None:
+        limitador.registrar_sucesso()
+    return snapshot_dir
+
+# =============================
+# Leitura e documento
+# =============================
+def montar_documento(snapshot_dir, timestamp_str, compactar_conteudo=COMPACTAR, validar=VALIDAR_UTF8):
+    """Lê o singlefile.html do snapshot e devolve o documento pronto para o insert."""
+    singlefile_html = Path(snapshot_dir) / "singlefile.html"
+    if not singlefile_html.exists():
+        raise FileNotFoundError(f"Arquivo singlefile.html não encontrado em {snapshot_dir}")
+
+    with METRICAS.tempo("leitura"):
+        content, content_encoding = carregar_conteudo(singlefile_html, compactar_conteudo, validar)
+
+    with METRICAS.tempo("codificacao"):
+        return ArquivosDaHomeWaybackMachineModel(
+            device=config.DEVICE,
+            content=content,
+            timestamp=timestamp_para_datetime(timestamp_str),
+            isAdvertisingModified=False,
+            advertising_id_when_isModified=None,
+            content_encoding=content_encoding,
+        ).to_dict()
+
+# =============================
+# Pipeline
+# =============================
+class ConfigPipeline:
+    """
+    Parâmetros para montar um Pipeline. É picklable, para que a engine de
+    processos monte um Pipeline (com o próprio client do MongoDB) em cada worker.
+    """
+    def __init__(self, archivebox_dir=config.ARCHIVEBOX_DIR, mongodb_uri=config.MONGODB_URI,
+                 database=config.DATABASE_NAME, collection=config.COLLECTION_NAME,
+                 compactar_conteudo=COMPACTAR, validar=VALIDAR_UTF8, processadores=(),
+                 taxa_wayback=config.WAYBACK_TAXA_INICIAL, limite_arquivo=config.WAYBACK_LIMITE_ARQUIVO,
+                 proxies=None, modo_captura="archivebox", inlinar_assets=False, deduplicar_assets=False,
+                 colecao_assets=config.ASSETS_COLLECTION_NAME, cache_http="", orcamentos=None,
+                 carregamento=config.CARREGAMENTO, fila_dono="", quase_duplicatas=config.QUASE_DUPLICATAS,
+                 distancia_quase_duplicatas=DISTANCIA_PADRAO, busca_texto=config.BUSCA_TEXTO,
+                 intervalos_artigos=config.INTERVALOS_ARTIGOS):
+        self.archivebox_dir = str(archivebox_dir)
+        self.mongodb_uri = mongodb_uri
+        self.database = database
+        self.collection = collection
+        self.compactar_conteudo = compactar_conteudo
+        self.validar = validar
+        # Processadores de HTML (cpu.PROCESSADORES) cujo resultado vai em documento["analise"]
+        self.processadores = list(processadores)
+        # Token bucket das requisições ao Wayback (taxa 0 desliga); com arquivo, dividido entre processos
+        self.taxa_wayback = taxa_wayback
+        self.limite_arquivo = str(limite_arquivo) if limite_arquivo else ""
+        # URLs dos proxies das capturas (padrão: WAYBACK_PROXIES/WAYBACK_PROXIES_ARQUIVO/ZENROWS_API_KEY)
+        self.proxies = carregar_proxies() if proxies is None else list(proxies)
+        # "archivebox" (SingleFile/Chrome) ou "http" (HTML 'if_' sem navegador, com fallback para o archivebox)
+        self.modo_captura = modo_captura
+        self.inlinar_assets = inlinar_assets
+        # Assets embutidos (data URIs, <style>, <script>) gravados uma vez na coleção de assets (assets.py)
+        self.deduplicar_assets = deduplicar_assets
+        self.colecao_assets = colecao_assets
+        # URL do proxy com cache (cache_http.ProxyCache); com ele, os proxies do pool ficam atrás do cache
+        self.cache_http = cache_http
+        # Prazos por etapa em segundos (watchdog.py); None = config.ORCAMENTOS_ETAPAS
+        self.orcamentos = dict(config.ORCAMENTOS_ETAPAS if orcamentos is None else orcamentos)
+        # Nome da estratégia de carregamento da página no SingleFile (carregamento.ESTRATEGIAS)
+        self.carregamento = carregamento
+        # Dono das leases da fila do MongoDB (fila_mongo.py); vazio = sem fila, só os ledgers
+        self.fila_dono = fila_dono
+        # Quase duplicatas: "" desliga, "marcar" ou "pular"; usa o processador "simhash"
+        self.quase_duplicatas = quase_duplicatas
+        self.distancia_quase_duplicatas = distancia_quase_duplicatas
+        if quase_duplicatas and "simhash" not in self.processadores:
+            self.processadores.append("simhash")
+        # Texto visível de cada captura no índice FTS5 (busca_texto.py)
+        self.busca_texto = busca_texto
+        # Links de matéria de cada captura no índice de intervalos (intervalos_artigos.py)
+        self.intervalos_artigos = intervalos_artigos
+
+    def limitador(self):
+        if not self.taxa_wayback:
+            return None
+        return obter_limitador(self.limite_arquivo or None, self.taxa_wayback)
+
+    def pool_proxies(self):
+        return obter_pool(self.proxies) if self.proxies else None
+
+    def watchdog(self):
+        return Watchdog(self.orcamentos, registro=Path(self.archivebox_dir) / config.TIMEOUT_LOG_NAME,
+                        processos=registro_processos(self.archivebox_dir))
+
+    def estrategia_carregamento(self):
+        return obter_estrategia(self.carregamento)
+
+    def ambiente_captura(self):
+        """Ambiente do 'archivebox add': estratégia de carregamento e, se houver, o cache HTTP como proxy."""
+        env = self.estrategia_carregamento().ambiente(self.archivebox_dir)
+        if self.cache_http:
+            env["WAYBACK_PROXY"] = self.cache_http
+        return env
+
+    def fila(self, client=None):
+        """FilaMongo em que o pipeline conclui as URLs (com 'client', reaproveita o client síncrono)."""
+        if not self.fila_dono:
+            return None
+        return abrir_fila(self.mongodb_uri, self.database, client=client, dono=self.fila_dono)
+
+    def indice_quase_duplicatas(self):
+        if not self.quase_duplicatas:
+            return None
+        return IndiceQuaseDuplicatas(Path(self.archivebox_dir) / QUASE_DUPLICATAS_INDICE,
+                                     self.distancia_quase_duplicatas)
+
+    def indice_texto(self):
+        return IndiceTexto(Path(self.archivebox_dir) / BUSCA_NAME) if self.busca_texto else None
+
+    def indice_intervalos(self):
+        return IndiceIntervalos(Path(self.archivebox_dir) / INTERVALOS_NAME) if self.intervalos_artigos else None
+
+    def capturador_http(self):
+        if self.modo_captura != "http":
+            return None
+        return CapturadorHTTP(self.archivebox_dir, inlinar=self.inlinar_assets, proxy_padrao=self.cache_http or None)
+
+    @property
+    def success_log(self):
+        return Path(self.archivebox_dir) / config.SUCCESS_LOG_NAME
+
+    @property
+    def error_log(self):
+        return Path(self.archivebox_dir) / config.ERROR_LOG_NAME
+
+    def criar(self, reaper=None, cpu=None):
+        client = conectarBanco(self.mongodb_uri)
+        if client is None:
+            raise RuntimeError("Não foi possível conectar ao MongoDB.")
+        return Pipeline(self, client, obter_colecao(client, self.database, self.collection), reaper, cpu)
+
+    def armazem_assets(self, client):
+        if not self.deduplicar_assets:
+            return None
+        return ArmazemAssets(obter_colecao(client, self.database, self.colecao_assets))
+
+    def criar_async(self, reaper=None, cpu=None):
+        client = conectar_banco_async(self.mongodb_uri)
+        return Pipeline(self, client, obter_colecao(client, self.database, self.collection), reaper, cpu,
+                        assincrono=True)
+
+class Pipeline:
+    """
+    Processa uma URL por todas as etapas. Use ConfigPipeline.criar()/criar_async() para montar.
+    Com 'cpu' (EstagioCPU), os processadores de HTML rodam no pool de processos
+    enquanto o documento é montado; sem ele, rodam no próprio processo.
+    """
+    def __init__(self, cfg, client, colecao, reaper=None, cpu=None, assincrono=False):
+        self.cfg = cfg
+        self.client = client
+        self.colecao = colecao
+        self.reaper = reaper
+        self.cpu = cpu
+        self.limitador = cfg.limitador()
+        # Com o cache HTTP, é o cache que escolhe os proxies do pool nas buscas à origem
+        self.pool = cfg.pool_proxies() if not cfg.cache_http else None
+        self.env_captura = cfg.ambiente_captura()
+        self.watchdog = cfg.watchdog()
+        self.http = cfg.capturador_http()
+        self.assets = cfg.armazem_assets(client)
+        self.assincrono = assincrono
+        # O pymongo síncrono da fila: no pipeline assíncrono, com um client próprio
+        self.fila = cfg.fila(None if assincrono else client)
+        self.quase_duplicatas = cfg.indice_quase_duplicatas()
+        self.busca = cfg.indice_texto()
+        self.intervalos = cfg.indice_intervalos()
+        self.sucessos = Ledger(cfg.success_log)
+        self.erros = Ledger(cfg.error_log)
+
+    def log_error(self, url, error_message):
+        logging.error("%s: %s", url, error_message, extra={"url": url})
+        self.erros.registrar(f"{url}: {error_message}")
+        if self.fila is not None:
+            self.fila.falhar(url, str(error_message))
+
+    def _fallback(self, url, erro):
+        METRICAS.falha("captura_http", f"http_{erro.status}" if erro.status else erro)
+        logging.warning("Captura HTTP de %s falhou; usando o archivebox.", url,
+                        extra={"url": url, "stderr": erro.stderr})
+
+    def _prazo_cpu(self, url):
+        """Análise além do prazo: o documento segue sem 'analise' (a tarefa no pool não pode ser morta)."""
+        orcamento = self.watchdog.orcamento("cpu")
+        self.watchdog.registrar(url, PrazoEsgotado("cpu", orcamento, orcamento, "", ""))
+
+    @staticmethod
+    def _falha_cpu(url, erro):
+        """Análise que falhou (processador ou pool, ex. BrokenProcessPool): o documento segue sem 'analise'."""
+        logging.warning("Falha na análise de %s: %s: %s", url, type(erro).__name__, erro, extra={"url": url})
+
+    def _verificar_quase_duplicata(self, url, timestamp_str, documento):
+        """
+        Compara o SimHash da captura com o índice; marca o documento (e tira o
+        conteúdo e as referências de assets, no modo 'pular'). Devolve True se o
+        conteúdo foi tirado: aí os assets da captura não devem ser gravados. O
+        índice só muda em _registrar_quase_duplicata, depois do insert.
+        """
+        valor = (documento.get("analise") or {}).get("simhash")
+        if self.quase_duplicatas is None or valor is None:
+            return False
+        vizinho = self.quase_duplicatas.consultar(url_original(url) or url, timestamp_str, valor)
+        if vizinho is None:
+            return False
+        METRICAS.contar("quase_duplicatas_total", modo=self.cfg.quase_duplicatas)
+        documento["quase_duplicata_de"] = {"timestamp": timestamp_para_datetime(vizinho[0]), "distancia": vizinho[1]}
+        pular = self.cfg.quase_duplicatas == "pular"
+        if pular:
+            documento.pop("content", None)
+            documento.pop("content_encoding", None)
+            documento.pop("assets", None)
+        logging.info("%s é quase igual à captura %s (%s bits).", url, vizinho[0], vizinho[1], extra={"url": url})
+        return pular
+
+    def _registrar_quase_duplicata(self, url, timestamp_str, documento):
+        """Documento gravado e que não é quase duplicata: passa a ser referência no índice."""
+        valor = (documento.get("analise") or {}).get("simhash")
+        if self.quase_duplicatas is None or valor is None or "quase_duplicata_de" in documento:
+            return
+        self.quase_duplicatas.adicionar(url_original(url) or url, timestamp_str, valor)
+
+    def _indexar_texto(self, url, timestamp_str, snapshot_dir):
+        """Texto da captura no índice de busca; uma falha aqui não desfaz a captura."""
+        if self.busca is None:
+            return
+        try:
+            self.busca.indexar_arquivo(timestamp_str, url_original(url) or url, Path(snapshot_dir) / "singlefile.html")
+        except Exception as e:
+            METRICAS.falha("busca_indexacao", e)
+            logging.warning("Falha ao indexar o texto de %s: %s", url, e, extra={"url": url})
+
+    def _registrar_artigos(self, url, timestamp_str, snapshot_dir):
+        """Matérias da captura no índice de intervalos; uma falha aqui não desfaz a captura."""
+        if self.intervalos is None:
+            return
+        try:
+            self.intervalos.registrar_arquivo(timestamp_str, url_original(url) or url,
+                                              Path(snapshot_dir) / "singlefile.html")
+        except Exception as e:
+            METRICAS.falha("intervalos_indexacao", e)
+            logging.warning("Falha ao registrar as matérias de %s: %s", url, e, extra={"url": url})
+
+    def _concluir(self, url, snapshot_dir, inserted_id):
+        logging.info("Documento inserido com ID: %s para URL: %s", inserted_id, url, extra={"url": url})
+        if self.reaper is not None:
+            self.reaper.agendar(snapshot_dir)
+        METRICAS.sucesso("pipeline")
+        self.sucessos.registrar(url)
+        if self.fila is not None:
+            self.fila.concluir(url)
+
+    def processar(self, url):
+        """Executa as etapas para uma URL. Devolve o diretório do snapshot em caso de sucesso, senão None."""
+        timestamp_str = extract_wayback_timestamp_substring(url)
+        if not timestamp_str:
+            self.log_error(url, "Timestamp inválido")
+            return None
+        try:
+            if self.reaper is not None:
+                self.reaper.aguardar_espaco()
+            logging.info("Iniciando captura para URL: %s", url, extra={"url": url})
+            snapshot_dir = None
+            if self.http is not None:
+                try:
+                    snapshot_dir = capturar_http(url, self.http, limitador=self.limitador, pool=self.pool)
+                except ErroCapturaHTTP as e:
+                    self._fallback(url, e)
+            if snapshot_dir is None:
+                snapshot_dir = capturar(url, self.cfg.archivebox_dir, limitador=self.limitador, pool=self.pool,
+                                        env=self.env_captura, watchdog=self.watchdog)
+            if snapshot_dir is None:
+                METRICAS.falha("captura", "SnapshotNaoEncontrado")
+                self.log_error(url, "Snapshot não encontrado na saída do ArchiveBox")
+                return None
+
+            analise = None
+            if self.cfg.processadores and self.cpu is not None:
+                analise = self.cpu.submeter_arquivo(Path(snapshot_dir) / "singlefile.html")
+            if self.assets is not None:
+                documento, assets = montar_documento_deduplicado(snapshot_dir, timestamp_str,
+                                                                 self.cfg.compactar_conteudo, self.cfg.validar)
+            else:
+                documento = montar_documento(snapshot_dir, timestamp_str, self.cfg.compactar_conteudo,
+                                             self.cfg.validar)
+            if self.watchdog.foi_resgatado(snapshot_dir):
+                documento["captura_parcial"] = True
+            if self.cfg.processadores:
+                if analise is not None:
+                    try:
+                        documento["analise"] = analise.result(timeout=self.watchdog.orcamento("cpu"))
+                    except FuturoTimeout:
+                        self._prazo_cpu(url)
+                    except Exception as e:
+                        self._falha_cpu(url, e)
+                else:
+                    with METRICAS.tempo("cpu"):
+                        documento["analise"] = processar_arquivo(Path(snapshot_dir) / "singlefile.html",
+                                                                 self.cfg.processadores)
+            pulada = self._verificar_quase_duplicata(url, timestamp_str, documento)
+            if self.assets is not None and not pulada:
+                # Assets antes do documento, que os referencia
+                with METRICAS.tempo("insercao_assets"):
+                    self.assets.gravar(assets)
+            with METRICAS.tempo("insercao_mongo"):
+                result = self.colecao.insert_one(documento)
+            self._registrar_quase_duplicata(url, timestamp_str, documento)
+            self._indexar_texto(url, timestamp_str, snapshot_dir)
+            self._registrar_artigos(url, timestamp_str, snapshot_dir)
+            self._concluir(url, snapshot_dir, result.inserted_id)
+            return snapshot_dir
+        except ErroCaptura as e:
+            METRICAS.falha("captura", e)
+            self.log_error(url, f"Erro ao executar ArchiveBox: {e.stderr}")
+        except CapturaInterrompida as e:
+            METRICAS.falha("captura", e)
+            self.log_error(url, str(e))
+        except (FileNotFoundError, ValueError) as e:
+            METRICAS.falha("leitura", e)
+            self.log_error(url, str(e))
+        except Exception as e:
+            METRICAS.falha("pipeline", e)
+            self.log_error(url, f"Erro inesperado: {e}")
+        return None
+
+    async def processar_async(self, url):
+        """Mesmas etapas de processar(), com captura e insert assíncronos e leitura fora do event loop."""
+        timestamp_str = extract_wayback_timestamp_substring(url)
+        if not timestamp_str:
+            await asyncio.to_thread(self.log_error, url, "Timestamp inválido")
+            return None
+        try:
+            if self.reaper is not None:
+                await asyncio.to_thread(self.reaper.aguardar_espaco)
+            logging.info("Iniciando captura para URL: %s", url, extra={"url": url})
+            snapshot_dir = None
+            if self.http is not None:
+                try:
+                    snapshot_dir = await capturar_http_async(url, self.http, limitador=self.limitador, pool=self.pool)
+                except ErroCapturaHTTP as e:
+                    self._fallback(url, e)
+            if snapshot_dir is None:
+                snapshot_dir = await capturar_async(url, self.cfg.archivebox_dir, limitador=self.limitador,
+                                                    pool=self.pool, env=self.env_captura, watchdog=self.watchdog)
+            if snapshot_dir is None:
+                METRICAS.falha("captura", "SnapshotNaoEncontrado")
+                await asyncio.to_thread(self.log_error, url, "Snapshot não encontrado na saída do ArchiveBox")
+                return None
+
+            analise = None
+            if self.cfg.processadores and self.cpu is not None:
+                # submeter_arquivo pode bloquear (backpressure do pool): fora do event loop
+                analise = await asyncio.to_thread(self.cpu.submeter_arquivo, Path(snapshot_dir) / "singlefile.html")
+            if self.assets is not None:
+                documento, assets = await asyncio.to_thread(
+                    montar_documento_deduplicado, snapshot_dir, timestamp_str, self.cfg.compactar_conteudo,
+                    self.cfg.validar
+                )
+            else:
+                documento = await asyncio.to_thread(
+                    montar_documento, snapshot_dir, timestamp_str, self.cfg.compactar_conteudo, self.cfg.validar
+                )
+            if self.watchdog.foi_resgatado(snapshot_dir):
+                documento["captura_parcial"] = True
+            if self.cfg.processadores:
+                if analise is not None:
+                    try:
+                        documento["analise"] = await asyncio.wait_for(asyncio.wrap_future(analise),
+                                                                      self.watchdog.orcamento("cpu"))
+                    except asyncio.TimeoutError:
+                        await asyncio.to_thread(self._prazo_cpu, url)
+                    except Exception as e:
+                        self._falha_cpu(url, e)
+                else:
+                    documento["analise"] = await asyncio.to_thread(
+                        processar_arquivo, Path(snapshot_dir) / "singlefile.html", self.cfg.processadores
+                    )
+            pulada = await asyncio.to_thread(self._verificar_quase_duplicata, url, timestamp_str, documento)
+            if self.assets is not None and not pulada:
+                with METRICAS.tempo("insercao_assets"):
+                    await self.assets.gravar_async(assets)
+            with METRICAS.tempo("insercao_mongo"):
+                result = await self.colecao.insert_one(documento)
+            await asyncio.to_thread(self._registrar_quase_duplicata, url, timestamp_str, documento)
+            await asyncio.to_thread(self._indexar_texto, url, timestamp_str, snapshot_dir)
+            await asyncio.to_thread(self._registrar_artigos, url, timestamp_str, snapshot_dir)
+            await asyncio.to_thread(self._concluir, url, snapshot_dir, result.inserted_id)
+            return snapshot_dir
+        except ErroCaptura as e:
+            METRICAS.falha("captura", e)
+            await asyncio.to_thread(self.log_error, url, f"Erro ao executar ArchiveBox: {e.stderr}")
+        except CapturaInterrompida as e:
+            METRICAS.falha("captura", e)
+            await asyncio.to_thread(self.log_error, url, str(e))
+        except (FileNotFoundError, ValueError) as e:
+            METRICAS.falha("leitura", e)
+            await asyncio.to_thread(self.log_error, url, str(e))
+        except Exception as e:
+            METRICAS.falha("pipeline", e)
+            await asyncio.to_thread(self.log_error, url, f"Erro inesperado: {e}")
+        return None
+
+    def fechar(self):
+        """Fecha o client do MongoDB e os do HTTP. No pipeline assíncrono, devolve a corrotina a aguardar."""
+        if self.assincrono:
+            return self._fechar_async()
+        if self.http is not None:
+            self.http.fechar()
+        if self.busca is not None:
+            self.busca.fechar()
+        if self.intervalos is not None:
+            self.intervalos.fechar()
+        fechar = getattr(self.client, "close", None)
+        if fechar is not None:
+            fechar()
+        return None
+
+    async def _fechar_async(self):
+        if self.http is not None:
+            await self.http.fechar_async()
+        if self.fila is not None:
+            self.fila.colecao.database.client.close()
+        if self.busca is not None:
+            self.busca.fechar()
+        if self.intervalos is not None:
+            self.intervalos.fechar()
+        fechar = getattr(self.client, "close", None)
+        if fechar is not None:
+            resultado = fechar()
+            if asyncio.iscoroutine(resultado):
+                await resultado
@@ -0,0 +1,384 @@
+"""
+Fila de trabalho no MongoDB, para várias máquinas rodarem o pipeline sobre o
+mesmo manifesto sem repetir capturas.
+
+Os ledgers de texto (success/error) são de uma máquina só. Aqui cada captura
+é um documento da coleção FILA_COLLECTION_NAME, com a própria URL como _id
+(enfileirar de novo o mesmo manifesto em outra máquina não duplica nada):
+
+- uma máquina pega o trabalho com find_one_and_update atômico, que grava o
+  dono e uma lease (lease_ate); ninguém mais pega a URL enquanto a lease vale;
+- uma thread de heartbeat renova as leases do dono; se a máquina cai, as
+  leases vencem e as URLs voltam a ser pegas por outra;
+- o resultado só é gravado por quem ainda é o dono (uma lease roubada depois
+  de vencer não é sobrescrita pelo dono antigo);
+- falhas transitórias (analise_falhas.CATEGORIAS) voltam para a fila com
+  espera exponencial, até MAX_TENTATIVAS; as permanentes saem da fila;
+- justiça por alvo (o host da URL original): as máquinas revezam os alvos
+  com trabalho disponível, então um domínio com milhões de capturas não
+  segura os demais;
+- sem nada disponível agora, mas com URLs pendentes (em espera de retry) ou
+  em andamento (em outra máquina, que pode cair), o consumidor espera e
+  tenta de novo; só sai quando a fila acaba (ou, com ate_ociosa, na
+  primeira vez que não houver o que pegar).
+
+    python -m maquina_do_tempo.fila_mongo enfileirar capturas.manifesto
+    python -m maquina_do_tempo --fila --engine processes      # em cada máquina
+    python -m maquina_do_tempo.fila_mongo resumo
+    python -m maquina_do_tempo.fila_mongo reprocessar fila_reprocessamento.txt   # saída do analise_falhas
+"""
+import argparse
+import logging
+import os
+import re
+import socket
+import threading
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from . import config
+from .agendamento import ORDENS, ordenar_urls
+from .analise_falhas import REPROCESSAVEIS, classificar
+from .banco import conectarBanco, obter_colecao
+from .metricas import METRICAS
+
+try:
+    from pymongo import ASCENDING, DESCENDING, ReturnDocument, UpdateOne
+except ImportError:
+    ASCENDING = DESCENDING = ReturnDocument = UpdateOne = None
+
+# =============================
+# Configurações e Constantes
+# =============================
+LEASE = float(os.environ.get("FILA_LEASE", 600))  # segundos de posse de uma URL sem heartbeat
+HEARTBEAT = LEASE / 4
+MAX_TENTATIVAS = 5
+ESPERA_FALHA = 60            # segundos antes de repetir uma falha transitória (dobra a cada tentativa)
+ESPERA_FALHA_MAXIMA = 3600
+LOTE_ENFILEIRAMENTO = 5000
+ESPERA_OCIOSA = float(os.environ.get("FILA_ESPERA_OCIOSA", 15))  # segundos entre consultas sem trabalho disponível
+
+PENDENTE = "pendente"
+EM_ANDAMENTO = "em_andamento"
+SUCESSO = "sucesso"
+FALHA = "falha"              # tentativas esgotadas
+PERMANENTE = "permanente"    # falha que não adianta repetir (404 do Wayback, conteúdo inválido...)
+
+_WAYBACK = re.compile(r"/web/(\d{14})(?:[a-z]{2}_)?/+(?:https?:/+)?([^/:?#]+)", re.I)
+
+def _agora():
+    return datetime.now(timezone.utc)
+
+def identificar_dono():
+    """Identificador do processo que pega trabalho: host:pid."""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+def documento_trabalho(url, prioridade=0, ordem=0):
+    """
+    Documento da fila para uma URL do Wayback (o alvo é o host da URL
+    original). 'ordem' é a posição no lote enfileirado (agendamento.py).
+    """
+    partes = _WAYBACK.search(url)
+    return {
+        "_id": url,
+        "alvo": partes.group(2).lower() if partes else "",
+        "timestamp": partes.group(1) if partes else "",
+        "prioridade": prioridade,
+        "ordem": ordem,
+        "estado": PENDENTE,
+        "tentativas": 0,
+        "disponivel_em": _agora(),
+        "criado_em": _agora(),
+    }
+
+class FilaMongo:
+    """
+    Fila sobre uma coleção do MongoDB (pymongo síncrono; thread-safe). 'dono'
+    identifica quem pega o trabalho: na engine de processos, os workers
+    concluem as URLs que o processo principal pegou, com o mesmo dono.
+    """
+    def __init__(self, colecao, dono=None, lease=LEASE, max_tentativas=MAX_TENTATIVAS):
+        self.colecao = colecao
+        self.dono = dono or identificar_dono()
+        self.lease = lease
+        self.max_tentativas = max_tentativas
+        self._alvos = deque()
+        self._lock = threading.Lock()
+        self._parar = threading.Event()
+        self._heartbeat = None
+
+    def criar_indices(self):
+        self.colecao.create_index([("estado", ASCENDING), ("alvo", ASCENDING), ("disponivel_em", ASCENDING)])
+        self.colecao.create_index([("estado", ASCENDING), ("lease_ate", ASCENDING)])
+        self.colecao.create_index([("dono", ASCENDING), ("estado", ASCENDING)])
+
+    # -----------------------------
+    # Produção
+    # -----------------------------
+    def enfileirar(self, urls, prioridade=0, lote=LOTE_ENFILEIRAMENTO):
+        """
+        Insere as URLs que ainda não estão na fila (idempotente), guardando a
+        ordem em que vieram. Devolve quantas foram inseridas.
+        """
+        inseridas = 0
+        operacoes = []
+        for ordem, url in enumerate(urls):
+            url = url.decode() if isinstance(url, bytes) else url.strip()
+            if not url:
+                continue
+            operacoes.append(UpdateOne({"_id": url}, {"$setOnInsert": documento_trabalho(url, prioridade, ordem)},
+                                       upsert=True))
+            if len(operacoes) >= lote:
+                inseridas += self.colecao.bulk_write(operacoes, ordered=False).upserted_count
+                operacoes = []
+        if operacoes:
+            inseridas += self.colecao.bulk_write(operacoes, ordered=False).upserted_count
+        METRICAS.contar("fila_enfileiradas_total", inseridas)
+        return inseridas
+
+    def reprocessar(self, urls, lote=LOTE_ENFILEIRAMENTO):
+        """
+        Devolve à fila (pendente, tentativas zeradas) as URLs que já saíram
+        dela como falha ou permanente, e enfileira as que ainda não estão lá.
+        enfileirar() sozinho não serve: o $setOnInsert não mexe nas que já
+        existem. Devolve quantas voltaram ou entraram.
+        """
+        urls = [u.decode() if isinstance(u, bytes) else u.strip() for u in urls]
+        urls = [u for u in urls if u]
+        reabertas = 0
+        for inicio in range(0, len(urls), lote):
+            resultado = self.colecao.update_many(
+                {"_id": {"$in": urls[inicio:inicio + lote]}, "estado": {"$in": [FALHA, PERMANENTE]}},
+                {"$set": {"estado": PENDENTE, "tentativas": 0, "disponivel_em": _agora()}},
+            )
+            reabertas += resultado.modified_count
+        return reabertas + self.enfileirar(urls, lote=lote)
+
+    # -----------------------------
+    # Consumo
+    # -----------------------------
+    def _disponiveis(self, agora):
+        """Pendentes já liberadas da espera, ou em andamento com a lease vencida (dono caiu)."""
+        return {
+            "tentativas": {"$lt": self.max_tentativas},
+            "$or": [
+                {"estado": PENDENTE, "disponivel_em": {"$lte": agora}},
+                {"estado": EM_ANDAMENTO, "lease_ate": {"$lt": agora}},
+            ],
+        }
+
+    def _reivindicar(self, filtro, agora):
+        return self.colecao.find_one_and_update(
+            filtro,
+            {"$set": {"estado": EM_ANDAMENTO, "dono": self.dono, "lease_ate": agora + timedelta(seconds=self.lease),
+                      "iniciado_em": agora},
+             "$inc": {"tentativas": 1}},
+            sort=[("prioridade", DESCENDING), ("ordem", ASCENDING)],
+            return_document=ReturnDocument.AFTER,
+        )
+
+    def reivindicar(self):
+        """Pega a próxima URL, revezando os alvos. Devolve a URL ou None se não há trabalho disponível."""
+        with self._lock:
+            # Se os alvos conhecidos se esgotarem, a lista é refeita uma vez (pode haver leases vencidas)
+            for _ in range(2):
+                agora = _agora()
+                if not self._alvos:
+                    self._expirar(agora)
+                    self._alvos.extend(sorted(self.colecao.distinct("alvo", self._disponiveis(agora))))
+                while self._alvos:
+                    alvo = self._alvos.popleft()
+                    documento = self._reivindicar({**self._disponiveis(agora), "alvo": alvo}, agora)
+                    if documento is not None:
+                        # O alvo volta para o fim da rodada: a próxima URL é de outro
+                        self._alvos.append(alvo)
+                        METRICAS.contar("fila_reivindicadas_total")
+                        if documento["tentativas"] > 1:
+                            METRICAS.retry("fila", "lease_vencida" if documento.get("erro") is None else "falha")
+                        return documento["_id"]
+            return None
+
+    def _expirar(self, agora):
+        """Leases vencidas sem tentativas restantes: a URL sai da fila como falha."""
+        resultado = self.colecao.update_many(
+            {"estado": EM_ANDAMENTO, "lease_ate": {"$lt": agora}, "tentativas": {"$gte": self.max_tentativas}},
+            {"$set": {"estado": FALHA, "erro": "lease vencida na última tentativa", "concluido_em": agora},
+             "$unset": {"lease_ate": ""}},
+        )
+        if resultado.modified_count:
+            logging.warning(f"{resultado.modified_count} URLs da fila esgotaram as tentativas com a lease vencida.")
+
+    def em_aberto(self):
+        """Há URLs pendentes ou em andamento (de qualquer dono)?"""
+        return self.colecao.find_one({"estado": {"$in": [PENDENTE, EM_ANDAMENTO]}}, {"_id": 1}) is not None
+
+    def urls(self, ate_ociosa=False, intervalo=ESPERA_OCIOSA, parar=None):
+        """
+        Gerador das URLs pegas por este dono. Sem trabalho disponível, espera
+        'intervalo' segundos e tenta de novo enquanto houver URLs pendentes ou
+        em andamento; termina quando a fila acaba, quando 'parar'
+        (threading.Event) é sinalizado ou, com 'ate_ociosa', na primeira vez
+        que não houver o que pegar.
+        """
+        parar = parar or threading.Event()
+        aguardando = False
+        while not parar.is_set():
+            url = self.reivindicar()
+            if url is not None:
+                aguardando = False
+                yield url
+                continue
+            if ate_ociosa or not self.em_aberto():
+                return
+            if not aguardando:
+                logging.info(f"Fila sem trabalho disponível agora; consultando de novo a cada {intervalo:g} s.")
+                aguardando = True
+            parar.wait(intervalo)
+
+    def renovar(self):
+        """Estende as leases de tudo o que este dono tem em andamento."""
+        agora = _agora()
+        self.colecao.update_many({"dono": self.dono, "estado": EM_ANDAMENTO},
+                                 {"$set": {"lease_ate": agora + timedelta(seconds=self.lease)}})
+
+    def iniciar_heartbeat(self, intervalo=None):
+        intervalo = intervalo or min(HEARTBEAT, self.lease / 4)
+
+        def loop():
+            while not self._parar.wait(intervalo):
+                try:
+                    self.renovar()
+                except Exception as e:
+                    logging.warning(f"Heartbeat da fila falhou: {e}")
+
+        self._parar.clear()
+        self._heartbeat = threading.Thread(target=loop, name="fila-heartbeat", daemon=True)
+        self._heartbeat.start()
+        return self
+
+    def concluir(self, url):
+        """Marca a URL como capturada, se ainda for deste dono."""
+        resultado = self.colecao.update_one(
+            {"_id": url, "dono": self.dono, "estado": EM_ANDAMENTO},
+            {"$set": {"estado": SUCESSO, "concluido_em": _agora()}, "$unset": {"lease_ate": "", "erro": ""}},
+        )
+        if not resultado.modified_count:
+            logging.warning("URL %s concluída, mas a lease já era de outro dono.", url, extra={"url": url})
+
+    def falhar(self, url, mensagem):
+        """
+        Registra a falha: transitórias voltam para a fila após a espera (até
+        max_tentativas); permanentes saem da fila.
+        """
+        categoria = classificar(mensagem.lower())
+        atual = self.colecao.find_one({"_id": url, "dono": self.dono, "estado": EM_ANDAMENTO}, {"tentativas": 1})
+        if atual is None:
+            return
+        agora = _agora()
+        if categoria not in REPROCESSAVEIS and categoria != "outro":
+            estado = PERMANENTE
+        elif atual["tentativas"] >= self.max_tentativas:
+            estado = FALHA
+        else:
+            estado = PENDENTE
+        espera = min(ESPERA_FALHA * 2 ** (atual["tentativas"] - 1), ESPERA_FALHA_MAXIMA)
+        self.colecao.update_one(
+            {"_id": url, "dono": self.dono, "estado": EM_ANDAMENTO},
+            {"$set": {"estado": estado, "erro": mensagem[:2000], "categoria": categoria,
+                      "disponivel_em": agora + timedelta(seconds=espera), "concluido_em": agora},
+             "$unset": {"lease_ate": "", "dono": ""}},
+        )
+
+    def liberar(self):
+        """Devolve à fila o que este dono ainda tem em andamento (fim da execução ou interrupção)."""
+        self._parar.set()
+        if self._heartbeat is not None:
+            self._heartbeat.join(timeout=5)
+            self._heartbeat = None
+        resultado = self.colecao.update_many(
+            {"dono": self.dono, "estado": EM_ANDAMENTO},
+            {"$set": {"estado": PENDENTE, "disponivel_em": _agora()}, "$unset": {"lease_ate": "", "dono": ""},
+             "$inc": {"tentativas": -1}},
+        )
+        if resultado.modified_count:
+            logging.info(f"{resultado.modified_count} URLs em andamento devolvidas à fila.")
+        return resultado.modified_count
+
+    # -----------------------------
+    # Consulta
+    # -----------------------------
+    def contagens(self):
+        agora = _agora()
+        grupos = self.colecao.aggregate([{"$group": {"_id": "$estado", "n": {"$sum": 1}}}])
+        contagens = {d["_id"]: d["n"] for d in grupos}
+        contagens["leases_vencidas"] = self.colecao.count_documents({"estado": EM_ANDAMENTO,
+                                                                     "lease_ate": {"$lt": agora}})
+        return contagens
+
+    def resumo(self):
+        contagens = self.contagens()
+        alvos = self.colecao.aggregate([
+            {"$match": {"estado": {"$in": [PENDENTE, EM_ANDAMENTO]}}},
+            {"$group": {"_id": "$alvo", "n": {"$sum": 1}}},
+            {"$sort": {"n": -1}},
+            {"$limit": 10},
+        ])
+        linhas = [", ".join(f"{estado}={n}" for estado, n in sorted(contagens.items()))]
+        linhas += [f"  {d['_id'] or '(sem alvo)':<40} {d['n']:>10}" for d in alvos]
+        return "\n".join(linhas)
+
+def abrir_fila(uri=config.MONGODB_URI, database=config.DATABASE_NAME, collection=config.FILA_COLLECTION_NAME,
+               dono=None, client=None):
+    """FilaMongo sobre um client novo (ou 'client'), com os índices criados."""
+    if client is None:
+        client = conectarBanco(uri)
+        if client is None:
+            raise RuntimeError("Não foi possível conectar ao MongoDB.")
+    fila = FilaMongo(obter_colecao(client, database, collection), dono)
+    fila.criar_indices()
+    return fila
+
+def main():
+    parser = argparse.ArgumentParser(description="Fila de capturas no MongoDB, compartilhada entre máquinas.")
+    parser.add_argument("--mongodb-uri", default=config.MONGODB_URI)
+    sub = parser.add_subparsers(dest="comando", required=True)
+    enfileirar = sub.add_parser("enfileirar", help="Enfileira as URLs de um arquivo ou manifesto (idempotente)")
+    enfileirar.add_argument("origem", help="Arquivo com uma URL por linha ou diretório de manifesto")
+    enfileirar.add_argument("--prioridade", type=int, default=0)
+    enfileirar.add_argument("--ordem", choices=ORDENS, default=config.ORDEM_CAPTURAS,
+                            help="Ordem em que a fila entrega as URLs (agendamento.py)")
+    sub.add_parser("resumo", help="Contagens por estado e os alvos com mais trabalho")
+    reprocessar = sub.add_parser("reprocessar", help="Devolve à fila as URLs de um arquivo (ex.: a fila de "
+                                                     "reprocessamento do analise_falhas), mesmo as que falharam")
+    reprocessar.add_argument("origem", help="Arquivo com uma URL por linha")
+    reabrir = sub.add_parser("reabrir", help="Devolve à fila as URLs que esgotaram as tentativas")
+    reabrir.add_argument("--permanentes", action="store_true", help="Também as falhas permanentes")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(message)s")
+
+    fila = abrir_fila(args.mongodb_uri)
+    if args.comando == "enfileirar":
+        from .manifesto import Manifesto
+        from .wayback import load_urls_from_file
+        if Manifesto.eh_manifesto(args.origem):
+            urls = list(Manifesto.abrir(args.origem).urls())
+        else:
+            urls = load_urls_from_file(args.origem)
+        inseridas = fila.enfileirar(ordenar_urls(urls, args.ordem), prioridade=args.prioridade)
+        print(f"{inseridas} URLs novas na fila ({Path(args.origem).name}).")
+    elif args.comando == "reprocessar":
+        with open(args.origem, encoding="utf-8") as f:
+            devolvidas = fila.reprocessar(f)
+        print(f"{devolvidas} URLs devolvidas à fila ({Path(args.origem).name}).")
+    elif args.comando == "reabrir":
+        estados = [FALHA, PERMANENTE] if args.permanentes else [FALHA]
+        resultado = fila.colecao.update_many({"estado": {"$in": estados}},
+                                             {"$set": {"estado": PENDENTE, "tentativas": 0,
+                                                       "disponivel_em": _agora()}})
+        print(f"{resultado.modified_count} URLs devolvidas à fila.")
+    else:
+        print(fila.resumo())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""
+Extração de texto do HTML capturado, por regex sobre bytes (sem parser: o
+singlefile.html tem megabytes de data URIs dentro dos atributos, que saem
+junto com as tags).
+
+    visivel = remover_invisivel(html)
+    texto_visivel(visivel), nomes_tags(visivel), titulos(html), manchetes(html)
+    links(visivel)
+"""
+import html as html_lib
+import re
+
+_INVISIVEL = re.compile(rb"<script\b.*?</script\s*>|<style\b.*?</style\s*>|<!--.*?-->|<noscript\b.*?</noscript\s*>"
+                        rb"|<template\b.*?</template\s*>|<svg\b.*?</svg\s*>",
+                        re.S | re.I)
+_TAG = re.compile(rb"<\s*([a-zA-Z][\w-]*)")
+_MARCACAO = re.compile(rb"<[^>]*>")
+_TITULOS = re.compile(rb"<(title|h[1-3])\b[^>]*>(.*?)</\1\s*>", re.S | re.I)
+_ESPACOS = re.compile(r"\s+")
+_LINK = re.compile(rb"""<a\b[^>]*?\bhref\s*=\s*["']?([^"'\s>]+)""", re.I)
+_PREFIXO_WAYBACK = re.compile(r"^(?:https?://web\.archive\.org)?/web/\d{1,14}[a-z_]*/", re.I)
+
+def remover_invisivel(html):
+    """O HTML sem <script>, <style>, <noscript>, <template>, <svg> e comentários."""
+    return _INVISIVEL.sub(b" ", bytes(html))
+
+def _limpar(trecho):
+    texto = _MARCACAO.sub(b" ", trecho).decode("utf-8", errors="replace")
+    return _ESPACOS.sub(" ", html_lib.unescape(texto)).strip()
+
+def texto_visivel(visivel):
+    """Texto de um HTML já sem o invisível (remover_invisivel), com os espaços normalizados."""
+    return _limpar(visivel)
+
+def nomes_tags(visivel):
+    """Nomes das tags, em ordem e em minúsculas."""
+    return [t.lower().decode("ascii") for t in _TAG.findall(visivel)]
+
+def titulos(html):
+    """<title> e manchetes (h1 a h3), na ordem em que aparecem."""
+    return [texto for _, trecho in _TITULOS.findall(bytes(html)) if (texto := _limpar(trecho))]
+
+def manchetes(html):
+    """Só as manchetes (h1 a h3), sem o <title>."""
+    return [texto for tag, trecho in _TITULOS.findall(bytes(html))
+            if tag.lower() != b"title" and (texto := _limpar(trecho))]
+
+def links(html):
+    """Destinos dos <a href>, em ordem; os reescritos pelo Wayback voltam ao endereço original."""
+    return [_PREFIXO_WAYBACK.sub("", html_lib.unescape(href.decode("utf-8", errors="replace")))
+            for href in _LINK.findall(bytes(html))]
@@ -0,0 +1,375 @@
+import argparse
+import hashlib
+import heapq
+import html
+import json
+import logging
+import os
+import sys
+import tempfile
+from datetime import datetime, timezone
+from pathlib import Path
+
+from .config import COLLECTION_NAME, DATABASE_NAME, MONGODB_URI
+from .wayback import extract_wayback_timestamp_substring
+
+# =============================
+# Configurações e Constantes
+# =============================
+# Site alvo usado para remontar o link do Wayback quando a entrada não traz URL
+URL_ALVO = "https://poder360.com.br/"
+
+TAMANHO_PAGINA = 500  # Entradas por página HTML
+LOTE_ORDENACAO = 200_000  # Linhas do ledger ordenadas em memória por vez (o resto vai para arquivos temporários)
+MANIFESTO_NOME = ".manifesto_indice.json"
+BUSCA_NOME = "busca.json"
+
+# =============================
+# Normalização das entradas
+# =============================
+def _campo(entry, nome, padrao=None):
+    """Lê um campo tanto de dicionários (Mongo) quanto de objetos de modelo."""
+    if isinstance(entry, dict):
+        return entry.get(nome, padrao)
+    return getattr(entry, nome, padrao)
+
+def _timestamp_wayback(valor):
+    """
+    Converte o timestamp de uma entrada (datetime, ISO 8601 ou YYYYMMDDhhmmss)
+    para a string de 14 dígitos usada pelo Wayback Machine.
+    Retorna None se não for possível interpretar o valor.
+    """
+    if isinstance(valor, datetime):
+        if valor.tzinfo is not None:
+            valor = valor.astimezone(timezone.utc)
+        return valor.strftime("%Y%m%d%H%M%S")
+    if isinstance(valor, str):
+        valor = valor.strip()
+        if len(valor) == 14 and valor.isdigit():
+            return valor
+        try:
+            return _timestamp_wayback(datetime.fromisoformat(valor.replace("Z", "+00:00")))
+        except ValueError:
+            return None
+    return None
+
+def normalizar_entrada(entry):
+    """
+    Reduz uma entrada (documento do Mongo, objeto de modelo ou linha do ledger)
+    a uma tupla (timestamp, link, isAdvertisingModified, advertising_id).
+    Retorna None para entradas sem timestamp válido.
+    """
+    if isinstance(entry, str):
+        ts = extract_wayback_timestamp_substring(entry)
+        return (ts, entry, False, None) if ts else None
+
+    ts = _timestamp_wayback(_campo(entry, "timestamp"))
+    if not ts:
+        return None
+
+    link = _campo(entry, "url")
+    if not link:
+        link = f"https://web.archive.org/web/{ts}/{URL_ALVO}"
+
+    return (
+        ts,
+        link,
+        bool(_campo(entry, "isAdvertisingModified", False)),
+        _campo(entry, "advertising_id_when_isModified"),
+    )
+
+# =============================
+# Fontes de entradas (streaming)
+# =============================
+def iterar_mongo(client, database_name=DATABASE_NAME, collection_name=COLLECTION_NAME, batch_size=1000):
+    """
+    Percorre a coleção em ordem cronológica sem carregar o campo 'content'.
+    O índice em 'timestamp' evita o sort em memória do servidor para coleções grandes.
+    """
+    collection = client[database_name][collection_name]
+    collection.create_index("timestamp")
+    projection = {
+        "_id": 0,
+        "timestamp": 1,
+        "isAdvertisingModified": 1,
+        "advertising_id_when_isModified": 1,
+    }
+    cursor = collection.find({}, projection, batch_size=batch_size).sort("timestamp", 1)
+    try:
+        for documento in cursor:
+            yield documento
+    finally:
+        cursor.close()
+
+def _gravar_lote(lote, diretorio):
+    lote.sort()
+    with tempfile.NamedTemporaryFile("w", encoding="utf-8", dir=diretorio, delete=False) as f:
+        f.writelines(f"{chave}\n" for chave in lote)
+        return f.name
+
+def _ler_lote(caminho):
+    with open(caminho, "r", encoding="utf-8") as f:
+        for linha in f:
+            yield linha.rstrip("\n")
+
+def iterar_ledger(caminho_ledger, lote=LOTE_ORDENACAO):
+    """
+    Percorre o arquivo de sucesso (uma URL do Wayback por linha) em ordem
+    cronológica. O ledger segue a ordem de captura (cobertura, recentes...),
+    não a do índice: as linhas são ordenadas por timestamp com ordenação
+    externa (lotes de 'lote' linhas ordenados em arquivos temporários e
+    intercalados), sem carregar o arquivo inteiro. Linhas sem timestamp
+    válido são ignoradas.
+    """
+    with tempfile.TemporaryDirectory(prefix="indice_ledger_") as diretorio:
+        # Chave "timestamp URL": o timestamp tem largura fixa, a ordem da string é a cronológica
+        chaves, arquivos = [], []
+        with open(caminho_ledger, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line or line.startswith("#"):
+                    continue
+                ts = extract_wayback_timestamp_substring(line)
+                if ts is None:
+                    continue
+                chaves.append(f"{ts} {line}")
+                if len(chaves) >= lote:
+                    arquivos.append(_gravar_lote(chaves, diretorio))
+                    chaves = []
+        chaves.sort()
+        for chave in heapq.merge(chaves, *(_ler_lote(caminho) for caminho in arquivos)):
+            yield chave[15:]
+
+def _em_paginas(entradas, tamanho_pagina):
+    """Agrupa as entradas normalizadas em páginas; só uma página fica em memória por vez."""
+    pagina = []
+    for entry in entradas:
+        normalizada = normalizar_entrada(entry)
+        if normalizada is None:
+            logging.warning(f"Entrada sem timestamp válido ignorada no índice: {entry!r:.200}")
+            continue
+        pagina.append(normalizada)
+        if len(pagina) == tamanho_pagina:
+            yield pagina
+            pagina = []
+    if pagina:
+        yield pagina
+
+# =============================
+# Renderização
+# =============================
+def nome_pagina(numero):
+    """A primeira página é o index.html; as demais são pagina-NNNN.html."""
+    return "index.html" if numero == 1 else f"pagina-{numero:04d}.html"
+
+_ESTILO = """
+        <style>
+            body { font-family: Arial, sans-serif; margin: 20px; }
+            h1 { text-align: center; }
+            nav { margin: 15px 0; text-align: center; }
+            .archive-entry { margin-bottom: 12px; }
+            .archive-entry a { text-decoration: none; color: #1a0dab; }
+            .archive-entry a:hover { text-decoration: underline; }
+            .archived-on { color: #555; font-size: 0.9em; }
+            .ad-modified { color: #b00; font-size: 0.9em; }
+            #busca-resultado li { margin: 4px 0; }
+        </style>
+"""
+
+# Busca no cliente: baixa o busca.json (compacto) e filtra por data e flag de anúncio
+_SCRIPT_BUSCA = """
+<script>
+async function buscarIndice(ev) {
+    ev.preventDefault();
+    const de = (document.getElementById('busca-de').value || '0').replace(/\\D/g, '').padEnd(14, '0');
+    const ate = (document.getElementById('busca-ate').value || '9').replace(/\\D/g, '').padEnd(14, '9');
+    const soAnuncio = document.getElementById('busca-ad').checked;
+    const dados = await (await fetch('busca.json')).json();
+    const lista = document.getElementById('busca-resultado');
+    lista.innerHTML = '';
+    let total = 0;
+    for (const [ts, ad, pag] of dados.entradas) {
+        const t = String(ts);
+        if (t < de || t > ate || (soAnuncio && !ad)) continue;
+        if (++total > 200) break;
+        const nome = pag === 1 ? 'index.html' : 'pagina-' + String(pag).padStart(4, '0') + '.html';
+        const li = document.createElement('li');
+        li.innerHTML = '<a href="' + nome + '#ts-' + t + '">' + t + '</a>' + (ad ? ' (anúncio modificado)' : '');
+        lista.appendChild(li);
+    }
+}
+</script>
+"""
+
+def renderizar_pagina(numero, entradas, tem_proxima):
+    """Monta o HTML de uma página do índice. Não depende do total de páginas, para que
+    páginas antigas não mudem quando novas capturas são acrescentadas ao final."""
+    partes = [
+        "<!DOCTYPE html>\n<html lang='pt-BR'>\n<head>\n<meta charset='UTF-8'>\n",
+        "<meta name='viewport' content='width=device-width, initial-scale=1.0'>\n",
+        f"<title>Índice Consolidado ArchiveBox - página {numero}</title>\n",
+        _ESTILO,
+        _SCRIPT_BUSCA,
+        "</head>\n<body>\n",
+        f"<h1>Índice Consolidado ArchiveBox - página {numero}</h1>\n",
+        "<form onsubmit='buscarIndice(event)'>\n",
+        "  De: <input id='busca-de' placeholder='AAAAMMDD'> Até: <input id='busca-ate' placeholder='AAAAMMDD'>\n",
+        "  <label><input type='checkbox' id='busca-ad'> Só anúncio modificado</label>\n",
+        "  <button type='submit'>Buscar</button>\n",
+        "</form>\n<ul id='busca-resultado'></ul>\n",
+    ]
+
+    navegacao = ["<nav>"]
+    if numero > 1:
+        navegacao.append(f"<a href='{nome_pagina(numero - 1)}'>&laquo; Anterior</a>")
+    if tem_proxima:
+        navegacao.append(f"<a href='{nome_pagina(numero + 1)}'>Próxima &raquo;</a>")
+    navegacao.append("</nav>\n")
+    navegacao = " ".join(navegacao)
+    partes.append(navegacao)
+
+    for ts, link, ad_modificado, ad_id in entradas:
+        data = datetime.strptime(ts, "%Y%m%d%H%M%S").strftime("%Y-%m-%d %H:%M:%S")
+        partes.append(f"<div class='archive-entry' id='ts-{ts}'>\n")
+        partes.append(f"  <a href='{html.escape(link, quote=True)}' target='_blank'>Snapshot {ts}</a>\n")
+        partes.append(f"  <span class='archived-on'>Arquivado em: {data} UTC</span>\n")
+        if ad_modificado:
+            partes.append(f"  <span class='ad-modified'>Anúncio modificado: {html.escape(str(ad_id))}</span>\n")
+        partes.append("</div>\n")
+
+    partes.append(navegacao)
+    partes.append("</body>\n</html>")
+    return "".join(partes)
+
+# =============================
+# Geração incremental
+# =============================
+def _carregar_manifesto(caminho, tamanho_pagina):
+    try:
+        with open(caminho, "r", encoding="utf-8") as f:
+            manifesto = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+    # Se o tamanho da página mudou, todos os hashes antigos deixam de valer
+    if manifesto.get("tamanho_pagina") != tamanho_pagina:
+        return {}
+    return manifesto.get("paginas", {})
+
+def _escrever_atomico(caminho, conteudo_bytes):
+    temporario = caminho.with_suffix(caminho.suffix + ".tmp")
+    with open(temporario, "wb") as f:
+        f.write(conteudo_bytes)
+    os.replace(temporario, caminho)
+
+def gerar_indice(entradas, output_dir, tamanho_pagina=TAMANHO_PAGINA):
+    """
+    Gera o índice consolidado paginado em output_dir a partir de um iterável de entradas
+    (documentos do Mongo, objetos de modelo ou URLs do ledger).
+
+    Memória: apenas uma página e a seguinte ficam em memória; o busca.json é escrito
+    em streaming. Páginas cujo HTML não mudou desde a última execução não são reescritas.
+    Retorna um dicionário com as contagens de páginas escritas e reaproveitadas.
+    """
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    caminho_manifesto = output_dir / MANIFESTO_NOME
+    hashes_anteriores = _carregar_manifesto(caminho_manifesto, tamanho_pagina)
+    hashes_atuais = {}
+
+    caminho_busca = output_dir / BUSCA_NOME
+    busca_tmp = caminho_busca.with_suffix(".json.tmp")
+    hash_busca = hashlib.sha1()
+    escritas = reaproveitadas = total_entradas = 0
+
+    with open(busca_tmp, "w", encoding="utf-8") as busca:
+        def escrever_busca(texto):
+            busca.write(texto)
+            hash_busca.update(texto.encode("utf-8"))
+
+        escrever_busca(f'{{"versao":1,"tamanho_pagina":{tamanho_pagina},"campos":["ts","ad","pag"],"entradas":[')
+        primeira = True
+
+        # Olha uma página à frente para saber se existe "próxima"
+        paginas = _em_paginas(entradas, tamanho_pagina)
+        atual = next(paginas, None)
+        numero = 1
+        while atual is not None:
+            proxima = next(paginas, None)
+            conteudo = renderizar_pagina(numero, atual, proxima is not None).encode("utf-8")
+            digest = hashlib.sha1(conteudo).hexdigest()
+            hashes_atuais[str(numero)] = digest
+
+            caminho_pagina = output_dir / nome_pagina(numero)
+            if hashes_anteriores.get(str(numero)) == digest and caminho_pagina.exists():
+                reaproveitadas += 1
+            else:
+                _escrever_atomico(caminho_pagina, conteudo)
+                escritas += 1
+
+            for ts, _link, ad_modificado, _ad_id in atual:
+                escrever_busca(("" if primeira else ",") + f"[{ts},{int(ad_modificado)},{numero}]")
+                primeira = False
+            total_entradas += len(atual)
+
+            atual = proxima
+            numero += 1
+
+        escrever_busca("]}")
+
+    # Só substitui o busca.json se o conteúdo mudou
+    hash_busca_anterior = hashes_anteriores.get(BUSCA_NOME) if hashes_anteriores else None
+    hashes_atuais[BUSCA_NOME] = hash_busca.hexdigest()
+    if hash_busca_anterior == hashes_atuais[BUSCA_NOME] and caminho_busca.exists():
+        busca_tmp.unlink()
+    else:
+        os.replace(busca_tmp, caminho_busca)
+
+    # Remove páginas que deixaram de existir (ex.: entradas removidas da coleção)
+    for chave in hashes_anteriores:
+        if chave.isdigit() and chave not in hashes_atuais:
+            try:
+                (output_dir / nome_pagina(int(chave))).unlink()
+            except FileNotFoundError:
+                pass
+
+    manifesto = {"tamanho_pagina": tamanho_pagina, "paginas": hashes_atuais}
+    _escrever_atomico(caminho_manifesto, json.dumps(manifesto).encode("utf-8"))
+
+    logging.info(
+        f"Índice consolidado em {output_dir}: {total_entradas} entradas, "
+        f"{escritas} páginas escritas, {reaproveitadas} reaproveitadas."
+    )
+    return {"entradas": total_entradas, "escritas": escritas, "reaproveitadas": reaproveitadas}
+
+# =============================
+# Função Principal
+# =============================
+def main():
+    parser = argparse.ArgumentParser(description="Gera o índice consolidado paginado das capturas.")
+    parser.add_argument("output_dir", help="Diretório onde as páginas e o busca.json serão escritos")
+    parser.add_argument("--fonte", choices=["mongo", "ledger"], default="mongo")
+    parser.add_argument("--ledger", help="Arquivo de sucesso (uma URL por linha) quando --fonte=ledger")
+    parser.add_argument("--tamanho-pagina", type=int, default=TAMANHO_PAGINA)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s:%(message)s')
+
+    if args.fonte == "ledger":
+        if not args.ledger or not Path(args.ledger).exists():
+            logging.error("Arquivo do ledger não informado ou inexistente.")
+            sys.exit(1)
+        entradas = iterar_ledger(args.ledger)
+        resumo = gerar_indice(entradas, args.output_dir, args.tamanho_pagina)
+    else:
+        from pymongo import MongoClient
+
+        client = MongoClient(MONGODB_URI, serverSelectionTimeoutMS=5000)
+        try:
+            resumo = gerar_indice(iterar_mongo(client), args.output_dir, args.tamanho_pagina)
+        finally:
+            client.close()
+
+    print(json.dumps(resumo))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+import argparse
+import codecs
+import json
+import logging
+import mmap
+import os
+import subprocess
+import sys
+import time
+import zlib
+from contextlib import contextmanager
+from pathlib import Path
+
+# =============================
+# Configurações e Constantes
+# =============================
+# Compactar o HTML antes de enviar ao MongoDB (o documento ganha content_encoding="zlib")
+COMPACTAR = False
+NIVEL_COMPACTACAO = 6
+
+# Validar UTF-8 na ingestão (opcional: o SingleFile sempre grava UTF-8)
+VALIDAR_UTF8 = False
+
+# Tamanho dos blocos usados na validação e na compactação em streaming
+TAMANHO_BLOCO = 1 << 20  # 1 MiB
+
+class ArquivosDaHomeWaybackMachineModel:
+    """
+    Modelo de documento para o MongoDB.
+
+    'content' pode ser bytes (caminho de ingestão sem decodificação) ou str
+    (compatibilidade com os scripts antigos). Bytes vão direto para o BSON
+    como BinData subtipo 0, o mesmo formato que Binary(...) gerava, sem cópias
+    extras.
+    """
+    def __init__(self, device, content, timestamp, isAdvertisingModified, advertising_id_when_isModified,
+                 content_encoding=None):
+        self.device = device
+        self.content = content
+        self.timestamp = timestamp
+        self.isAdvertisingModified = isAdvertisingModified
+        self.advertising_id_when_isModified = advertising_id_when_isModified
+        self.content_encoding = content_encoding
+
+    def to_dict(self):
+        content = self.content
+        if isinstance(content, str):
+            content = content.encode('utf-8')
+        documento = {
+            "device": self.device,
+            "content": content,
+            "timestamp": self.timestamp,
+            "isAdvertisingModified": self.isAdvertisingModified,
+            "advertising_id_when_isModified": self.advertising_id_when_isModified,
+        }
+        if self.content_encoding:
+            documento["content_encoding"] = self.content_encoding
+        return documento
+
+# =============================
+# Leitura do snapshot
+# =============================
+def ler_snapshot_bytes(caminho):
+    """
+    Lê o singlefile.html em modo binário com uma única alocação do tamanho do
+    arquivo. Não há decodificação para str nem recodificação para UTF-8.
+    """
+    with open(caminho, "rb", buffering=0) as f:
+        return f.read()
+
+@contextmanager
+def mapear_snapshot(caminho):
+    """
+    Mapeia o arquivo em memória (somente leitura). Útil para quem aceita o
+    protocolo de buffer (zlib, hashlib) e pode consumir o arquivo sem copiá-lo.
+    Arquivos vazios não podem ser mapeados e resultam em b"".
+    """
+    with open(caminho, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            yield b""
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapa:
+            yield mapa
+
+def validar_utf8(buf, tamanho_bloco=TAMANHO_BLOCO):
+    """
+    Verifica se o buffer é UTF-8 válido sem montar a str do documento inteiro.
+
+    Cada bloco passa primeiro por bytes.isascii(), que o CPython executa palavra
+    a palavra (vetorizado); só os blocos com bytes não ASCII passam pelo
+    decodificador incremental, cujo resultado é descartado. A memória extra
+    fica limitada a um bloco.
+    """
+    view = memoryview(buf)
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    try:
+        for inicio in range(0, len(view), tamanho_bloco):
+            bloco = view[inicio:inicio + tamanho_bloco]
+            if decoder.getstate()[0] == b"" and bloco.tobytes().isascii():
+                continue
+            decoder.decode(bloco)
+        decoder.decode(b"", final=True)
+    except UnicodeDecodeError:
+        return False
+    finally:
+        view.release()
+    return True
+
+def compactar(buf, nivel=NIVEL_COMPACTACAO, tamanho_bloco=TAMANHO_BLOCO):
+    """Compacta o buffer (bytes ou mmap) em blocos, sem copiar a entrada."""
+    compressor = zlib.compressobj(nivel)
+    view = memoryview(buf)
+    partes = []
+    try:
+        for inicio in range(0, len(view), tamanho_bloco):
+            partes.append(compressor.compress(view[inicio:inicio + tamanho_bloco]))
+    finally:
+        view.release()
+    partes.append(compressor.flush())
+    return b"".join(partes)
+
+def ler_conteudo(documento):
+    """Devolve o HTML (bytes) de um documento, descompactando se necessário."""
+    content = documento["content"]
+    if documento.get("content_encoding") == "zlib":
+        return zlib.decompress(content)
+    return bytes(content)
+
+def carregar_conteudo(caminho, compactar_conteudo=COMPACTAR, validar=VALIDAR_UTF8):
+    """
+    Caminho de ingestão somente em bytes: devolve (content, content_encoding)
+    prontos para o modelo. Com compactação, o arquivo é mapeado e entregue
+    direto ao zlib; sem compactação, os bytes lidos vão direto para o BSON.
+    Lança ValueError para arquivo vazio ou UTF-8 inválido (se validar=True).
+    """
+    if compactar_conteudo:
+        with mapear_snapshot(caminho) as mapa:
+            if not len(mapa):
+                raise ValueError("Conteúdo HTML vazio")
+            if validar and not validar_utf8(mapa):
+                raise ValueError("Conteúdo HTML não é UTF-8 válido")
+            return compactar(mapa), "zlib"
+
+    content = ler_snapshot_bytes(caminho)
+    if not content:
+        raise ValueError("Conteúdo HTML vazio")
+    if validar and not validar_utf8(content):
+        raise ValueError("Conteúdo HTML não é UTF-8 válido")
+    return content, None
+
+# =============================
+# Medição antes/depois
+# =============================
+def _documento_antigo(caminho):
+    """Caminho antigo: leitura em texto, .encode('utf-8') e Binary(...)."""
+    from bson.binary import Binary
+
+    with open(caminho, "r", encoding="utf-8") as f:
+        html_content = f.read()
+    return {
+        "device": None,
+        "content": Binary(html_content.encode('utf-8')),
+        "timestamp": None,
+        "isAdvertisingModified": False,
+        "advertising_id_when_isModified": None,
+    }
+
+def _documento_bytes(caminho):
+    content, encoding = carregar_conteudo(caminho, compactar_conteudo=False)
+    return ArquivosDaHomeWaybackMachineModel(None, content, None, False, None, encoding).to_dict()
+
+def _documento_bytes_validado(caminho):
+    content, encoding = carregar_conteudo(caminho, compactar_conteudo=False, validar=True)
+    return ArquivosDaHomeWaybackMachineModel(None, content, None, False, None, encoding).to_dict()
+
+def _documento_mmap_zlib(caminho):
+    content, encoding = carregar_conteudo(caminho, compactar_conteudo=True)
+    return ArquivosDaHomeWaybackMachineModel(None, content, None, False, None, encoding).to_dict()
+
+MODOS_MEDICAO = {
+    "antigo_texto": _documento_antigo,
+    "bytes": _documento_bytes,
+    "bytes_validado": _documento_bytes_validado,
+    "mmap_zlib": _documento_mmap_zlib,
+}
+
+def _medir_modo(modo, caminho, repeticoes):
+    """Roda um modo dentro deste processo e imprime CPU por página e pico de RSS."""
+    import resource
+    import bson
+
+    construir = MODOS_MEDICAO[modo]
+    tamanho_bson = 0
+    cpu_inicio = time.process_time()
+    for _ in range(repeticoes):
+        # bson.encode é o que o insert_one faz com o documento
+        tamanho_bson = len(bson.encode(construir(caminho)))
+    cpu = time.process_time() - cpu_inicio
+
+    pico_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        pico_rss //= 1024  # macOS informa em bytes; Linux em KiB
+    print(json.dumps({
+        "modo": modo,
+        "cpu_ms_por_pagina": round(cpu * 1000 / repeticoes, 3),
+        "pico_rss_kib": pico_rss,
+        "tamanho_bson": tamanho_bson,
+    }))
+
+def medir(caminho, repeticoes=20):
+    """
+    Compara os modos de ingestão. Cada modo roda em um processo separado, pois o
+    pico de RSS (ru_maxrss) só cresce ao longo da vida do processo.
+    """
+    resultados = []
+    for modo in MODOS_MEDICAO:
+        saida = subprocess.run(
+            [sys.executable, __file__, "--_modo", modo, "--repeticoes", str(repeticoes), str(caminho)],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        resultados.append(json.loads(saida.stdout))
+    return resultados
+
+def main():
+    parser = argparse.ArgumentParser(description="Mede o custo de ingestão de um singlefile.html.")
+    parser.add_argument("arquivo", help="HTML de exemplo (ex.: test.remounter.html)")
+    parser.add_argument("--repeticoes", type=int, default=20)
+    parser.add_argument("--_modo", choices=list(MODOS_MEDICAO), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if not Path(args.arquivo).exists():
+        logging.error(f"Arquivo {args.arquivo} não encontrado.")
+        sys.exit(1)
+
+    if args._modo:
+        _medir_modo(args._modo, args.arquivo, args.repeticoes)
+        return
+
+    print(f"{'modo':<16}{'cpu ms/página':>15}{'pico RSS KiB':>15}{'bytes BSON':>14}")
+    for r in medir(args.arquivo, args.repeticoes):
+        print(f"{r['modo']:<16}{r['cpu_ms_por_pagina']:>15}{r['pico_rss_kib']:>15}{r['tamanho_bson']:>14}")
+
+if __name__ == "__main__":
+    main()
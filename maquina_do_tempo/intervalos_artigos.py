@@ -0,0 +1,369 @@
+"""
+Índice de intervalos: de quando a quando cada matéria esteve na home.
+
+Saber se um link esteve na home num dado momento exigia comparar capturas
+seguidas à mão. Na ingestão, os links de matéria de cada captura (na ordem
+da página: posição 1 é o primeiro) vão para ARCHIVEBOX_DIR/intervalos_artigos.sqlite3:
+
+    capturas    (original, timestamp) de cada captura registrada
+    aparicoes   (original, artigo, timestamp, posicao) de cada link em cada captura
+    intervalos  (original, artigo, inicio, fim, capturas, melhor_posicao): as
+                sequências máximas de capturas seguidas em que a matéria aparece
+
+As capturas chegam em qualquer ordem (a ordem por cobertura bissecta o
+período), então registrar uma captura entre duas já vistas pode estender um
+intervalo, juntar dois (a matéria estava nas duas vizinhas e nesta) ou partir
+um ao meio (estava nas vizinhas e não nesta). Só os intervalos que tocam as
+capturas vizinhas são lidos e alterados, numa transação BEGIN IMMEDIATE:
+vários workers e processos gravam no mesmo arquivo.
+
+Homes e matérias são guardadas pela chave_url (host sem 'www.' e caminho):
+as variações de esquema e host do CDX caem na mesma chave, e as consultas
+aceitam a URL em qualquer dessas formas. Os tempos ficam em segundos desde a
+época e saem como YYYYMMDDhhmmss. O
+início e o fim de um intervalo são as capturas em que a matéria foi vista;
+'ausente_antes' e 'ausente_depois' são as capturas vizinhas em que ela já
+não estava (a entrada e a saída reais ficam entre as duas).
+
+    python -m maquina_do_tempo.intervalos_artigos artigo https://www.poder360.com.br/governo/.../
+    python -m maquina_do_tempo.intervalos_artigos momento 20210315120000
+    python -m maquina_do_tempo.intervalos_artigos indexar-mongo      # capturas já gravadas no MongoDB
+"""
+import argparse
+import logging
+import re
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from urllib.parse import urlsplit
+
+from . import config
+from .agendamento import _segundos
+from .html_texto import links, remover_invisivel
+from .metricas import METRICAS
+
+# =============================
+# Configurações e Constantes
+# =============================
+INTERVALOS_NAME = "intervalos_artigos.sqlite3"
+TEMPO_ESPERA_TRAVA = 30  # segundos (busy_timeout) com outros processos gravando
+
+# Caminho de matéria: seção e slug com pelo menos três palavras (fora tags, autores, paginação...)
+PADRAO_ARTIGO = re.compile(r"^/(?!(?:tag|tags|autor|author|categoria|category|page|busca|search)/)"
+                           r"[\w-]+/(?:[\w-]+/)*[\w]+-[\w]+-[\w-]+/?$")
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS capturas (
+    original TEXT NOT NULL,
+    timestamp INTEGER NOT NULL,
+    PRIMARY KEY (original, timestamp)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS artigos (
+    id INTEGER PRIMARY KEY,
+    url TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS aparicoes (
+    original TEXT NOT NULL,
+    artigo INTEGER NOT NULL,
+    timestamp INTEGER NOT NULL,
+    posicao INTEGER NOT NULL,
+    PRIMARY KEY (original, artigo, timestamp)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS aparicoes_por_captura ON aparicoes (original, timestamp);
+CREATE TABLE IF NOT EXISTS intervalos (
+    id INTEGER PRIMARY KEY,
+    original TEXT NOT NULL,
+    artigo INTEGER NOT NULL,
+    inicio INTEGER NOT NULL,
+    fim INTEGER NOT NULL,
+    capturas INTEGER NOT NULL,
+    melhor_posicao INTEGER NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS intervalos_por_artigo ON intervalos (original, artigo, inicio);
+CREATE INDEX IF NOT EXISTS intervalos_por_fim ON intervalos (original, artigo, fim);
+"""
+
+def _wayback(segundos):
+    return datetime.fromtimestamp(segundos, timezone.utc).strftime("%Y%m%d%H%M%S")
+
+def _host(url):
+    host = (urlsplit(url).hostname or "").lower()
+    return host[4:] if host.startswith("www.") else host
+
+def chave_url(url):
+    """
+    Chave de uma URL no índice: host sem 'www.' e caminho, sem esquema, query
+    nem fragmento ('https://www.poder360.com.br/governo/x/?a=1' vira
+    'poder360.com.br/governo/x/'), para que as variações do CDX coincidam.
+    """
+    partes = urlsplit(url if "//" in url else "//" + url)
+    return _host(f"//{partes.netloc}") + partes.path
+
+def chave_original(url):
+    return chave_url(url).rstrip("/")
+
+def extrair_artigos(html, original):
+    """
+    Chaves (chave_url, com a barra final) das matérias linkadas na home
+    'original', sem repetição, na ordem em que aparecem pela primeira vez.
+    """
+    host = _host(original)
+    artigos = []
+    vistos = set()
+    for alvo in links(remover_invisivel(html)):
+        if alvo.startswith("//"):
+            alvo = "https:" + alvo
+        partes = urlsplit(alvo)
+        if partes.scheme not in ("", "http", "https"):
+            continue
+        destino = _host(alvo) or host
+        if destino != host or not PADRAO_ARTIGO.match(partes.path):
+            continue
+        caminho = partes.path if partes.path.endswith("/") else partes.path + "/"
+        url = host + caminho
+        if url not in vistos:
+            vistos.add(url)
+            artigos.append(url)
+    return artigos
+
+class IndiceIntervalos:
+    """Índice de intervalos de uma instalação. Thread-safe (uma conexão, com lock)."""
+    def __init__(self, caminho):
+        self.caminho = Path(caminho)
+        self.caminho.parent.mkdir(parents=True, exist_ok=True)
+        self._conexao = sqlite3.connect(self.caminho, timeout=TEMPO_ESPERA_TRAVA, check_same_thread=False,
+                                        isolation_level=None)
+        self._conexao.execute("PRAGMA journal_mode=WAL")
+        self._conexao.execute("PRAGMA synchronous=NORMAL")
+        self._conexao.executescript(_ESQUEMA)
+        self._lock = threading.Lock()
+
+    def fechar(self):
+        with self._lock:
+            self._conexao.close()
+
+    # -----------------------------
+    # Registro
+    # -----------------------------
+    def _id_artigo(self, url):
+        self._conexao.execute("INSERT OR IGNORE INTO artigos (url) VALUES (?)", (url,))
+        return self._conexao.execute("SELECT id FROM artigos WHERE url = ?", (url,)).fetchone()[0]
+
+    def _contar(self, original, artigo, inicio, fim):
+        """(capturas, melhor posição) da matéria entre 'inicio' e 'fim'."""
+        return self._conexao.execute(
+            "SELECT count(*), min(posicao) FROM aparicoes WHERE original = ? AND artigo = ? "
+            "AND timestamp BETWEEN ? AND ?", (original, artigo, inicio, fim)).fetchone()
+
+    def _partir(self, original, anterior, seguinte, presentes):
+        """Parte os intervalos que atravessam a nova captura e não a incluem (a matéria saiu e voltou)."""
+        linhas = self._conexao.execute(
+            "SELECT i.id, i.artigo, i.inicio, i.fim FROM aparicoes a JOIN intervalos i "
+            "ON i.original = a.original AND i.artigo = a.artigo AND i.inicio <= ? AND i.fim >= ? "
+            "WHERE a.original = ? AND a.timestamp = ?", (anterior, seguinte, original, anterior)).fetchall()
+        for id_intervalo, artigo, inicio, fim in linhas:
+            if artigo in presentes:
+                continue
+            capturas, melhor = self._contar(original, artigo, inicio, anterior)
+            self._conexao.execute("UPDATE intervalos SET fim = ?, capturas = ?, melhor_posicao = ? WHERE id = ?",
+                                  (anterior, capturas, melhor, id_intervalo))
+            capturas, melhor = self._contar(original, artigo, seguinte, fim)
+            self._conexao.execute(
+                "INSERT INTO intervalos (original, artigo, inicio, fim, capturas, melhor_posicao) "
+                "VALUES (?, ?, ?, ?, ?, ?)", (original, artigo, seguinte, fim, capturas, melhor))
+            METRICAS.contar("intervalos_partidos_total")
+
+    def _estender(self, original, artigo, segundos, posicao, anterior, seguinte):
+        """Inclui a captura no intervalo da matéria: estende, junta dois ou abre um novo."""
+        antes = depois = None
+        if anterior is not None:
+            antes = self._conexao.execute(
+                "SELECT id, inicio, fim, capturas, melhor_posicao FROM intervalos "
+                "WHERE original = ? AND artigo = ? AND fim >= ? ORDER BY fim LIMIT 1",
+                (original, artigo, anterior)).fetchone()
+            if antes is not None and antes[1] > anterior:
+                antes = None
+        if antes is not None and seguinte is not None and antes[2] >= seguinte:
+            # Já atravessava a captura (estava nas duas vizinhas): só a contagem muda
+            self._conexao.execute("UPDATE intervalos SET capturas = capturas + 1, "
+                                  "melhor_posicao = min(melhor_posicao, ?) WHERE id = ?", (posicao, antes[0]))
+            return
+        if seguinte is not None:
+            depois = self._conexao.execute(
+                "SELECT id, inicio, fim, capturas, melhor_posicao FROM intervalos "
+                "WHERE original = ? AND artigo = ? AND inicio = ?", (original, artigo, seguinte)).fetchone()
+        if antes is not None and depois is not None:
+            self._conexao.execute("DELETE FROM intervalos WHERE id = ?", (depois[0],))
+            self._conexao.execute("UPDATE intervalos SET fim = ?, capturas = ?, melhor_posicao = ? WHERE id = ?",
+                                  (depois[2], antes[3] + depois[3] + 1, min(antes[4], depois[4], posicao), antes[0]))
+            METRICAS.contar("intervalos_unidos_total")
+        elif antes is not None:
+            self._conexao.execute("UPDATE intervalos SET fim = ?, capturas = capturas + 1, "
+                                  "melhor_posicao = min(melhor_posicao, ?) WHERE id = ?",
+                                  (segundos, posicao, antes[0]))
+        elif depois is not None:
+            self._conexao.execute("UPDATE intervalos SET inicio = ?, capturas = capturas + 1, "
+                                  "melhor_posicao = min(melhor_posicao, ?) WHERE id = ?",
+                                  (segundos, posicao, depois[0]))
+        else:
+            self._conexao.execute(
+                "INSERT INTO intervalos (original, artigo, inicio, fim, capturas, melhor_posicao) "
+                "VALUES (?, ?, ?, ?, 1, ?)", (original, artigo, segundos, segundos, posicao))
+
+    def registrar(self, timestamp, original, artigos):
+        """
+        Registra as matérias ('artigos', na ordem da página) de uma captura e
+        atualiza os intervalos. Devolve False se a captura já estava no índice.
+        """
+        segundos = _segundos(timestamp)
+        original = chave_original(original)
+        with self._lock:
+            self._conexao.execute("BEGIN IMMEDIATE")
+            try:
+                if self._conexao.execute("SELECT 1 FROM capturas WHERE original = ? AND timestamp = ?",
+                                         (original, segundos)).fetchone():
+                    self._conexao.execute("ROLLBACK")
+                    return False
+                anterior = self._conexao.execute("SELECT max(timestamp) FROM capturas WHERE original = ? "
+                                                 "AND timestamp < ?", (original, segundos)).fetchone()[0]
+                seguinte = self._conexao.execute("SELECT min(timestamp) FROM capturas WHERE original = ? "
+                                                 "AND timestamp > ?", (original, segundos)).fetchone()[0]
+                self._conexao.execute("INSERT INTO capturas (original, timestamp) VALUES (?, ?)",
+                                      (original, segundos))
+                presentes = {}
+                for posicao, url in enumerate(artigos, start=1):
+                    presentes.setdefault(self._id_artigo(url), posicao)
+                self._conexao.executemany(
+                    "INSERT INTO aparicoes (original, artigo, timestamp, posicao) VALUES (?, ?, ?, ?)",
+                    [(original, artigo, segundos, posicao) for artigo, posicao in presentes.items()])
+                if anterior is not None and seguinte is not None:
+                    self._partir(original, anterior, seguinte, presentes)
+                for artigo, posicao in presentes.items():
+                    self._estender(original, artigo, segundos, posicao, anterior, seguinte)
+                self._conexao.execute("COMMIT")
+            except BaseException:
+                self._conexao.execute("ROLLBACK")
+                raise
+        METRICAS.contar("intervalos_capturas_total")
+        return True
+
+    def registrar_arquivo(self, timestamp, original, caminho):
+        with METRICAS.tempo("intervalos_indexacao"):
+            return self.registrar(timestamp, original, extrair_artigos(Path(caminho).read_bytes(), original))
+
+    # -----------------------------
+    # Consultas
+    # -----------------------------
+    def _vizinha(self, original, segundos, antes):
+        sql = ("SELECT max(timestamp) FROM capturas WHERE original = ? AND timestamp < ?" if antes else
+               "SELECT min(timestamp) FROM capturas WHERE original = ? AND timestamp > ?")
+        valor = self._conexao.execute(sql, (original, segundos)).fetchone()[0]
+        return _wayback(valor) if valor is not None else None
+
+    def artigo(self, url, original=None):
+        """Intervalos em que a matéria (URL em qualquer forma) esteve na home, do mais antigo para o mais novo."""
+        sql = ["SELECT i.original, i.inicio, i.fim, i.capturas, i.melhor_posicao FROM intervalos i",
+               "JOIN artigos a ON a.id = i.artigo WHERE a.url = ?"]
+        parametros = [chave_url(url)]
+        if original is not None:
+            sql.append("AND i.original = ?")
+            parametros.append(chave_original(original))
+        sql.append("ORDER BY i.inicio")
+        with self._lock:
+            linhas = self._conexao.execute(" ".join(sql), parametros).fetchall()
+            return [{"original": orig, "inicio": _wayback(inicio), "fim": _wayback(fim), "capturas": capturas,
+                     "melhor_posicao": melhor, "ausente_antes": self._vizinha(orig, inicio, True),
+                     "ausente_depois": self._vizinha(orig, fim, False)}
+                    for orig, inicio, fim, capturas, melhor in linhas]
+
+    def posicoes(self, url, original):
+        """(timestamp, posição) da matéria em cada captura em que apareceu."""
+        with self._lock:
+            linhas = self._conexao.execute(
+                "SELECT p.timestamp, p.posicao FROM aparicoes p JOIN artigos a ON a.id = p.artigo "
+                "WHERE a.url = ? AND p.original = ? ORDER BY p.timestamp",
+                (chave_url(url), chave_original(original))).fetchall()
+        return [(_wayback(segundos), posicao) for segundos, posicao in linhas]
+
+    def momento(self, timestamp, original):
+        """
+        Matérias na home no instante 'timestamp' (a última captura até ele),
+        na ordem da página, com o intervalo de cada uma. Devolve
+        (timestamp da captura usada, lista) ou (None, []) sem captura anterior.
+        """
+        segundos = _segundos(timestamp)
+        original = chave_original(original)
+        with self._lock:
+            captura = self._conexao.execute("SELECT max(timestamp) FROM capturas WHERE original = ? "
+                                            "AND timestamp <= ?", (original, segundos)).fetchone()[0]
+            if captura is None:
+                return None, []
+            linhas = self._conexao.execute(
+                "SELECT a.url, p.posicao, i.inicio, i.fim FROM aparicoes p "
+                "JOIN artigos a ON a.id = p.artigo "
+                "JOIN intervalos i ON i.original = p.original AND i.artigo = p.artigo "
+                "AND i.inicio <= p.timestamp AND i.fim >= p.timestamp "
+                "WHERE p.original = ? AND p.timestamp = ? ORDER BY p.posicao", (original, captura)).fetchall()
+        return _wayback(captura), [{"url": url, "posicao": posicao, "inicio": _wayback(inicio), "fim": _wayback(fim)}
+                                   for url, posicao, inicio, fim in linhas]
+
+    def __len__(self):
+        with self._lock:
+            return self._conexao.execute("SELECT count(*) FROM capturas").fetchone()[0]
+
+def indexar_mongo(indice, colecao, original, lote=200):
+    """Registra os documentos já gravados no MongoDB (os já registrados são pulados). Devolve quantos entraram."""
+    from .ingestao import ler_conteudo
+    novos = 0
+    for documento in colecao.find({}, {"content": 1, "content_encoding": 1, "timestamp": 1}, batch_size=lote):
+        if "content" not in documento:
+            continue  # quase duplicata gravada sem o conteúdo
+        timestamp = documento["timestamp"].strftime("%Y%m%d%H%M%S")
+        novos += indice.registrar(timestamp, original, extrair_artigos(ler_conteudo(documento), original))
+    return novos
+
+def main():
+    parser = argparse.ArgumentParser(description="Intervalos em que cada matéria esteve na home.")
+    parser.add_argument("--indice", default=str(Path(config.ARCHIVEBOX_DIR) / INTERVALOS_NAME))
+    parser.add_argument("--original", default="https://www.poder360.com.br/",
+                        help="URL original da home (a coleção do MongoDB não a guarda)")
+    sub = parser.add_subparsers(dest="comando", required=True)
+    artigo = sub.add_parser("artigo", help="Intervalos de uma matéria")
+    artigo.add_argument("url")
+    artigo.add_argument("--posicoes", action="store_true", help="Posição em cada captura")
+    momento = sub.add_parser("momento", help="Matérias na home em um instante")
+    momento.add_argument("timestamp", help="YYYYMMDDhhmmss")
+    sub.add_parser("indexar-mongo", help="Registra as capturas já gravadas no MongoDB")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(message)s")
+
+    indice = IndiceIntervalos(args.indice)
+    inicio = time.perf_counter()
+    if args.comando == "indexar-mongo":
+        from .banco import conectarBanco, obter_colecao
+        client = conectarBanco(config.MONGODB_URI)
+        if client is None:
+            raise SystemExit(1)
+        novos = indexar_mongo(indice, obter_colecao(client), args.original)
+        print(f"{novos} capturas registradas em {time.perf_counter() - inicio:.1f} s ({len(indice)} no índice).")
+        return
+
+    if args.comando == "artigo":
+        for intervalo in indice.artigo(args.url):
+            print(f"{intervalo['inicio']} a {intervalo['fim']}  {intervalo['capturas']:>5} capturas  "
+                  f"melhor posição {intervalo['melhor_posicao']}  "
+                  f"(ausente em {intervalo['ausente_antes']} e {intervalo['ausente_depois']})")
+        if args.posicoes:
+            for timestamp, posicao in indice.posicoes(args.url, args.original):
+                print(f"  {timestamp}  {posicao}")
+    else:
+        captura, artigos = indice.momento(args.timestamp, args.original)
+        print(f"Captura de {captura}:")
+        for item in artigos:
+            print(f"{item['posicao']:>4}  {item['url']}  ({item['inicio']} a {item['fim']})")
+    logging.info(f"Consulta em {(time.perf_counter() - inicio) * 1000:.1f} ms.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+"""
+Limitador de requisições ao web.archive.org (token bucket adaptativo).
+
+Cada requisição (consulta ao CDX ou captura) consome um token. A taxa se
+ajusta sozinha: sobe devagar a cada sucesso e cai pela metade quando o Wayback
+responde 429/503, respeitando o Retry-After. Assim o pipeline converge para a
+maior taxa que não gera bloqueio, em vez de rodar sequencial por precaução.
+
+    limitador = obter_limitador()                 # um por processo
+    limitador = obter_limitador(caminho="x.db")   # compartilhado entre processos (SQLite)
+    limitador.adquirir()
+    ...
+    limitador.penalizar(resposta.headers.get("Retry-After"))  # em 429/503
+    limitador.registrar_sucesso()
+"""
+import asyncio
+import logging
+import sqlite3
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+from . import config
+from .metricas import METRICAS
+
+# Códigos que indicam bloqueio/limitação pelo Wayback
+STATUS_LIMITACAO = (429, 503)
+MARCADORES_LIMITACAO = (
+    "too many requests", "http error 429", "429 client error", "status code 429",
+    "503 service unavailable", "http error 503", "rate limit",
+)
+
+def interpretar_retry_after(valor, agora=None):
+    """Converte o cabeçalho Retry-After (segundos ou data HTTP) em segundos. None se ausente/ilegível."""
+    if valor is None:
+        return None
+    valor = str(valor).strip()
+    if valor.isdigit():
+        return float(valor)
+    try:
+        data = parsedate_to_datetime(valor)
+    except (TypeError, ValueError):
+        return None
+    agora = time.time() if agora is None else agora
+    return max(0.0, data.timestamp() - agora)
+
+def indica_limitacao(texto):
+    """True se a saída de erro de uma captura indica 429/503 do Wayback."""
+    texto = (texto or "").lower()
+    return any(marcador in texto for marcador in MARCADORES_LIMITACAO)
+
+class _Estado:
+    """
+    Estado do bucket e suas transições, sem sincronização (quem chama cuida do
+    lock ou da transação). Tempos em time.time(), para valer entre processos.
+    """
+    def __init__(self, tokens, atualizado_em, taxa, pausado_ate=0.0, penalidades=0):
+        self.tokens = tokens
+        self.atualizado_em = atualizado_em
+        self.taxa = taxa
+        self.pausado_ate = pausado_ate
+        self.penalidades = penalidades
+
+    def reabastecer(self, agora, capacidade):
+        if agora > self.atualizado_em:
+            self.tokens = min(capacidade, self.tokens + (agora - self.atualizado_em) * self.taxa)
+            self.atualizado_em = agora
+
+    def consumir(self, agora, capacidade, tokens=1):
+        """Consome se possível. Devolve 0 em caso de sucesso ou os segundos até haver tokens."""
+        if agora < self.pausado_ate:
+            return self.pausado_ate - agora
+        self.reabastecer(agora, capacidade)
+        if self.tokens >= tokens:
+            self.tokens -= tokens
+            return 0.0
+        return (tokens - self.tokens) / self.taxa
+
+    def penalizar(self, agora, retry_after, taxa_minima):
+        if agora < self.pausado_ate:
+            # Requisições que estavam em voo no mesmo bloqueio: só estendem a pausa
+            if retry_after is not None:
+                self.pausado_ate = max(self.pausado_ate, agora + retry_after)
+                self.atualizado_em = self.pausado_ate
+            return
+        self.penalidades += 1
+        self.taxa = max(taxa_minima, self.taxa / 2)
+        # Sem Retry-After: espera exponencial limitada a 5 minutos
+        espera = retry_after if retry_after is not None else min(300.0, 2.0 ** min(self.penalidades, 8))
+        self.pausado_ate = max(self.pausado_ate, agora + espera)
+        self.tokens = 0.0
+        self.atualizado_em = max(agora, self.pausado_ate)
+
+    def registrar_sucesso(self, taxa_maxima, incremento):
+        self.penalidades = 0
+        self.taxa = min(taxa_maxima, self.taxa + incremento)
+
+class TokenBucket:
+    """Token bucket adaptativo para as threads de um processo."""
+    def __init__(self, taxa=config.WAYBACK_TAXA_INICIAL, capacidade=config.WAYBACK_CAPACIDADE,
+                 taxa_minima=config.WAYBACK_TAXA_MINIMA, taxa_maxima=config.WAYBACK_TAXA_MAXIMA,
+                 incremento=config.WAYBACK_INCREMENTO):
+        self.capacidade = capacidade
+        self.taxa_minima = taxa_minima
+        self.taxa_maxima = taxa_maxima
+        self.incremento = incremento
+        self._estado = _Estado(capacidade, time.time(), taxa)
+        self._lock = threading.Lock()
+        METRICAS.registrar_gauge("wayback_taxa", lambda: self.taxa)
+
+    @property
+    def taxa(self):
+        return self._estado.taxa
+
+    def _tentar(self, tokens):
+        with self._lock:
+            return self._estado.consumir(time.time(), self.capacidade, tokens)
+
+    def tentar_adquirir(self, tokens=1):
+        return self._tentar(tokens) == 0.0
+
+    def adquirir(self, tokens=1, timeout=None):
+        """Bloqueia até haver tokens. Retorna False se o timeout expirar."""
+        inicio = time.monotonic()
+        while True:
+            espera = self._tentar(tokens)
+            if espera == 0.0:
+                METRICAS.observar("espera_limitador", time.monotonic() - inicio)
+                return True
+            if timeout is not None:
+                restante = timeout - (time.monotonic() - inicio)
+                if restante <= 0:
+                    return False
+                espera = min(espera, restante)
+            time.sleep(min(espera, 1.0))
+
+    async def adquirir_async(self, tokens=1):
+        inicio = time.monotonic()
+        while True:
+            espera = self._tentar(tokens)
+            if espera == 0.0:
+                METRICAS.observar("espera_limitador", time.monotonic() - inicio)
+                return True
+            await asyncio.sleep(min(espera, 1.0))
+
+    def penalizar(self, retry_after=None):
+        """Reage a um 429/503: pausa (Retry-After) e corta a taxa pela metade."""
+        segundos = interpretar_retry_after(retry_after)
+        with self._lock:
+            self._estado.penalizar(time.time(), segundos, self.taxa_minima)
+            taxa, pausa = self._estado.taxa, self._estado.pausado_ate - time.time()
+        METRICAS.retry("wayback", "limitacao")
+        logging.warning(f"Wayback limitou as requisições: pausa de {pausa:.0f} s, taxa reduzida para {taxa:.3f} req/s.")
+
+    def registrar_sucesso(self):
+        with self._lock:
+            self._estado.registrar_sucesso(self.taxa_maxima, self.incremento)
+
+class TokenBucketSQLite(TokenBucket):
+    """
+    Mesmo bucket, com o estado em um arquivo SQLite para ser dividido entre
+    processos (engine de processos ou várias execuções na mesma máquina).
+    Cada operação é uma transação BEGIN IMMEDIATE curta.
+    """
+    def __init__(self, caminho, taxa=config.WAYBACK_TAXA_INICIAL, capacidade=config.WAYBACK_CAPACIDADE,
+                 taxa_minima=config.WAYBACK_TAXA_MINIMA, taxa_maxima=config.WAYBACK_TAXA_MAXIMA,
+                 incremento=config.WAYBACK_INCREMENTO):
+        super().__init__(taxa, capacidade, taxa_minima, taxa_maxima, incremento)
+        self.caminho = str(caminho)
+        self._local = threading.local()
+        with self._transacao() as cur:
+            cur.execute(
+                "CREATE TABLE IF NOT EXISTS bucket (id INTEGER PRIMARY KEY CHECK (id = 1), tokens REAL, "
+                "atualizado_em REAL, taxa REAL, pausado_ate REAL, penalidades INTEGER)"
+            )
+            cur.execute(
+                "INSERT OR IGNORE INTO bucket VALUES (1, ?, ?, ?, 0, 0)",
+                (capacidade, time.time(), taxa),
+            )
+
+    def _conexao(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.caminho, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    class _Transacao:
+        def __init__(self, conn):
+            self.conn = conn
+
+        def __enter__(self):
+            self.conn.execute("BEGIN IMMEDIATE")
+            return self.conn.cursor()
+
+        def __exit__(self, tipo, *exc):
+            self.conn.execute("ROLLBACK" if tipo else "COMMIT")
+
+    def _transacao(self):
+        return self._Transacao(self._conexao())
+
+    def _alterar(self, operacao):
+        with self._transacao() as cur:
+            linha = cur.execute(
+                "SELECT tokens, atualizado_em, taxa, pausado_ate, penalidades FROM bucket WHERE id = 1"
+            ).fetchone()
+            estado = _Estado(*linha)
+            resultado = operacao(estado)
+            cur.execute(
+                "UPDATE bucket SET tokens = ?, atualizado_em = ?, taxa = ?, pausado_ate = ?, penalidades = ? "
+                "WHERE id = 1",
+                (estado.tokens, estado.atualizado_em, estado.taxa, estado.pausado_ate, estado.penalidades),
+            )
+        self._estado = estado  # cópia local, só para leitura (gauge/logs)
+        return resultado
+
+    def _tentar(self, tokens):
+        return self._alterar(lambda e: e.consumir(time.time(), self.capacidade, tokens))
+
+    def penalizar(self, retry_after=None):
+        segundos = interpretar_retry_after(retry_after)
+        self._alterar(lambda e: e.penalizar(time.time(), segundos, self.taxa_minima))
+        METRICAS.retry("wayback", "limitacao")
+        logging.warning(
+            f"Wayback limitou as requisições: pausa até {time.strftime('%H:%M:%S', time.localtime(self._estado.pausado_ate))}, "
+            f"taxa reduzida para {self._estado.taxa:.3f} req/s (compartilhado)."
+        )
+
+    def registrar_sucesso(self):
+        self._alterar(lambda e: e.registrar_sucesso(self.taxa_maxima, self.incremento))
+
+# Um limitador por processo e por arquivo de estado
+_LIMITADORES = {}
+_LOCK_LIMITADORES = threading.Lock()
+
+def obter_limitador(caminho=None, taxa=config.WAYBACK_TAXA_INICIAL):
+    """Limitador global do processo (caminho=None) ou o compartilhado via SQLite em 'caminho'."""
+    chave = str(caminho) if caminho else None
+    with _LOCK_LIMITADORES:
+        limitador = _LIMITADORES.get(chave)
+        if limitador is None:
+            limitador = TokenBucketSQLite(caminho, taxa) if caminho else TokenBucket(taxa)
+            _LIMITADORES[chave] = limitador
+        return limitador
+
+def redefinir_limitadores():
+    """
+    Esquece os limitadores do processo. Chamado no worker da engine de
+    processos: com fork ele herdaria os do pai, inclusive a conexão SQLite
+    (thread-local) do TokenBucketSQLite, que não pode ser usada em dois processos.
+    """
+    global _LOCK_LIMITADORES
+    _LIMITADORES.clear()
+    _LOCK_LIMITADORES = threading.Lock()
@@ -0,0 +1,228 @@
+import ctypes
+import ctypes.util
+import logging
+import os
+import queue
+import shutil
+import sys
+import threading
+import time
+from pathlib import Path
+from .metricas import METRICAS
+
+# =============================
+# Configurações e Constantes
+# =============================
+# Abaixo deste espaço livre em ARCHIVEBOX_DIR/archive as novas capturas esperam
+ESPACO_LIVRE_MINIMO = 5 * 1024 ** 3  # 5 GiB
+
+# Quantos diretórios o reaper acumula antes de apagar, e quanto espera por mais
+TAMANHO_LOTE = 32
+INTERVALO_LOTE = 2.0  # segundos
+
+# Limite de diretórios aguardando remoção; acima disso a captura também espera
+MAX_PENDENTES = 500
+
+def _baixar_prioridade_io():
+    """
+    Coloca a thread atual em prioridade baixa de CPU e de IO (melhor esforço).
+    Linux: nice 19 e ioprio IDLE para a thread. macOS: política de IO THROTTLE.
+    """
+    tid = threading.get_native_id()
+    if sys.platform.startswith("linux"):
+        try:
+            # No Linux, setpriority com PRIO_PROCESS e o tid afeta só a thread
+            os.setpriority(os.PRIO_PROCESS, tid, 19)
+        except OSError:
+            pass
+
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        if sys.platform.startswith("linux"):
+            SYS_ioprio_set = {"x86_64": 251, "aarch64": 30}.get(os.uname().machine)
+            if SYS_ioprio_set is not None:
+                IOPRIO_WHO_PROCESS = 1
+                IOPRIO_CLASS_IDLE = 3
+                libc.syscall(SYS_ioprio_set, IOPRIO_WHO_PROCESS, tid, IOPRIO_CLASS_IDLE << 13)
+        elif sys.platform == "darwin":
+            IOPOL_TYPE_DISK = 0
+            IOPOL_SCOPE_THREAD = 1
+            IOPOL_THROTTLE = 3
+            libc.setiopolicy_np(IOPOL_TYPE_DISK, IOPOL_SCOPE_THREAD, IOPOL_THROTTLE)
+    except (OSError, AttributeError, TypeError):
+        logging.debug("Não foi possível reduzir a prioridade de IO do reaper.")
+
+def espaco_livre(caminho):
+    """Espaço livre (bytes) no sistema de arquivos que contém 'caminho' (ou o ancestral existente)."""
+    caminho = Path(caminho)
+    while not caminho.exists() and caminho != caminho.parent:
+        caminho = caminho.parent
+    return shutil.disk_usage(caminho).free
+
+class ReaperSnapshots:
+    """
+    Remove os diretórios de snapshot em segundo plano, em lotes e com prioridade
+    baixa de IO, e aplica backpressure na captura quando o disco está cheio.
+
+    Uso:
+        reaper = ReaperSnapshots(Path(ARCHIVEBOX_DIR) / "archive")
+        reaper.iniciar()
+        reaper.aguardar_espaco()   # antes de cada captura
+        reaper.agendar(snapshot_dir)  # no lugar de shutil.rmtree(snapshot_dir)
+        reaper.parar()
+    """
+    def __init__(self, archive_dir, espaco_livre_minimo=ESPACO_LIVRE_MINIMO,
+                 tamanho_lote=TAMANHO_LOTE, intervalo_lote=INTERVALO_LOTE,
+                 max_pendentes=MAX_PENDENTES, error_log=None):
+        self.archive_dir = Path(archive_dir)
+        self.espaco_livre_minimo = espaco_livre_minimo
+        self.tamanho_lote = tamanho_lote
+        self.intervalo_lote = intervalo_lote
+        self.max_pendentes = max_pendentes
+        self.error_log = Path(error_log) if error_log else None
+
+        self._fila = queue.Queue()
+        self._urgente = threading.Event()
+        self._progresso = threading.Condition()
+        self._thread = None
+        self.removidos = 0
+        self.falhas = 0
+        self.tempo_em_espera = 0.0
+        METRICAS.registrar_gauge("limpeza_pendentes", self._fila.qsize)
+
+    # ---------- ciclo de vida ----------
+    def iniciar(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._executar, name="reaper-snapshots", daemon=True)
+            self._thread.start()
+        return self
+
+    def parar(self, esperar=True):
+        """Remove o que estiver pendente e encerra a thread."""
+        if self._thread is None:
+            return
+        self._fila.put(None)
+        self._urgente.set()
+        if esperar:
+            self._thread.join()
+        self._thread = None
+
+    def __enter__(self):
+        return self.iniciar()
+
+    def __exit__(self, *exc):
+        self.parar()
+
+    # ---------- API usada pelo pipeline ----------
+    def agendar(self, snapshot_dir):
+        """Enfileira o diretório para remoção; não bloqueia o worker."""
+        self._fila.put(Path(snapshot_dir))
+
+    @property
+    def pendentes(self):
+        return self._fila.qsize()
+
+    def disco_ok(self):
+        return espaco_livre(self.archive_dir) >= self.espaco_livre_minimo
+
+    def aguardar_espaco(self, timeout=None):
+        """
+        Bloqueia a etapa de captura enquanto o espaço livre estiver abaixo do mínimo
+        ou houver remoções demais pendentes. Retorna True se pode seguir, False se
+        o timeout expirou.
+        """
+        if self.disco_ok() and self.pendentes < self.max_pendentes:
+            return True
+
+        inicio = time.monotonic()
+        avisou = False
+        while True:
+            livre = espaco_livre(self.archive_dir)
+            if livre >= self.espaco_livre_minimo and self.pendentes < self.max_pendentes:
+                self.tempo_em_espera += time.monotonic() - inicio
+                METRICAS.observar("backpressure_disco", time.monotonic() - inicio)
+                if avisou:
+                    logging.info("Espaço em disco recuperado; capturas retomadas.")
+                return True
+
+            if not avisou:
+                logging.warning(
+                    f"Backpressure: {livre / 1024 ** 3:.2f} GiB livres em {self.archive_dir} "
+                    f"(mínimo {self.espaco_livre_minimo / 1024 ** 3:.2f} GiB), "
+                    f"{self.pendentes} diretórios pendentes. Captura em espera."
+                )
+                avisou = True
+
+            # Pede ao reaper para não esperar o lote encher
+            self._urgente.set()
+            restante = None if timeout is None else timeout - (time.monotonic() - inicio)
+            if restante is not None and restante <= 0:
+                self.tempo_em_espera += time.monotonic() - inicio
+                return False
+            with self._progresso:
+                self._progresso.wait(timeout=min(5.0, restante) if restante is not None else 5.0)
+
+    # ---------- thread de remoção ----------
+    def _coletar_lote(self):
+        """Espera o primeiro item e junta mais até encher o lote ou estourar o intervalo."""
+        lote = []
+        item = self._fila.get()
+        if item is None:
+            return lote, True
+        lote.append(item)
+
+        limite = time.monotonic() + self.intervalo_lote
+        while len(lote) < self.tamanho_lote and not self._urgente.is_set():
+            restante = limite - time.monotonic()
+            if restante <= 0:
+                break
+            try:
+                item = self._fila.get(timeout=restante)
+            except queue.Empty:
+                break
+            if item is None:
+                return lote, True
+            lote.append(item)
+        return lote, False
+
+    def _remover(self, snapshot_dir):
+        try:
+            with METRICAS.tempo("limpeza"):
+                shutil.rmtree(snapshot_dir)
+            self.removidos += 1
+            METRICAS.sucesso("limpeza")
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            self.falhas += 1
+            METRICAS.falha("limpeza", e)
+            error_message = f"Erro ao remover {snapshot_dir}: {e}\n"
+            logging.error(error_message)
+            if self.error_log:
+                with open(self.error_log, 'a', encoding='utf-8') as ef:
+                    ef.write(error_message)
+
+    def _executar(self):
+        _baixar_prioridade_io()
+        encerrar = False
+        while not encerrar:
+            lote, encerrar = self._coletar_lote()
+            if encerrar:
+                # Esvazia o que sobrou na fila antes de sair
+                while True:
+                    try:
+                        item = self._fila.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is not None:
+                        lote.append(item)
+
+            for snapshot_dir in lote:
+                self._remover(snapshot_dir)
+            if lote:
+                logging.debug(f"Reaper removeu {len(lote)} diretórios ({self.pendentes} pendentes).")
+
+            if self.pendentes == 0:
+                self._urgente.clear()
+            with self._progresso:
+                self._progresso.notify_all()
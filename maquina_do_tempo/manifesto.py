@@ -0,0 +1,326 @@
+"""
+Manifesto binário das capturas: timestamps já convertidos, URLs originais
+internadas e um byte de status, em arrays do NumPy mapeados em memória.
+
+Uma lista de URLs do Wayback em texto vira milhões de strings Python, e cada
+worker volta a extrair e converter o timestamp. O manifesto é um diretório:
+
+    capturas.npy    array estruturado, uma linha por captura:
+                    timestamp int64 (YYYYMMDDhhmmss), original uint32 (índice
+                    em originais.txt), prefixo e modo uint8 (índices em
+                    meta.json) e status uint8
+    originais.txt   URLs originais distintas, uma por linha
+    meta.json       versão, prefixos ("http://web.archive.org") e modos ("if_")
+
+Abrir é um np.load(mmap_mode=...): instantâneo para qualquer tamanho, e só as
+páginas usadas são lidas. Filtros, ordenação e intervalos de datas são
+operações vetorizadas sobre os arrays; a URL completa só é montada para as
+capturas selecionadas.
+
+    python -m maquina_do_tempo.manifesto criar urls.txt capturas.manifesto
+    python -m maquina_do_tempo.manifesto listar capturas.manifesto --status pendente --de 2020 --ate 2021
+    python -m maquina_do_tempo capturas.manifesto     # processa as pendentes e atualiza o status
+
+Depende do 'numpy' (pip install numpy).
+"""
+import argparse
+import json
+import re
+import sys
+from pathlib import Path
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# =============================
+# Configurações e Constantes
+# =============================
+VERSAO = 1
+PENDENTE, SUCESSO, FALHA, PERMANENTE = 0, 1, 2, 3
+STATUS = {"pendente": PENDENTE, "sucesso": SUCESSO, "falha": FALHA, "permanente": PERMANENTE}
+CAMPOS = [("timestamp", "<i8"), ("original", "<u4"), ("prefixo", "u1"), ("modo", "u1"), ("status", "u1")]
+
+_URL_WAYBACK = re.compile(rb"^[ \t]*(https?://[^/\s]+)/web/(\d{14})([a-z]{2}_)?/(\S+)[ \t\r]*$", re.M)
+
+def _exigir_numpy():
+    if np is None:
+        raise RuntimeError("O manifesto precisa do pacote 'numpy' (pip install numpy; ver requirements-extras.txt).")
+
+def _internar(valores, tabela, indices):
+    """Índice de cada valor em 'tabela', acrescentando os novos (indices: {valor: índice})."""
+    saida = []
+    for valor in valores:
+        i = indices.get(valor)
+        if i is None:
+            i = indices[valor] = len(tabela)
+            tabela.append(valor)
+        saida.append(i)
+    return saida
+
+def timestamp_para_limite(valor, fim=False):
+    """'2020', '202003' ou '20200315' (ou um int) -> timestamp de 14 dígitos do início ou do fim do período."""
+    texto = str(valor)
+    if not texto.isdigit() or len(texto) > 14 or len(texto) % 2:
+        raise ValueError(f"Timestamp inválido: {valor}")
+    return int(texto.ljust(14, "9" if fim else "0"))
+
+def para_datetime64(timestamps):
+    """Timestamps YYYYMMDDhhmmss (int64) como datetime64[s] (UTC), sem passar por strings."""
+    ano, resto = np.divmod(np.asarray(timestamps, dtype=np.int64), 10 ** 10)
+    mes, resto = np.divmod(resto, 10 ** 8)
+    dia, resto = np.divmod(resto, 10 ** 6)
+    hora, resto = np.divmod(resto, 10 ** 4)
+    minuto, segundo = np.divmod(resto, 100)
+    meses = (ano - 1970) * 12 + (mes - 1)
+    dias = meses.astype("M8[M]").astype("M8[D]") + (dia - 1).astype("m8[D]")
+    return dias.astype("M8[s]") + (hora * 3600 + minuto * 60 + segundo).astype("m8[s]")
+
+class Manifesto:
+    """
+    Capturas de um manifesto. 'capturas' é o array estruturado (CAMPOS),
+    possivelmente um memmap; originais, prefixos e modos são listas de str.
+    """
+    def __init__(self, capturas, originais, prefixos, modos, diretorio=None):
+        _exigir_numpy()
+        self.capturas = capturas
+        self.originais = originais
+        self.prefixos = prefixos
+        self.modos = modos
+        self.diretorio = Path(diretorio) if diretorio else None
+        self._ordem_chaves = None
+
+    def __len__(self):
+        return len(self.capturas)
+
+    # -----------------------------
+    # Criação e persistência
+    # -----------------------------
+    @classmethod
+    def criar(cls, urls):
+        """Monta o manifesto a partir de URLs do Wayback (str ou bytes). URLs sem timestamp de 14 dígitos são ignoradas."""
+        _exigir_numpy()
+        texto = b"\n".join(u.encode("utf-8") if isinstance(u, str) else u for u in urls)
+        return cls._de_bytes(texto)
+
+    @classmethod
+    def de_arquivo(cls, caminho):
+        """Lê uma lista de URLs (uma por linha) de uma vez, sem criar uma string por linha."""
+        _exigir_numpy()
+        return cls._de_bytes(Path(caminho).read_bytes())
+
+    @classmethod
+    def _de_bytes(cls, texto):
+        partes = _URL_WAYBACK.findall(texto)
+        capturas = np.zeros(len(partes), dtype=CAMPOS)
+        if partes:
+            prefixos, timestamps, modos, originais = zip(*partes)
+            capturas["timestamp"] = np.array(timestamps, dtype="S14").astype(np.int64)
+        else:
+            prefixos = modos = originais = ()
+        tabelas = {"prefixo": [], "modo": [], "original": []}
+        for campo, valores in (("prefixo", prefixos), ("modo", modos), ("original", originais)):
+            indices = _internar(valores, tabelas[campo], {})
+            capturas[campo] = indices
+        decodificar = lambda tabela: [v.decode("utf-8", errors="replace") for v in tabela]  # noqa: E731
+        return cls(capturas, decodificar(tabelas["original"]), decodificar(tabelas["prefixo"]),
+                   decodificar(tabelas["modo"]))
+
+    @classmethod
+    def de_cdx(cls, linhas, prefixo="http://web.archive.org", modo="if_"):
+        """Monta o manifesto das linhas [timestamp, original] da API de CDX (sem o cabeçalho)."""
+        _exigir_numpy()
+        linhas = [linha for linha in linhas if len(linha) >= 2 and len(linha[0]) == 14 and linha[0].isdigit()]
+        capturas = np.zeros(len(linhas), dtype=CAMPOS)
+        originais = []
+        if linhas:
+            capturas["timestamp"] = np.array([linha[0] for linha in linhas], dtype="U14").astype(np.int64)
+            capturas["original"] = _internar((linha[1] for linha in linhas), originais, {})
+        return cls(capturas, originais, [prefixo], [modo])
+
+    def salvar(self, diretorio):
+        """Grava o manifesto em 'diretorio' (criado se preciso)."""
+        diretorio = Path(diretorio)
+        diretorio.mkdir(parents=True, exist_ok=True)
+        np.save(diretorio / "capturas.npy", np.ascontiguousarray(self.capturas))
+        (diretorio / "originais.txt").write_text("".join(f"{o}\n" for o in self.originais), encoding="utf-8")
+        meta = {"versao": VERSAO, "prefixos": self.prefixos, "modos": self.modos, "capturas": len(self)}
+        (diretorio / "meta.json").write_text(json.dumps(meta, ensure_ascii=False), encoding="utf-8")
+        self.diretorio = diretorio
+        return diretorio
+
+    @classmethod
+    def abrir(cls, diretorio, escrita=False):
+        """Abre o manifesto mapeado em memória ('r+' com escrita, para atualizar o status no próprio arquivo)."""
+        _exigir_numpy()
+        diretorio = Path(diretorio)
+        meta = json.loads((diretorio / "meta.json").read_text(encoding="utf-8"))
+        if meta.get("versao") != VERSAO:
+            raise ValueError(f"Versão de manifesto não suportada: {meta.get('versao')}")
+        capturas = np.load(diretorio / "capturas.npy", mmap_mode="r+" if escrita else "r")
+        originais = (diretorio / "originais.txt").read_text(encoding="utf-8").splitlines()
+        return cls(capturas, originais, meta["prefixos"], meta["modos"], diretorio)
+
+    def gravar_status(self):
+        """Persiste as mudanças de status (memmap aberto com escrita)."""
+        if isinstance(self.capturas, np.memmap):
+            self.capturas.flush()
+        elif self.diretorio is not None:
+            self.salvar(self.diretorio)
+
+    @staticmethod
+    def eh_manifesto(caminho):
+        return (Path(caminho) / "meta.json").exists() and (Path(caminho) / "capturas.npy").exists()
+
+    # -----------------------------
+    # Consultas vetorizadas
+    # -----------------------------
+    @property
+    def timestamps(self):
+        return self.capturas["timestamp"]
+
+    @property
+    def status(self):
+        return self.capturas["status"]
+
+    def datetimes(self, indices=None):
+        return para_datetime64(self.timestamps if indices is None else self.timestamps[indices])
+
+    def filtrar(self, status=None, de=None, ate=None, original=None):
+        """
+        Índices das capturas que atendem a todos os critérios: status (int ou
+        lista), período [de, ate] (timestamps parciais: '2020', '202103'...) e
+        URL original exata.
+        """
+        mascara = np.ones(len(self), dtype=bool)
+        if status is not None:
+            mascara &= np.isin(self.status, np.atleast_1d(status))
+        if de is not None:
+            mascara &= self.timestamps >= timestamp_para_limite(de)
+        if ate is not None:
+            mascara &= self.timestamps <= timestamp_para_limite(ate, fim=True)
+        if original is not None:
+            try:
+                mascara &= self.capturas["original"] == self.originais.index(original)
+            except ValueError:
+                return np.empty(0, dtype=np.intp)
+        return np.flatnonzero(mascara)
+
+    def ordenar(self, indices=None, decrescente=True):
+        """Índices ordenados por timestamp (o mais novo primeiro, como o CDX é processado)."""
+        indices = np.arange(len(self)) if indices is None else np.asarray(indices)
+        ordem = np.argsort(self.timestamps[indices], kind="stable")
+        return indices[ordem[::-1]] if decrescente else indices[ordem]
+
+    def intervalo(self, de, ate, indices_ordenados):
+        """Fatia de 'indices_ordenados' (crescentes por timestamp) no período [de, ate], por busca binária."""
+        ts = self.timestamps[indices_ordenados]
+        inicio = np.searchsorted(ts, timestamp_para_limite(de), side="left")
+        fim = np.searchsorted(ts, timestamp_para_limite(ate, fim=True), side="right")
+        return indices_ordenados[inicio:fim]
+
+    def url(self, i):
+        linha = self.capturas[i]
+        return (f"{self.prefixos[linha['prefixo']]}/web/{linha['timestamp']}{self.modos[linha['modo']]}/"
+                f"{self.originais[linha['original']]}")
+
+    def urls(self, indices=None):
+        """URLs completas das capturas (na ordem de 'indices'), montadas sob demanda."""
+        indices = range(len(self)) if indices is None else indices
+        for i in indices:
+            yield self.url(i)
+
+    # -----------------------------
+    # Status
+    # -----------------------------
+    def _chaves(self, originais, timestamps):
+        # original (32 bits) e segundos desde 1970 (32 bits) em um uint64 ordenável
+        segundos = para_datetime64(timestamps).astype(np.int64)
+        return (np.asarray(originais, dtype=np.uint64) << np.uint64(32)) | segundos.astype(np.uint64)
+
+    def localizar(self, urls):
+        """Índice no manifesto de cada URL do Wayback válida de 'urls' (-1 se não estiver nele)."""
+        outro = Manifesto.criar(urls)
+        if not len(outro):
+            return np.empty(0, dtype=np.intp)
+        mapa = {o: i for i, o in enumerate(self.originais)}
+        originais = np.array([mapa.get(o, -1) for o in outro.originais], dtype=np.int64)[outro.capturas["original"]]
+        if self._ordem_chaves is None:
+            chaves = self._chaves(self.capturas["original"], self.timestamps)
+            ordem = np.argsort(chaves, kind="stable")
+            self._ordem_chaves = (chaves[ordem], ordem)
+        chaves_ordenadas, ordem = self._ordem_chaves
+        procuradas = self._chaves(np.maximum(originais, 0), outro.timestamps)
+        posicoes = np.minimum(np.searchsorted(chaves_ordenadas, procuradas), len(self) - 1)
+        achadas = (originais >= 0) & (chaves_ordenadas[posicoes] == procuradas)
+        return np.where(achadas, ordem[posicoes], -1)
+
+    def marcar(self, urls, status):
+        """Define o status das URLs (as que não estão no manifesto são ignoradas). Devolve quantas mudaram."""
+        indices = np.unique(self.localizar(urls))
+        indices = indices[indices >= 0]
+        indices = indices[self.capturas["status"][indices] != status]
+        self.capturas["status"][indices] = status
+        return len(indices)
+
+    def sincronizar(self, sucessos, falhas=()):
+        """Atualiza o status a partir dos ledgers da execução (um sucesso posterior prevalece sobre a falha)."""
+        self.marcar(falhas, FALHA)
+        self.marcar(sucessos, SUCESSO)
+        self.gravar_status()
+
+    def resumo(self):
+        nomes = {v: k for k, v in STATUS.items()}
+        contagens = np.bincount(self.status, minlength=len(STATUS))
+        partes = [f"{nomes.get(s, s)}={c}" for s, c in enumerate(contagens) if c]
+        if not len(self):
+            return "0 capturas"
+        return (f"{len(self)} capturas de {len(self.originais)} URLs originais "
+                f"({self.timestamps.min()} a {self.timestamps.max()}); {', '.join(partes)}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Manifesto binário das capturas do Wayback.")
+    sub = parser.add_subparsers(dest="comando", required=True)
+    criar = sub.add_parser("criar", help="Cria um manifesto a partir de uma lista de URLs")
+    criar.add_argument("arquivo", help="Arquivo com uma URL do Wayback por linha")
+    criar.add_argument("destino", help="Diretório do manifesto")
+    listar = sub.add_parser("listar", help="Lista as URLs selecionadas (mais novas primeiro)")
+    listar.add_argument("manifesto")
+    listar.add_argument("--status", choices=list(STATUS))
+    listar.add_argument("--de", help="Timestamp inicial (ex.: 2020, 202103)")
+    listar.add_argument("--ate", help="Timestamp final, inclusivo")
+    listar.add_argument("--original", help="URL original exata")
+    marcar = sub.add_parser("marcar", help="Atualiza o status a partir de um ledger (uma URL por linha)")
+    marcar.add_argument("manifesto")
+    marcar.add_argument("ledger")
+    marcar.add_argument("--status", choices=list(STATUS), default="sucesso")
+    resumo = sub.add_parser("resumo", help="Contagens por status e período coberto")
+    resumo.add_argument("manifesto")
+    args = parser.parse_args()
+
+    if np is None:
+        parser.error("o manifesto precisa do pacote 'numpy' (pip install numpy; ver requirements-extras.txt)")
+
+    if args.comando == "criar":
+        manifesto = Manifesto.de_arquivo(args.arquivo)
+        manifesto.salvar(args.destino)
+        print(manifesto.resumo())
+    elif args.comando == "listar":
+        manifesto = Manifesto.abrir(args.manifesto)
+        status = STATUS[args.status] if args.status else None
+        indices = manifesto.filtrar(status=status, de=args.de, ate=args.ate, original=args.original)
+        saida = sys.stdout
+        for url in manifesto.urls(manifesto.ordenar(indices)):
+            saida.write(url + "\n")
+    elif args.comando == "marcar":
+        manifesto = Manifesto.abrir(args.manifesto, escrita=True)
+        with open(args.ledger, "rb") as f:
+            alteradas = manifesto.marcar(f.read().splitlines(), STATUS[args.status])
+        manifesto.gravar_status()
+        print(f"{alteradas} capturas marcadas como {args.status}.")
+    else:
+        print(Manifesto.abrir(args.manifesto).resumo())
+
+if __name__ == "__main__":
+    main()
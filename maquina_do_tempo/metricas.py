@@ -0,0 +1,243 @@
+import bisect
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# =============================
+# Configurações e Constantes
+# =============================
+PORTA_METRICAS = 9464
+PREFIXO = "wayback"
+
+# Limites dos buckets (segundos): cobre de leitura de arquivo (ms) a captura com Chrome (minutos)
+BUCKETS_PADRAO = (
+    0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1, 2.5, 5, 10, 20, 30, 60, 120, 240, 480,
+)
+
+class Histograma:
+    """Histograma cumulativo no formato do Prometheus (buckets fixos, soma e contagem)."""
+    def __init__(self, buckets=BUCKETS_PADRAO):
+        self.buckets = tuple(sorted(buckets))
+        self.contagens = [0] * (len(self.buckets) + 1)  # último = +Inf
+        self.soma = 0.0
+        self.total = 0
+        self.maximo = 0.0
+
+    def observar(self, valor):
+        self.contagens[bisect.bisect_left(self.buckets, valor)] += 1
+        self.soma += valor
+        self.total += 1
+        self.maximo = max(self.maximo, valor)
+
+    def quantil(self, q):
+        """Estimativa do quantil por interpolação linear dentro do bucket (como histogram_quantile)."""
+        if not self.total:
+            return 0.0
+        alvo = q * self.total
+        acumulado = 0
+        for i, contagem in enumerate(self.contagens):
+            if acumulado + contagem >= alvo and contagem:
+                inferior = self.buckets[i - 1] if i > 0 else 0.0
+                superior = min(self.buckets[i], self.maximo) if i < len(self.buckets) else self.maximo
+                return inferior + (superior - inferior) * (alvo - acumulado) / contagem
+            acumulado += contagem
+        return self.maximo
+
+def _rotulos(rotulos):
+    if not rotulos:
+        return ""
+    partes = ",".join(f'{k}="{str(v).replace(chr(34), chr(39))}"' for k, v in sorted(rotulos.items()))
+    return "{" + partes + "}"
+
+class Metricas:
+    """
+    Registro de métricas do pipeline: latência por etapa (histogramas), contadores
+    de sucesso/falha/retry por classe de erro e profundidade de filas (gauges).
+    Seguro para uso por várias threads.
+    """
+    def __init__(self, prefixo=PREFIXO):
+        self.prefixo = prefixo
+        self._lock = threading.Lock()
+        self._histogramas = {}   # etapa -> Histograma
+        self._contadores = {}    # (nome, rótulos ordenados) -> valor
+        self._gauges = {}        # nome -> função sem argumentos
+        self._servidor = None
+        self.inicio = time.monotonic()
+
+    # ---------- coleta ----------
+    def observar(self, etapa, segundos):
+        with self._lock:
+            histograma = self._histogramas.get(etapa)
+            if histograma is None:
+                histograma = self._histogramas[etapa] = Histograma()
+            histograma.observar(segundos)
+
+    @contextmanager
+    def tempo(self, etapa):
+        """Mede o bloco como uma observação da etapa (mesmo se lançar exceção)."""
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observar(etapa, time.perf_counter() - inicio)
+
+    def contar(self, nome, valor=1, **rotulos):
+        chave = (nome, tuple(sorted(rotulos.items())))
+        with self._lock:
+            self._contadores[chave] = self._contadores.get(chave, 0) + valor
+
+    def sucesso(self, etapa):
+        self.contar("resultados_total", etapa=etapa, resultado="sucesso", classe="")
+
+    def falha(self, etapa, erro):
+        """Conta uma falha; 'erro' pode ser uma exceção (usa o nome da classe) ou uma string."""
+        classe = type(erro).__name__ if isinstance(erro, BaseException) else str(erro)
+        self.contar("resultados_total", etapa=etapa, resultado="falha", classe=classe)
+
+    def retry(self, etapa, motivo):
+        self.contar("resultados_total", etapa=etapa, resultado="retry", classe=motivo)
+
+    def registrar_gauge(self, nome, funcao):
+        """Registra uma função lida a cada exposição (ex.: fila.qsize)."""
+        with self._lock:
+            self._gauges[nome] = funcao
+
+    # ---------- agregação entre processos ----------
+    def estado(self, zerar=False):
+        """Cópia picklable de histogramas e contadores (para enviar de um processo filho ao pai)."""
+        with self._lock:
+            estado = {
+                "histogramas": {
+                    etapa: (h.buckets, list(h.contagens), h.soma, h.total, h.maximo)
+                    for etapa, h in self._histogramas.items()
+                },
+                "contadores": dict(self._contadores),
+            }
+            if zerar:
+                self._histogramas = {}
+                self._contadores = {}
+        return estado
+
+    def mesclar(self, estado):
+        """Soma ao registro um estado produzido por Metricas.estado() em outro processo."""
+        with self._lock:
+            for etapa, (buckets, contagens, soma, total, maximo) in estado["histogramas"].items():
+                histograma = self._histogramas.get(etapa)
+                if histograma is None:
+                    histograma = self._histogramas[etapa] = Histograma(buckets)
+                for i, contagem in enumerate(contagens):
+                    histograma.contagens[i] += contagem
+                histograma.soma += soma
+                histograma.total += total
+                histograma.maximo = max(histograma.maximo, maximo)
+            for chave, valor in estado["contadores"].items():
+                self._contadores[chave] = self._contadores.get(chave, 0) + valor
+
+    # ---------- exposição ----------
+    def exposicao(self):
+        """Texto no formato de exposição do Prometheus (text/plain; version=0.0.4)."""
+        p = self.prefixo
+        linhas = []
+        with self._lock:
+            histogramas = dict(self._histogramas)
+            contadores = dict(self._contadores)
+            gauges = dict(self._gauges)
+
+            linhas.append(f"# HELP {p}_etapa_segundos Latência por etapa do pipeline.")
+            linhas.append(f"# TYPE {p}_etapa_segundos histogram")
+            for etapa, h in sorted(histogramas.items()):
+                acumulado = 0
+                for limite, contagem in zip(h.buckets, h.contagens):
+                    acumulado += contagem
+                    linhas.append(f'{p}_etapa_segundos_bucket{{etapa="{etapa}",le="{limite}"}} {acumulado}')
+                linhas.append(f'{p}_etapa_segundos_bucket{{etapa="{etapa}",le="+Inf"}} {h.total}')
+                linhas.append(f'{p}_etapa_segundos_sum{{etapa="{etapa}"}} {h.soma}')
+                linhas.append(f'{p}_etapa_segundos_count{{etapa="{etapa}"}} {h.total}')
+
+        nomes_contadores = sorted({nome for nome, _ in contadores})
+        for nome in nomes_contadores:
+            linhas.append(f"# TYPE {p}_{nome} counter")
+            for (n, rotulos), valor in sorted(contadores.items()):
+                if n == nome:
+                    linhas.append(f"{p}_{nome}{_rotulos(dict(rotulos))} {valor}")
+
+        for nome, funcao in sorted(gauges.items()):
+            try:
+                valor = funcao()
+            except Exception:
+                continue
+            linhas.append(f"# TYPE {p}_{nome} gauge")
+            linhas.append(f"{p}_{nome} {valor}")
+
+        return "\n".join(linhas) + "\n"
+
+    def servir(self, porta=PORTA_METRICAS, host="127.0.0.1"):
+        """Sobe o endpoint /metrics em uma thread daemon e devolve a porta usada (ou None)."""
+        metricas = self
+
+        class _Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/metrics", "/"):
+                    self.send_error(404)
+                    return
+                corpo = metricas.exposicao().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(corpo)))
+                self.end_headers()
+                self.wfile.write(corpo)
+
+            def log_message(self, *args):
+                pass
+
+        try:
+            self._servidor = ThreadingHTTPServer((host, porta), _Handler)
+        except OSError as e:
+            # Outra execução já usa a porta: segue sem endpoint, o resumo final continua valendo
+            logging.warning(f"Endpoint de métricas não iniciado em {host}:{porta}: {e}")
+            return None
+        threading.Thread(target=self._servidor.serve_forever, name="metricas-http", daemon=True).start()
+        porta_real = self._servidor.server_address[1]
+        logging.info(f"Métricas disponíveis em http://{host}:{porta_real}/metrics")
+        return porta_real
+
+    def parar_servidor(self):
+        if self._servidor is not None:
+            self._servidor.shutdown()
+            self._servidor.server_close()
+            self._servidor = None
+
+    def resumo(self):
+        """Tabela de fim de execução: latência por etapa e contagem de resultados."""
+        with self._lock:
+            histogramas = dict(self._histogramas)
+            contadores = dict(self._contadores)
+
+        duracao = time.monotonic() - self.inicio
+        linhas = [
+            f"Resumo da execução ({duracao:.1f} s)",
+            f"{'etapa':<16}{'n':>8}{'média s':>10}{'p50 s':>10}{'p99 s':>10}{'máx s':>10}{'total s':>11}",
+        ]
+        for etapa, h in sorted(histogramas.items()):
+            media = h.soma / h.total if h.total else 0.0
+            linhas.append(
+                f"{etapa:<16}{h.total:>8}{media:>10.3f}{h.quantil(0.5):>10.3f}"
+                f"{h.quantil(0.99):>10.3f}{h.maximo:>10.3f}{h.soma:>11.1f}"
+            )
+
+        resultados = [(dict(r), v) for (n, r), v in sorted(contadores.items()) if n == "resultados_total"]
+        if resultados:
+            linhas.append("")
+            linhas.append(f"{'etapa':<16}{'resultado':<10}{'classe':<28}{'qtd':>8}")
+            for rotulos, valor in resultados:
+                linhas.append(
+                    f"{rotulos.get('etapa', ''):<16}{rotulos.get('resultado', ''):<10}"
+                    f"{rotulos.get('classe', '')[:27]:<28}{valor:>8}"
+                )
+        return "\n".join(linhas)
+
+# Instância global usada pelos scripts (um processo = um registro)
+METRICAS = Metricas()
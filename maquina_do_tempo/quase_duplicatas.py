@@ -0,0 +1,196 @@
+"""
+Detecção de capturas quase duplicadas (SimHash + índice LSH).
+
+Capturas seguidas da mesma home costumam diferir só em um horário, um
+contador de visualizações ou um slot de anúncio, e o collapse=digest do CDX
+as trata como distintas. Cada captura ganha um SimHash de 64 bits sobre:
+
+- o texto visível (html_texto.py: sem <script>, <style>...), em trincas de
+  palavras, com os dígitos zerados (horários e contadores não contam);
+- a estrutura do DOM, em sequências de 4 tags.
+
+O índice guarda, por URL original, as capturas que mudaram de fato e
+responde se uma nova está a até 'distancia' bits (Hamming) de alguma delas.
+A busca é por bandas: com distância d, os 64 bits são cortados em d + 1
+bandas e duas assinaturas a até d bits coincidem em pelo menos uma banda
+inteira (casa dos pombos); só os candidatos dessas bandas são comparados.
+
+O índice fica em memória e é persistido em um arquivo de linhas JSON, só de
+acréscimo: cada Pipeline (um por worker na engine de processos) lê o que os
+outros gravaram antes de cada consulta.
+
+    indice = IndiceQuaseDuplicatas(ARCHIVEBOX_DIR / "quase_duplicatas.jsonl")
+    vizinho = indice.consultar(original, timestamp, valor)
+    ...                                    # insert no MongoDB
+    if vizinho is None:
+        indice.adicionar(original, timestamp, valor)
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+from pathlib import Path
+
+from .html_texto import nomes_tags, remover_invisivel, texto_visivel
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# =============================
+# Configurações e Constantes
+# =============================
+BITS = 64
+DISTANCIA_PADRAO = int(os.environ.get("QUASE_DUPLICATAS_DISTANCIA", 3))  # bits de diferença tolerados
+INDICE_NAME = "quase_duplicatas.jsonl"
+MODOS = ("marcar", "pular")  # pular: o documento vai sem o 'content', só com a referência
+TAMANHO_SHINGLE_TEXTO = 3
+TAMANHO_SHINGLE_TAGS = 4
+
+_PALAVRA = re.compile(r"\w+")
+_DIGITO = re.compile(r"\d")
+_MASCARA = (1 << BITS) - 1
+
+def _hash64(texto):
+    return int.from_bytes(hashlib.blake2b(texto.encode("utf-8", "surrogatepass"), digest_size=8).digest(), "little")
+
+def caracteristicas(html):
+    """Shingles de texto visível e de estrutura (tags) de um HTML em bytes."""
+    visivel = remover_invisivel(html)
+    tags = nomes_tags(visivel)
+    texto = texto_visivel(visivel).lower()
+    palavras = [_DIGITO.sub("0", p) for p in _PALAVRA.findall(texto)]
+    shingles = [" ".join(palavras[i:i + TAMANHO_SHINGLE_TEXTO])
+                for i in range(max(len(palavras) - TAMANHO_SHINGLE_TEXTO + 1, 1 if palavras else 0))]
+    estrutura = ["<" + ">".join(tags[i:i + TAMANHO_SHINGLE_TAGS])
+                 for i in range(max(len(tags) - TAMANHO_SHINGLE_TAGS + 1, 1 if tags else 0))]
+    return shingles + estrutura
+
+def simhash(caracteristicas):
+    """
+    SimHash de 64 bits (sem sinal) do conjunto de características. Repetições
+    contam uma vez: senão a estrutura repetida de cada bloco (a mesma
+    sequência de tags em toda manchete) abafa a mudança do texto.
+    """
+    hashes = list({_hash64(c) for c in caracteristicas})
+    if not hashes:
+        return 0
+    if np is not None:
+        bits = np.unpackbits(np.array(hashes, dtype="<u8").view(np.uint8).reshape(-1, 8), axis=1,
+                             bitorder="little")
+        votos = bits.sum(axis=0, dtype=np.int64) * 2 - len(hashes)
+        return int(sum(1 << i for i in np.flatnonzero(votos > 0).tolist()))
+    resultado = 0
+    for i in range(BITS):
+        if sum((h >> i) & 1 for h in hashes) * 2 > len(hashes):
+            resultado |= 1 << i
+    return resultado
+
+def simhash_html(html):
+    return simhash(caracteristicas(html))
+
+def para_int64(valor):
+    """O BSON só tem inteiros com sinal: o SimHash vai para o documento como int64."""
+    return valor - (1 << BITS) if valor >= 1 << (BITS - 1) else valor
+
+def de_int64(valor):
+    return valor & _MASCARA
+
+def distancia(a, b):
+    return bin((a ^ b) & _MASCARA).count("1")
+
+class IndiceQuaseDuplicatas:
+    """Índice LSH por bandas das capturas distintas de cada URL original, persistido em 'caminho'."""
+    def __init__(self, caminho=None, distancia=DISTANCIA_PADRAO):
+        self.caminho = Path(caminho) if caminho else None
+        self.distancia = distancia
+        bandas = min(distancia + 1, BITS)
+        largura = BITS // bandas
+        # (deslocamento, máscara) de cada banda; a última fica com os bits que sobram
+        self._bandas = [(i * largura, (1 << (largura if i < bandas - 1 else BITS - i * largura)) - 1)
+                        for i in range(bandas)]
+        self._tabelas = [{} for _ in self._bandas]
+        self._capturas = []  # (original, timestamp, simhash)
+        self._vistas = set()  # (original, timestamp): as próprias linhas voltam na próxima leitura
+        self._lido = 0
+        self._lock = threading.Lock()
+        self._sincronizar()
+
+    def __len__(self):
+        return len(self._capturas)
+
+    def _indexar(self, original, timestamp, valor):
+        if (original, timestamp) in self._vistas:
+            return
+        self._vistas.add((original, timestamp))
+        posicao = len(self._capturas)
+        self._capturas.append((original, timestamp, valor))
+        for tabela, (deslocamento, mascara) in zip(self._tabelas, self._bandas):
+            tabela.setdefault((original, (valor >> deslocamento) & mascara), []).append(posicao)
+
+    def _sincronizar(self):
+        """Lê o que foi acrescentado ao arquivo desde a última leitura (outros workers)."""
+        if self.caminho is None or not self.caminho.exists():
+            return
+        with open(self.caminho, "rb") as f:
+            f.seek(self._lido)
+            for linha in f:
+                if not linha.endswith(b"\n"):
+                    break  # linha sendo escrita por outro processo
+                self._lido += len(linha)
+                try:
+                    registro = json.loads(linha)
+                except ValueError:
+                    continue
+                self._indexar(registro["original"], registro["timestamp"], de_int64(registro["simhash"]))
+
+    def vizinhos(self, original, valor, ignorar=None):
+        """
+        (timestamp, distância) das capturas de 'original' a até 'distancia'
+        bits de 'valor', fora a do timestamp 'ignorar' (a própria captura).
+        """
+        candidatos = set()
+        for tabela, (deslocamento, mascara) in zip(self._tabelas, self._bandas):
+            candidatos.update(tabela.get((original, (valor >> deslocamento) & mascara), ()))
+        resultado = []
+        for posicao in candidatos:
+            _, timestamp, outro = self._capturas[posicao]
+            if timestamp == ignorar:
+                continue
+            d = distancia(valor, outro)
+            if d <= self.distancia:
+                resultado.append((timestamp, d))
+        return resultado
+
+    def consultar(self, original, timestamp, valor):
+        """
+        Devolve (timestamp, distância) da captura mais próxima no tempo entre
+        as quase iguais, ou None. Não altera o índice: a captura só entra com
+        adicionar(), depois de gravada (numa nova tentativa da mesma URL ela
+        já pode estar no índice, e não conta como vizinha de si mesma).
+        """
+        valor = de_int64(valor)
+        with self._lock:
+            self._sincronizar()
+            vizinhos = self.vizinhos(original, valor, ignorar=timestamp)
+        if not vizinhos:
+            return None
+        return min(vizinhos, key=lambda v: (abs(int(v[0]) - int(timestamp)), v[1]))
+
+    def adicionar(self, original, timestamp, valor):
+        """
+        Põe no índice uma captura gravada que não é quase duplicata (a
+        comparação é sempre com quem mudou). Capturas já presentes são ignoradas.
+        """
+        valor = de_int64(valor)
+        with self._lock:
+            self._sincronizar()
+            if (original, timestamp) in self._vistas:
+                return
+            self._indexar(original, timestamp, valor)
+            if self.caminho is not None:
+                linha = json.dumps({"original": original, "timestamp": timestamp, "simhash": para_int64(valor)})
+                with open(self.caminho, "ab") as f:
+                    f.write(linha.encode("utf-8") + b"\n")
@@ -0,0 +1,183 @@
+"""
+Logging assíncrono e limitado em tamanho para o caminho quente das capturas.
+
+Com o FileHandler do basicConfig, cada logging.info() de um worker escreve
+no disco sob o lock do handler, e a saída inteira do 'archivebox add' ia
+parar no log. Aqui:
+
+- os workers só enfileiram o LogRecord (QueueHandler, fila limitada e
+  put_nowait: com a fila cheia o registro é descartado e contado em
+  logs_descartados_total, nunca bloqueia);
+- uma thread (QueueListener) formata e grava; a mensagem só é montada lá,
+  então logging.debug("...", extra={"stdout": saida}) custa quase nada com
+  o nível INFO;
+- cada registro é uma linha JSON: quando, nivel, logger, processo, thread,
+  msg, os campos de 'extra' (url, etapa, stdout...) e a exceção formatada;
+- campos grandes são truncados (a saída de subprocessos guarda o final, onde
+  estão os erros);
+- os arquivos giram por tamanho (RotatingFileHandler): o log geral e um só
+  de avisos e erros.
+
+Com a engine de processos a fila é um multiprocessing.Queue: os workers
+(fork) herdam o handler e a thread do processo principal grava por todos.
+
+    configurar_registro(ARCHIVEBOX_DIR, processos=False)
+    ...
+    parar_registro()
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import multiprocessing
+import os
+import queue
+from datetime import datetime, timezone
+
+from . import config
+from .metricas import METRICAS
+
+# =============================
+# Configurações e Constantes
+# =============================
+LOG_NIVEL = os.environ.get("LOG_NIVEL", "INFO")
+LOG_TAMANHO_MAXIMO = int(float(os.environ.get("LOG_TAMANHO_MB", 50)) * 1024 ** 2)  # por arquivo
+LOG_BACKUPS = 5
+LOG_CAMPO_MAXIMO = 4000   # caracteres por campo do registro
+LOG_FILA_MAXIMA = 50_000  # registros aguardando a thread de escrita
+ERROS_LOG_NAME = "erros.log"
+# Saídas de subprocessos: o final é o que interessa
+CAMPOS_SAIDA = ("stdout", "stderr", "saida")
+
+# Atributos padrão do LogRecord; o resto veio de 'extra'
+_ATRIBUTOS_PADRAO = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "taskName"}
+
+_listener = None
+_pid_listener = None
+
+def truncar(texto, limite=LOG_CAMPO_MAXIMO, final=False):
+    """Corta 'texto' em 'limite' caracteres, marcando quantos foram omitidos (final=True guarda o fim)."""
+    if texto is None or len(texto) <= limite:
+        return texto
+    # O marcador entra na conta: o resultado não passa do limite (e não é truncado de novo)
+    mantidos = max(limite - 40, 0)
+    omitidos = len(texto) - mantidos
+    if final:
+        return f"[... {omitidos} caracteres omitidos] {texto[len(texto) - mantidos:]}"
+    metade = mantidos // 2
+    return f"{texto[:metade]} [... {omitidos} caracteres omitidos] {texto[len(texto) - (mantidos - metade):]}"
+
+def _campos_extras(record):
+    return {k: v for k, v in vars(record).items() if k not in _ATRIBUTOS_PADRAO and not k.startswith("_")}
+
+class FormatadorJSON(logging.Formatter):
+    """Uma linha JSON por registro, com os campos de 'extra' e truncamento por campo."""
+    def __init__(self, limite=LOG_CAMPO_MAXIMO):
+        super().__init__()
+        self.limite = limite
+
+    def format(self, record):
+        linha = {
+            "quando": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "nivel": record.levelname,
+            "logger": record.name,
+            "processo": record.process,
+            "thread": record.threadName,
+            "msg": truncar(record.getMessage(), self.limite),
+        }
+        for nome, valor in _campos_extras(record).items():
+            if not isinstance(valor, (int, float, bool)) and valor is not None:
+                valor = truncar(str(valor), self.limite, final=nome in CAMPOS_SAIDA)
+            linha[nome] = valor
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            linha["exc"] = truncar(record.exc_text, self.limite, final=True)
+        return json.dumps(linha, ensure_ascii=False, default=str)
+
+class HandlerFila(logging.handlers.QueueHandler):
+    """
+    QueueHandler que não bloqueia e não formata no worker. Os campos grandes
+    são truncados antes de entrar na fila (limita a memória retida); a
+    mensagem fica para a thread de escrita. Em um processo filho que herdou
+    uma fila de threads (sem ninguém lendo), grava direto nos destinos.
+    """
+    def __init__(self, fila, destinos, entre_processos=False, limite=LOG_CAMPO_MAXIMO):
+        super().__init__(fila)
+        self.destinos = destinos
+        self.entre_processos = entre_processos
+        self.limite = limite
+        self._pid = os.getpid()
+
+    def prepare(self, record):
+        for nome, valor in _campos_extras(record).items():
+            if isinstance(valor, str):
+                setattr(record, nome, truncar(valor, self.limite, final=nome in CAMPOS_SAIDA))
+        if self.entre_processos:
+            # multiprocessing.Queue serializa o registro: a mensagem e a exceção precisam virar texto aqui
+            record.msg = truncar(record.getMessage(), self.limite)
+            record.args = None
+            if record.exc_info:
+                record.exc_text = logging.Formatter().formatException(record.exc_info)
+                record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            METRICAS.contar("logs_descartados_total")
+
+    def emit(self, record):
+        if not self.entre_processos and os.getpid() != self._pid:
+            for destino in self.destinos:
+                if record.levelno >= destino.level:
+                    destino.handle(record)
+            return
+        super().emit(record)
+
+def configurar_registro(diretorio, nivel=LOG_NIVEL, processos=False, tamanho_maximo=LOG_TAMANHO_MAXIMO,
+                        backups=LOG_BACKUPS):
+    """
+    Troca os handlers do logger raiz por um HandlerFila e sobe a thread de
+    escrita. 'processos' usa uma fila entre processos (engine de processos).
+    """
+    global _listener, _pid_listener
+    parar_registro()
+    os.makedirs(diretorio, exist_ok=True)
+    formatador = FormatadorJSON()
+    geral = logging.handlers.RotatingFileHandler(os.path.join(diretorio, config.LOG_FILE_NAME),
+                                                 maxBytes=tamanho_maximo, backupCount=backups, encoding="utf-8")
+    erros = logging.handlers.RotatingFileHandler(os.path.join(diretorio, ERROS_LOG_NAME),
+                                                 maxBytes=tamanho_maximo, backupCount=backups, encoding="utf-8")
+    erros.setLevel(logging.WARNING)
+    for destino in (geral, erros):
+        destino.setFormatter(formatador)
+
+    fila = multiprocessing.Queue(LOG_FILA_MAXIMA) if processos else queue.Queue(LOG_FILA_MAXIMA)
+    handler = HandlerFila(fila, (geral, erros), entre_processos=processos)
+    raiz = logging.getLogger()
+    for antigo in list(raiz.handlers):
+        raiz.removeHandler(antigo)
+        antigo.close()
+    raiz.addHandler(handler)
+    raiz.setLevel(nivel)
+    METRICAS.registrar_gauge("logs_na_fila", lambda: fila.qsize())
+
+    _listener = logging.handlers.QueueListener(fila, geral, erros, respect_handler_level=True)
+    _listener.start()
+    _pid_listener = os.getpid()
+    return handler
+
+def parar_registro():
+    """Esvazia a fila e fecha os arquivos (também chamado na saída do interpretador)."""
+    global _listener
+    # Processos filhos (fork) herdam a referência, mas a thread é só do processo principal
+    if _listener is None or os.getpid() != _pid_listener:
+        return
+    listener, _listener = _listener, None
+    listener.stop()
+    for destino in listener.handlers:
+        destino.close()
+
+atexit.register(parar_registro)
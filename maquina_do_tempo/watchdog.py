@@ -0,0 +1,227 @@
+"""
+Prazos por etapa para as capturas, com resgate do que já foi salvo.
+
+Páginas cheias de anúncios raramente chegam a 'networkidle', e o ArchiveBox
+(TIMEOUT = 240 por extractor) segura o worker por minutos. O watchdog:
+
+- roda o 'archivebox add' em uma sessão própria e, se o orçamento da etapa
+  estoura, mata a árvore inteira (Chrome, node do SingleFile...) com SIGTERM
+  e, após a tolerância, SIGKILL;
+- repassa ao ArchiveBox um TIMEOUT menor que o orçamento, para que ele mesmo
+  encerre o extractor e grave o que tiver antes do kill;
+- no prazo, resgata o snapshot se o DOM já foi salvo (singlefile.html ou o
+  output.html do extractor DOM) em vez de descartar a captura;
+- registra cada estouro em ARCHIVEBOX_DIR/timeouts.jsonl (URL, etapa,
+  extractor em andamento, se houve resgate), para ajustar os orçamentos.
+"""
+import asyncio
+import json
+import logging
+import os
+import shutil
+import signal
+import subprocess
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from . import config
+from .desligamento import CapturaInterrompida, apagar_snapshot_parcial
+from .metricas import METRICAS
+
+class PrazoEsgotado(Exception):
+    """O processo da etapa passou do orçamento e foi morto; stdout/stderr são a saída parcial."""
+    def __init__(self, etapa, orcamento, decorrido, stdout, stderr):
+        super().__init__(f"{etapa}: prazo de {orcamento:.0f} s esgotado")
+        self.etapa = etapa
+        self.orcamento = orcamento
+        self.decorrido = decorrido
+        self.stdout = stdout or ""
+        self.stderr = stderr or ""
+
+def _matar_grupo(pid, sinal):
+    try:
+        os.killpg(pid, sinal)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+def ultimo_extractor(stdout):
+    """Última linha de progresso do ArchiveBox (ex.: '> singlefile'): onde a captura travou."""
+    for linha in reversed((stdout or "").splitlines()):
+        linha = linha.strip()
+        if linha.startswith(">") and "./archive/" not in linha:
+            return linha.lstrip("> ").strip()
+    return None
+
+class Watchdog:
+    """
+    Orçamentos por etapa ({etapa: segundos}). Uma instância por Pipeline;
+    executar()/executar_async() substituem subprocess.run/create_subprocess_exec.
+    Com 'processos' (desligamento.RegistroProcessos), cada processo fica
+    registrado enquanto roda, para o desligamento poder matá-lo.
+    """
+    def __init__(self, orcamentos=None, registro=None, tolerancia=config.WATCHDOG_TOLERANCIA, processos=None):
+        self.orcamentos = dict(config.ORCAMENTOS_ETAPAS if orcamentos is None else orcamentos)
+        self.registro = Path(registro) if registro else None
+        self.tolerancia = tolerancia
+        self.processos = processos
+        self._lock = threading.Lock()
+        self._resgatados = set()
+
+    def orcamento(self, etapa):
+        return self.orcamentos.get(etapa)
+
+    def ambiente(self, etapa, env=None):
+        """Ambiente do processo com o TIMEOUT do ArchiveBox abaixo do orçamento (ele encerra antes do kill)."""
+        env = dict(os.environ if env is None else env)
+        orcamento = self.orcamento(etapa)
+        if orcamento:
+            atual = float(env.get("TIMEOUT") or orcamento)
+            env["TIMEOUT"] = str(max(10, int(min(atual, orcamento * 0.75))))
+        return env
+
+    def _verificar_desligamento(self):
+        if self.processos is not None and self.processos.abortado():
+            raise CapturaInterrompida("desligamento abortado: captura não iniciada")
+
+    def _interrompido(self, proc, cwd, stdout):
+        """Processo morto pelo desligamento: apaga o snapshot pela metade e lança CapturaInterrompida."""
+        if proc.returncode is not None and proc.returncode < 0 and self.processos is not None \
+                and self.processos.abortado():
+            apagar_snapshot_parcial(stdout, cwd or ".")
+            raise CapturaInterrompida(f"desligamento abortado: captura morta (sinal {-proc.returncode})")
+
+    def executar(self, cmd, etapa, cwd=None, env=None):
+        """
+        Como subprocess.run(..., capture_output=True, text=True, check=True), com
+        o orçamento da etapa. Lança CalledProcessError, PrazoEsgotado ou CapturaInterrompida.
+        """
+        self._verificar_desligamento()
+        orcamento = self.orcamento(etapa)
+        inicio = time.monotonic()
+        proc = subprocess.Popen(cmd, cwd=cwd, env=self.ambiente(etapa, env), stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE, text=True, start_new_session=True)
+        if self.processos is not None:
+            self.processos.adicionar(proc.pid)
+        try:
+            stdout, stderr = proc.communicate(timeout=orcamento)
+        except subprocess.TimeoutExpired:
+            _matar_grupo(proc.pid, signal.SIGTERM)
+            try:
+                stdout, stderr = proc.communicate(timeout=self.tolerancia)
+            except subprocess.TimeoutExpired:
+                _matar_grupo(proc.pid, signal.SIGKILL)
+                stdout, stderr = proc.communicate()
+            raise PrazoEsgotado(etapa, orcamento, time.monotonic() - inicio, stdout, stderr) from None
+        finally:
+            if proc.poll() is None:
+                _matar_grupo(proc.pid, signal.SIGKILL)
+                proc.wait()
+            if self.processos is not None:
+                self.processos.remover(proc.pid)
+        self._interrompido(proc, cwd, stdout)
+        if proc.returncode != 0:
+            raise subprocess.CalledProcessError(proc.returncode, cmd, stdout, stderr)
+        return subprocess.CompletedProcess(cmd, proc.returncode, stdout, stderr)
+
+    async def executar_async(self, cmd, etapa, cwd=None, env=None):
+        """Versão assíncrona de executar(); a saída é lida aos poucos para sobrar a parcial no prazo."""
+        self._verificar_desligamento()
+        orcamento = self.orcamento(etapa)
+        inicio = time.monotonic()
+        proc = await asyncio.create_subprocess_exec(
+            *cmd, cwd=cwd, env=self.ambiente(etapa, env),
+            stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE, start_new_session=True,
+        )
+        if self.processos is not None:
+            self.processos.adicionar(proc.pid)
+        saidas = {"stdout": [], "stderr": []}
+
+        async def ler(fluxo, destino):
+            while bloco := await fluxo.read(65536):
+                destino.append(bloco)
+
+        leitura = asyncio.gather(ler(proc.stdout, saidas["stdout"]), ler(proc.stderr, saidas["stderr"]), proc.wait())
+        try:
+            await asyncio.wait_for(asyncio.shield(leitura), orcamento)
+            estourou = False
+        except asyncio.TimeoutError:
+            estourou = True
+            _matar_grupo(proc.pid, signal.SIGTERM)
+            try:
+                await asyncio.wait_for(asyncio.shield(leitura), self.tolerancia)
+            except asyncio.TimeoutError:
+                _matar_grupo(proc.pid, signal.SIGKILL)
+                await leitura
+        except asyncio.CancelledError:
+            # Engine derrubada (terceiro sinal ou cancelamento de fora): o grupo morre aqui, como no
+            # finally de executar(); sem isso ele sobraria vivo e fora do registro de processos
+            _matar_grupo(proc.pid, signal.SIGKILL)
+            await asyncio.wait({leitura}, timeout=self.tolerancia)  # colhe o processo (sem zumbi)
+            raise
+        finally:
+            if self.processos is not None:
+                self.processos.remover(proc.pid)
+        stdout = b"".join(saidas["stdout"]).decode("utf-8", errors="replace")
+        stderr = b"".join(saidas["stderr"]).decode("utf-8", errors="replace")
+        self._interrompido(proc, cwd, stdout)
+        if estourou:
+            raise PrazoEsgotado(etapa, orcamento, time.monotonic() - inicio, stdout, stderr)
+        if proc.returncode != 0:
+            raise subprocess.CalledProcessError(proc.returncode, cmd, stdout, stderr)
+        return subprocess.CompletedProcess(cmd, proc.returncode, stdout, stderr)
+
+    def resgatar(self, url, erro, archivebox_dir):
+        """
+        Procura o DOM já salvo no snapshot da captura interrompida. Devolve o
+        diretório (com singlefile.html) ou None, e registra o estouro.
+        """
+        snapshot_dir = None
+        match = config.ARCHIVE_PATH_REGEX.search(erro.stdout)
+        if match:
+            candidato = Path(archivebox_dir) / "archive" / match.group(1)
+            singlefile = candidato / "singlefile.html"
+            dom = candidato / "output.html"
+            if singlefile.exists() and singlefile.stat().st_size > 0:
+                snapshot_dir = candidato
+            elif dom.exists() and dom.stat().st_size > 0:
+                shutil.copyfile(dom, singlefile)
+                snapshot_dir = candidato
+        if snapshot_dir is not None:
+            with self._lock:
+                self._resgatados.add(str(snapshot_dir))
+        self.registrar(url, erro, resgatado=snapshot_dir is not None)
+        return snapshot_dir
+
+    def foi_resgatado(self, snapshot_dir):
+        """True (uma vez) se o snapshot veio de um resgate no prazo."""
+        with self._lock:
+            chave = str(snapshot_dir)
+            if chave in self._resgatados:
+                self._resgatados.discard(chave)
+                return True
+            return False
+
+    def registrar(self, url, erro, resgatado=False):
+        METRICAS.contar("prazos_esgotados_total", etapa=erro.etapa, resgatado=str(resgatado).lower())
+        extractor = ultimo_extractor(erro.stdout)
+        logging.warning(
+            f"Prazo de {erro.orcamento:.0f} s esgotado em {erro.etapa} para {url} "
+            f"(em: {extractor or 'desconhecido'}); {'DOM resgatado' if resgatado else 'nada a resgatar'}."
+        )
+        if self.registro is None:
+            return
+        linha = json.dumps({
+            "quando": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "url": url,
+            "etapa": erro.etapa,
+            "orcamento_s": erro.orcamento,
+            "decorrido_s": round(erro.decorrido, 1),
+            "extractor": extractor,
+            "resgatado": resgatado,
+            "stderr": erro.stderr[-500:],
+        }, ensure_ascii=False)
+        with self._lock:
+            with open(self.registro, "a", encoding="utf-8") as f:
+                f.write(linha + "\n")
@@ -0,0 +1,117 @@
+import logging
+import os
+import re
+import time
+from datetime import datetime, timezone
+from typing import List, Optional
+
+from .config import WAYBACK_CDX_API
+from .limitador import STATUS_LIMITACAO, interpretar_retry_after
+from .metricas import METRICAS
+
+_URL_ORIGINAL = re.compile(r"/web/\d{1,14}(?:[a-z]{2}_)?/(.+)$")
+
+try:
+    import requests
+except ImportError:
+    requests = None
+
+def extract_wayback_timestamp_substring(url: str) -> Optional[str]:
+    """
+    Extrai o timestamp do Wayback Machine (YYYYMMDDhhmmss) da URL.
+    Retorna a string do timestamp ou None em caso de erro.
+    """
+    marker = "/web/"
+    try:
+        start_index = url.index(marker) + len(marker)
+    except ValueError:
+        logging.error(f"Marker '/web/' não encontrado na URL: {url}")
+        return None
+
+    timestamp_str = url[start_index: start_index + 14]
+    if len(timestamp_str) == 14 and timestamp_str.isdigit():
+        return timestamp_str
+    logging.error(f"Timestamp inválido extraído da URL: {url}")
+    return None
+
+def url_original(url: str) -> Optional[str]:
+    """URL original arquivada (o que vem depois de /web/<timestamp><modo>/), ou None."""
+    match = _URL_ORIGINAL.search(url)
+    return match.group(1) if match else None
+
+def timestamp_para_datetime(timestamp_str: str) -> datetime:
+    """Converte o timestamp do Wayback em datetime UTC."""
+    return datetime.strptime(timestamp_str, "%Y%m%d%H%M%S").replace(tzinfo=timezone.utc)
+
+def get_wayback_snapshots(url_or_domain: str, cdx_api: str = WAYBACK_CDX_API,
+                          inicio: str = "2015", fim: str = "202212", limitador=None,
+                          tentativas: int = 5) -> List[str]:
+    """
+    Retorna as URLs do Wayback (mais nova primeiro) das capturas de um domínio
+    ou URL, usando a API de CDX. Com 'limitador', a consulta passa pelo token
+    bucket e respostas 429/503 respeitam o Retry-After antes de repetir.
+    """
+    if requests is None:
+        raise RuntimeError("A consulta ao CDX precisa do pacote 'requests' (pip install -r requirements.txt).")
+
+    logging.info(f"Consultando a API CDX para '{url_or_domain}'...")
+    params = {
+        "url": url_or_domain,
+        "output": "json",
+        "collapse": "digest",   # remove capturas duplicadas
+        "fl": "timestamp,original",
+        "filter": "statuscode:200",
+        "from": inicio,
+        "to": fim,
+    }
+
+    try:
+        for tentativa in range(1, tentativas + 1):
+            if limitador is not None:
+                limitador.adquirir()
+            with METRICAS.tempo("cdx"):
+                r = requests.get(cdx_api, params=params, timeout=30)
+            if r.status_code in STATUS_LIMITACAO and tentativa < tentativas:
+                if limitador is not None:
+                    limitador.penalizar(r.headers.get("Retry-After"))
+                else:
+                    time.sleep(interpretar_retry_after(r.headers.get("Retry-After")) or 5)
+                continue
+            r.raise_for_status()
+            break
+        if limitador is not None:
+            limitador.registrar_sucesso()
+        METRICAS.sucesso("cdx")
+    except requests.exceptions.RequestException as e:
+        METRICAS.falha("cdx", e)
+        logging.error(f"Erro ao consultar Wayback CDX API: {e}")
+        return []
+
+    data = r.json()  # A primeira linha é o cabeçalho (timestamp, original)
+    if not data or len(data) <= 1:
+        logging.info("Nenhuma captura encontrada ou dados vazios.")
+        return []
+
+    snapshots = [
+        f"http://web.archive.org/web/{row[0]}if_/{row[1]}"
+        for row in data[1:]
+        if len(row) >= 2
+    ]
+    snapshots.reverse()
+
+    logging.info(f"Foram encontradas {len(snapshots)} capturas no CDX (ordem do mais novo p/ mais antigo).")
+    return snapshots
+
+def save_urls_to_file(urls: List[str], file_path: str) -> None:
+    """Salva a lista de URLs em um arquivo de texto (um por linha)."""
+    with open(file_path, "w", encoding="utf-8") as f:
+        for u in urls:
+            f.write(u + "\n")
+    logging.info(f"URLs salvas em {file_path}.")
+
+def load_urls_from_file(file_path: str) -> List[str]:
+    """Carrega as URLs de um arquivo (ignora linhas vazias ou comentários)."""
+    if not os.path.exists(file_path):
+        return []
+    with open(file_path, "r", encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip() and not line.strip().startswith("#")]
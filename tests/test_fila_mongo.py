@@ -0,0 +1,131 @@
+"""
+Testes da fila do MongoDB (fila_mongo.py) contra um mongod de verdade.
+
+Pulados se não houver mongod em MONGODB_TESTE_URI (padrão: localhost). Cada
+teste usa um banco descartável.
+
+    python -m pytest tests/test_fila_mongo.py
+"""
+import os
+import threading
+import time
+import uuid
+
+import pytest
+
+pymongo = pytest.importorskip("pymongo")
+
+from maquina_do_tempo.fila_mongo import EM_ANDAMENTO, FALHA, PENDENTE, SUCESSO, FilaMongo  # noqa: E402
+
+MONGODB_TESTE_URI = os.environ.get("MONGODB_TESTE_URI", "mongodb://localhost:27017")
+
+def url(host, timestamp):
+    return f"http://web.archive.org/web/{timestamp}if_/https://{host}/"
+
+@pytest.fixture
+def colecao():
+    client = pymongo.MongoClient(MONGODB_TESTE_URI, serverSelectionTimeoutMS=500)
+    try:
+        client.admin.command("ping")
+    except pymongo.errors.PyMongoError:
+        client.close()
+        pytest.skip(f"mongod indisponível em {MONGODB_TESTE_URI}")
+    nome = f"teste_fila_{uuid.uuid4().hex[:12]}"
+    yield client[nome]["fila"]
+    client.drop_database(nome)
+    client.close()
+
+def fila(colecao, dono, lease=60):
+    fila = FilaMongo(colecao, dono=dono, lease=lease)
+    fila.criar_indices()
+    return fila
+
+def test_reivindicar_entrega_cada_url_uma_vez(colecao):
+    a, b = fila(colecao, "a"), fila(colecao, "b")
+    urls = [url("poder360.com.br", f"2020010100000{i}") for i in range(4)]
+    assert a.enfileirar(urls) == 4
+    assert a.enfileirar(urls) == 0
+
+    pegas = [a.reivindicar(), b.reivindicar(), a.reivindicar(), b.reivindicar()]
+    assert sorted(pegas) == sorted(urls)
+    assert a.reivindicar() is None and b.reivindicar() is None
+    documento = colecao.find_one({"_id": pegas[0]})
+    assert documento["estado"] == EM_ANDAMENTO and documento["dono"] == "a" and documento["tentativas"] == 1
+
+def test_lease_vencida_volta_para_a_fila(colecao):
+    a, b = fila(colecao, "a", lease=0.3), fila(colecao, "b", lease=0.3)
+    a.enfileirar([url("poder360.com.br", "20200101000000")])
+    pega = a.reivindicar()
+    assert b.reivindicar() is None
+
+    time.sleep(0.5)
+    assert b.reivindicar() == pega
+    documento = colecao.find_one({"_id": pega})
+    assert documento["dono"] == "b" and documento["tentativas"] == 2
+
+def test_so_o_dono_conclui(colecao):
+    a, b = fila(colecao, "a", lease=0.3), fila(colecao, "b", lease=0.3)
+    a.enfileirar([url("poder360.com.br", "20200101000000")])
+    pega = a.reivindicar()
+    time.sleep(0.5)
+    assert b.reivindicar() == pega
+
+    a.concluir(pega)
+    assert colecao.find_one({"_id": pega})["estado"] == EM_ANDAMENTO
+    a.falhar(pega, "Timeout")
+    assert colecao.find_one({"_id": pega})["dono"] == "b"
+    b.concluir(pega)
+    assert colecao.find_one({"_id": pega})["estado"] == SUCESSO
+
+def test_alvos_se_revezam(colecao):
+    a = fila(colecao, "a")
+    grande = [url("grande.com.br", f"202001010000{i:02d}") for i in range(10)]
+    pequeno = [url("pequeno.com.br", f"202001010000{i:02d}") for i in range(2)]
+    a.enfileirar(grande + pequeno)
+
+    alvos = [colecao.find_one({"_id": a.reivindicar()})["alvo"] for _ in range(4)]
+    assert alvos == ["grande.com.br", "pequeno.com.br", "grande.com.br", "pequeno.com.br"]
+
+def test_urls_espera_lease_de_outro_dono(colecao):
+    a, b = fila(colecao, "a", lease=0.3), fila(colecao, "b", lease=0.3)
+    a.enfileirar([url("poder360.com.br", "20200101000000")])
+    pega = a.reivindicar()
+
+    assert list(b.urls(ate_ociosa=True)) == []
+    urls = b.urls(intervalo=0.05)
+    assert next(urls) == pega
+    b.concluir(pega)
+    assert list(urls) == []
+
+def test_urls_para_com_o_evento(colecao):
+    a, b = fila(colecao, "a"), fila(colecao, "b")
+    a.enfileirar([url("poder360.com.br", "20200101000000")])
+    a.reivindicar()
+    parar = threading.Event()
+    threading.Timer(0.2, parar.set).start()
+    inicio = time.monotonic()
+    assert list(b.urls(intervalo=0.05, parar=parar)) == []
+    assert time.monotonic() - inicio < 5
+    assert colecao.find_one()["estado"] == EM_ANDAMENTO
+
+def test_falha_transitoria_volta_pendente(colecao):
+    a = fila(colecao, "a")
+    a.enfileirar([url("poder360.com.br", "20200101000000")])
+    pega = a.reivindicar()
+    a.falhar(pega, "Timeout ao capturar")
+    documento = colecao.find_one({"_id": pega})
+    assert documento["estado"] == PENDENTE and "dono" not in documento
+
+def test_reprocessar_reabre_falhas_e_enfileira_novas(colecao):
+    a = fila(colecao, "a")
+    esgotada, concluida, nova = (url("poder360.com.br", f"2020010100000{i}") for i in range(3))
+    a.enfileirar([esgotada, concluida])
+    colecao.update_one({"_id": esgotada}, {"$set": {"estado": FALHA, "tentativas": 5}})
+    colecao.update_one({"_id": concluida}, {"$set": {"estado": SUCESSO}})
+
+    assert a.enfileirar([esgotada]) == 0
+    assert a.reprocessar([esgotada, concluida, nova]) == 2
+    documento = colecao.find_one({"_id": esgotada})
+    assert documento["estado"] == PENDENTE and documento["tentativas"] == 0
+    assert colecao.find_one({"_id": concluida})["estado"] == SUCESSO
+    assert colecao.find_one({"_id": nova})["estado"] == PENDENTE